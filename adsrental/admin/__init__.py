@@ -19,6 +19,7 @@ from adsrental.admin.lead_account_issue_admin import LeadAccountIssueAdmin
 from adsrental.admin.bundler_team_admin import BundlerTeamAdmin
 from adsrental.admin.lead_account_issue_image_admin import LeadAccountIssueImageAdmin
 from adsrental.admin.comment_admin import CommentAdmin
+from adsrental.admin.cron_job_run_admin import CronJobRunAdmin
 
 
 admin.site.register(CustomUserAdmin.model, CustomUserAdmin)
@@ -44,3 +45,4 @@ admin.site.register(LeadAccountIssueAdmin.model, LeadAccountIssueAdmin)
 admin.site.register(BundlerTeamAdmin.model, BundlerTeamAdmin)
 admin.site.register(LeadAccountIssueImageAdmin.model, LeadAccountIssueImageAdmin)
 admin.site.register(CommentAdmin.model, CommentAdmin)
+admin.site.register(CronJobRunAdmin.model, CronJobRunAdmin)
@@ -176,8 +176,7 @@ class BundlerLeadStatsAdmin(admin.ModelAdmin, CSVExporter):
         )
 
     def calculate(self, request, queryset):
-        for bundler_lead_stat in queryset:
-            BundlerLeadStat.calculate(bundler_lead_stat.bundler)
+        BundlerLeadStat.calculate_many(bundler_ids=list(queryset.values_list('bundler_id', flat=True)))
 
     bundler_field.short_description = 'Bundler'
     bundler_field.admin_order_field = 'bundler__name'
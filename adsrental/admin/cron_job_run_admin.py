@@ -0,0 +1,19 @@
+from django.contrib import admin
+
+from adsrental.models.cron_job_run import CronJobRun
+
+
+class CronJobRunAdmin(admin.ModelAdmin):
+    model = CronJobRun
+    list_display = (
+        'id',
+        'name',
+        'status',
+        'host',
+        'started',
+        'duration',
+        'rows_count',
+    )
+    list_filter = ('name', 'status', )
+    search_fields = ('name', )
+    readonly_fields = ('name', 'status', 'host', 'started', 'finished', 'duration', 'rows_count', 'result', )
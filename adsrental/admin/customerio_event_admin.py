@@ -25,13 +25,14 @@ class CustomerIOEventAdmin(admin.ModelAdmin, CSVExporter):
         'Sent',
         'Created'
     )
-    list_display = ('id', 'lead', 'lead_name', 'lead_email', 'name', 'sent', 'created')
+    list_display = ('id', 'lead', 'lead_name', 'lead_email', 'name', 'sent', 'pending', 'attempts', 'error', 'created', 'sent_date')
     search_fields = ('lead__email', 'lead__first_name',
                      'lead__last_name', 'name', )
-    list_filter = ('name', )
-    readonly_fields = ('created', )
+    list_filter = ('name', 'sent', 'pending', )
+    readonly_fields = ('created', 'sent_date', )
     actions = (
         'export_as_csv',
+        'resend',
     )
 
     def lead_email(self, obj):
@@ -39,3 +40,8 @@ class CustomerIOEventAdmin(admin.ModelAdmin, CSVExporter):
 
     def lead_name(self, obj):
         return obj.lead.name()
+
+    def resend(self, request, queryset):
+        queryset.update(pending=True, attempts=0, next_attempt_date=None, error=None)
+
+    resend.short_description = 'Send again'
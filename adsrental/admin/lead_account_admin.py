@@ -388,8 +388,7 @@ class LeadAccountAdmin(admin.ModelAdmin, CSVExporter):
             if form.is_valid():
                 reason = form.cleaned_data['reason']
                 note = form.cleaned_data['note']
-                for lead_account in queryset:
-                    lead_account.ban(edited_by=request.user, reason=reason, note=note)
+                for lead_account in LeadAccount.objects.bulk_ban(queryset, reason=reason, edited_by=request.user, note=note):
                     messages.info(request, f'{lead_account} is banned.')
                 return None
         else:
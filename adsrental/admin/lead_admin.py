@@ -561,10 +561,9 @@ class LeadAdmin(admin.ModelAdmin, CSVExporter):
             if form.is_valid():
                 reason = form.cleaned_data['reason']
                 note = form.cleaned_data['note']
-                for lead in queryset:
-                    for lead_account in lead.lead_accounts.filter(account_type=account_type):
-                        lead_account.ban(edited_by=request.user, reason=reason, note=note)
-                        messages.info(request, '{} is banned.'.format(lead_account))
+                lead_accounts = LeadAccount.objects.filter(lead__in=queryset, account_type=account_type)
+                for lead_account in LeadAccount.objects.bulk_ban(lead_accounts, reason=reason, edited_by=request.user, note=note):
+                    messages.info(request, '{} is banned.'.format(lead_account))
                 return None
         else:
             form = AdminLeadAccountBanForm(request=request)
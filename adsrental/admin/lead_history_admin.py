@@ -57,6 +57,7 @@ class LeadHistoryAdmin(admin.ModelAdmin, CSVExporter):
         'date',
         'active',
         'online',
+        'online_minutes',
         'amount_field',
         'wrong_password',
         'security_checkpoint',
@@ -123,12 +124,14 @@ class LeadHistoryAdmin(admin.ModelAdmin, CSVExporter):
         queryset.update(
             checks_online=24,
             checks_offline=0,
+            online_minutes=24 * 60,
         )
 
     def mark_as_offline(self, request, queryset):
         queryset.update(
             checks_online=0,
             checks_offline=24,
+            online_minutes=0,
         )
 
     def mark_as_correct_password_fb(self, request, queryset):
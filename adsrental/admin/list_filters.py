@@ -13,7 +13,7 @@ from adsrental.models.lead_account import LeadAccount
 from adsrental.models.bundler import Bundler
 from adsrental.models.raspberry_pi import RaspberryPi
 from adsrental.models.ec2_instance import EC2Instance
-from adsrental.utils import get_week_boundaries_for_dt, get_month_boundaries_for_dt
+from adsrental.utils import get_week_boundaries_for_dt, get_month_boundaries_for_dt, UniqueIPHelper
 
 
 class LeadStatusListFilter(SimpleListFilter):
@@ -161,6 +161,23 @@ class OnlineListFilter(SimpleListFilter):
         return None
 
 
+class IPChurnListFilter(SimpleListFilter):
+    title = 'IP churn'
+    parameter_name = 'ip_churn'
+    top_limit = 50
+
+    def lookups(self, request, model_admin):
+        return (
+            ('top', 'Top {} by unique IPs'.format(self.top_limit)),
+        )
+
+    def queryset(self, request, queryset):
+        if self.value() == 'top':
+            rpids = [rpid for rpid, _ in UniqueIPHelper().get_top(limit=self.top_limit)]
+            return queryset.filter(rpid__in=rpids)
+        return None
+
+
 class RaspberryPiOnlineListFilter(OnlineListFilter):
     filter_field = 'raspberry_pi__last_seen'
 
@@ -10,7 +10,7 @@ from django.db.models.functions import Concat
 
 from adsrental.models.raspberry_pi import RaspberryPi
 from adsrental.models.ec2_instance import EC2Instance
-from adsrental.admin.list_filters import OnlineListFilter, VersionListFilter, AbstractUIDListFilter
+from adsrental.admin.list_filters import OnlineListFilter, VersionListFilter, AbstractUIDListFilter, IPChurnListFilter
 from adsrental.admin.base import CSVExporter
 
 
@@ -91,6 +91,7 @@ class RaspberryPiAdmin(admin.ModelAdmin, CSVExporter):
         OnlineListFilter,
         VersionListFilter,
         RpidListFilter,
+        IPChurnListFilter,
         'is_proxy_tunnel',
         'proxy_hostname',
     )
@@ -104,7 +105,7 @@ class RaspberryPiAdmin(admin.ModelAdmin, CSVExporter):
         'convert_to_ec2',
         'export_as_csv',
     )
-    readonly_fields = ('created', 'updated', )
+    readonly_fields = ('created', 'updated', 'unique_ips_field', )
 
     def lead_link(self, obj):
         lead = obj.get_lead()
@@ -168,6 +169,16 @@ class RaspberryPiAdmin(admin.ModelAdmin, CSVExporter):
             return None
         return mark_safe(u'<span title="{}">{}</span>'.format(last_seen, naturaltime(last_seen)))
 
+    def unique_ips_field(self, obj):
+        result = []
+        for item in obj.get_ip_history():
+            result.append('{ip_address}: first seen {first_seen}, last seen {last_seen}'.format(
+                ip_address=item['ip_address'],
+                first_seen=naturaltime(item['first_seen']),
+                last_seen=naturaltime(item['last_seen']),
+            ))
+        return mark_safe('<br>'.join(result))
+
     def restart_device(self, request, queryset):
         for raspberry_pi in queryset:
             raspberry_pi.reset_cache()
@@ -266,6 +277,8 @@ class RaspberryPiAdmin(admin.ModelAdmin, CSVExporter):
 
     online.boolean = True
 
+    unique_ips_field.short_description = 'Unique IPs'
+
     tunnel_online.boolean = True
 
     first_tested_field.short_description = 'Tested'
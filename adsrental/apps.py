@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class Config(AppConfig):
     name = 'adsrental'
+
+    def ready(self) -> None:
+        import adsrental.signals  # noqa: F401 pylint: disable=W0611
@@ -0,0 +1,196 @@
+'Reconciles EC2Instance entries with AWS state using one paged describe_instances snapshot'
+from __future__ import annotations
+
+import typing
+
+import botocore
+from django.apps import apps
+from django.db import transaction
+from django.utils import timezone
+from django_bulk_update.helper import bulk_update
+
+from adsrental.utils import BotoResource, PingCacheHelper
+
+if typing.TYPE_CHECKING:
+    from adsrental.models.ec2_instance import EC2Instance
+
+
+class EC2InstanceState(typing.NamedTuple):
+    'State of one AWS EC2 instance from describe_instances response'
+    instance_id: str
+    status: str
+    rpid: typing.Optional[str]
+    email: typing.Optional[str]
+    is_duplicate: bool
+    hostname: typing.Optional[str]
+    ip_address: typing.Optional[str]
+
+    @classmethod
+    def from_dict(cls, data: typing.Dict[str, typing.Any]) -> EC2InstanceState:
+        tags = {i['Key']: i['Value'] for i in data.get('Tags') or []}
+        return cls(
+            instance_id=data['InstanceId'],
+            status=data['State']['Name'],
+            rpid=tags.get('Name'),
+            email=tags.get('Email'),
+            is_duplicate=tags.get('Duplicate') == 'true',
+            hostname=data.get('PublicDnsName'),
+            ip_address=data.get('PublicIpAddress'),
+        )
+
+
+class EC2ReconcileResult(typing.NamedTuple):
+    total_count: int
+    created_rpids: typing.List[str]
+    updated_rpids: typing.List[str]
+    deleted_rpids: typing.List[str]
+    pages_count: int
+
+
+class EC2Reconciler():
+    '''
+    Sync :model:`adsrental.EC2Instance` entries with AWS.
+
+    All instances are loaded from AWS with paged *describe_instances* calls into a map keyed by instance ID,
+    then compared with all entries loaded from DB with one query. Same fields as in
+    *EC2Instance.update_from_boto* are calculated in memory and only changed ones are saved with bulk updates.
+
+    *ec2_client* - boto3 EC2 client, can be replaced with a stubbed one for offline runs
+    '''
+    PAGE_SIZE = 1000
+    SYNC_FIELDS = ['status', 'email', 'rpid', 'lead_id', 'is_duplicate', 'hostname', 'ip_address']
+
+    def __init__(self, ec2_client: typing.Optional[botocore.client.BaseClient] = None) -> None:
+        self.ec2_client = ec2_client or BotoResource().get_client('ec2')
+        self.pages_count = 0
+
+    def get_snapshot(self) -> typing.Dict[str, EC2InstanceState]:
+        'Get state of all AWS instances, including terminated'
+        result = {}
+        self.pages_count = 0
+        paginator = self.ec2_client.get_paginator('describe_instances')
+        for page in paginator.paginate(PaginationConfig={'PageSize': self.PAGE_SIZE}):
+            self.pages_count += 1
+            for reservation in page['Reservations']:
+                for data in reservation['Instances']:
+                    state = EC2InstanceState.from_dict(data)
+                    result[state.instance_id] = state
+        return result
+
+    @staticmethod
+    def apply_state(ec2_instance: EC2Instance, state: EC2InstanceState, leads_map: typing.Dict[str, typing.Any]) -> None:
+        'Same as *EC2Instance.update_from_boto*, but uses loaded state and leads and does not save'
+        ec2_instance.status = state.status
+        lead = leads_map.get(state.rpid) if ec2_instance.is_active() and state.rpid else None
+        if not ec2_instance.is_essential:
+            ec2_instance.email = state.email
+            ec2_instance.rpid = state.rpid
+            ec2_instance.lead = lead
+            ec2_instance.is_duplicate = state.is_duplicate
+        if ec2_instance.is_running():
+            ec2_instance.hostname = state.hostname
+            ec2_instance.ip_address = state.ip_address
+
+    def get_values(self, ec2_instance: EC2Instance) -> typing.List[typing.Any]:
+        return [getattr(ec2_instance, field) for field in self.SYNC_FIELDS]
+
+    def reconcile(self, create_missing: bool = False, delete_missing: bool = False, execute: bool = True) -> EC2ReconcileResult:
+        '''
+        Sync DB entries with AWS snapshot.
+
+        *create_missing* - create entries for AWS instances that are not terminated and not in DB
+        *delete_missing* - delete entries for instances that are terminated or not in AWS
+        *execute* - save changes, otherwise only report them
+        '''
+        ec2_instance_model = apps.get_model('adsrental', 'EC2Instance')
+        lead_model = apps.get_model('adsrental', 'Lead')
+
+        snapshot = self.get_snapshot()
+        ec2_instances = list(ec2_instance_model.objects.all())
+        rpids = {i.rpid for i in snapshot.values() if i.rpid}
+        leads_map = {lead.raspberry_pi_id: lead for lead in lead_model.objects.filter(raspberry_pi__rpid__in=rpids)}
+
+        changed_ec2_instances = []
+        changed_fields: typing.Set[str] = set()
+        synced_ids = []
+        deleted_ec2_instances = []
+        existing_instance_ids = set()
+        used_lead_ids: typing.Set[str] = set()
+        for ec2_instance in ec2_instances:
+            existing_instance_ids.add(ec2_instance.instance_id)
+            state = snapshot.get(ec2_instance.instance_id)
+            if state is None or state.status == ec2_instance_model.STATUS_TERMINATED:
+                if delete_missing:
+                    deleted_ec2_instances.append(ec2_instance)
+                if state is None:
+                    continue
+
+            old_values = self.get_values(ec2_instance)
+            self.apply_state(ec2_instance, state, leads_map)
+            if ec2_instance.lead_id in used_lead_ids:
+                ec2_instance.lead = None
+            if ec2_instance.lead_id:
+                used_lead_ids.add(ec2_instance.lead_id)
+            synced_ids.append(ec2_instance.id)
+            new_values = self.get_values(ec2_instance)
+            if new_values != old_values:
+                changed_ec2_instances.append(ec2_instance)
+                changed_fields.update(field for field, old, new in zip(self.SYNC_FIELDS, old_values, new_values) if old != new)
+
+        new_ec2_instances = []
+        if create_missing:
+            for instance_id, state in snapshot.items():
+                if instance_id in existing_instance_ids or state.status == ec2_instance_model.STATUS_TERMINATED:
+                    continue
+                ec2_instance = ec2_instance_model(instance_id=instance_id)
+                self.apply_state(ec2_instance, state, leads_map)
+                if ec2_instance.lead_id in used_lead_ids:
+                    ec2_instance.lead = None
+                if ec2_instance.lead_id:
+                    used_lead_ids.add(ec2_instance.lead_id)
+                new_ec2_instances.append(ec2_instance)
+
+        if execute:
+            self.save(changed_ec2_instances, changed_fields, synced_ids, new_ec2_instances, deleted_ec2_instances)
+
+        return EC2ReconcileResult(
+            total_count=len([i for i in snapshot.values() if i.status != ec2_instance_model.STATUS_TERMINATED]),
+            created_rpids=[i.rpid or '<NORPID>' for i in new_ec2_instances],
+            updated_rpids=sorted([i.rpid or '<NORPID>' for i in changed_ec2_instances]),
+            deleted_rpids=[i.rpid for i in deleted_ec2_instances],
+            pages_count=self.pages_count,
+        )
+
+    @staticmethod
+    def save(
+            changed_ec2_instances: typing.List[EC2Instance],
+            changed_fields: typing.Set[str],
+            synced_ids: typing.List[int],
+            new_ec2_instances: typing.List[EC2Instance],
+            deleted_ec2_instances: typing.List[EC2Instance],
+    ) -> None:
+        ec2_instance_model = apps.get_model('adsrental', 'EC2Instance')
+        now = timezone.now()
+        with transaction.atomic():
+            deleted_ids = [i.id for i in deleted_ec2_instances]
+            if deleted_ids:
+                ec2_instance_model.objects.filter(id__in=deleted_ids).update(lead=None)
+                ec2_instance_model.objects.filter(id__in=deleted_ids).delete()
+
+            changed_ec2_instances = [i for i in changed_ec2_instances if i.id not in deleted_ids]
+            if 'lead_id' in changed_fields:
+                # lead is unique, so release leads before they are moved to other instances
+                ec2_instance_model.objects.filter(id__in=[i.id for i in changed_ec2_instances]).update(lead=None)
+            if changed_ec2_instances:
+                update_fields = ['lead' if field == 'lead_id' else field for field in sorted(changed_fields)]
+                for ec2_instance in changed_ec2_instances:
+                    ec2_instance.updated = now
+                bulk_update(changed_ec2_instances, update_fields=update_fields + ['updated'])
+            ec2_instance_model.objects.filter(id__in=synced_ids).exclude(id__in=deleted_ids).update(last_synced=now)
+
+            for ec2_instance in new_ec2_instances:
+                ec2_instance.last_synced = now
+            ec2_instance_model.objects.bulk_create(new_ec2_instances)
+
+            rpids = {i.rpid for i in changed_ec2_instances + new_ec2_instances + deleted_ec2_instances if i.rpid}
+            transaction.on_commit(lambda: PingCacheHelper().refresh_many(rpids))
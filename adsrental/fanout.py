@@ -0,0 +1,284 @@
+'Process-wide bounded thread executor for fleet-wide SSH and HTTP probes'
+from __future__ import annotations
+
+import os
+import time
+import atexit
+import threading
+import collections
+import concurrent.futures
+import typing
+
+from django.conf import settings
+from django.db import close_old_connections
+
+
+FANOUT_MAX_WORKERS = getattr(settings, 'FANOUT_MAX_WORKERS', 50)
+FANOUT_PER_TARGET_LIMIT = getattr(settings, 'FANOUT_PER_TARGET_LIMIT', 10)
+FANOUT_TASK_TIMEOUT = getattr(settings, 'FANOUT_TASK_TIMEOUT', 60)
+
+
+class TaskResult(typing.NamedTuple):
+    'Result of one task, *error* is set if task raised an exception or timed out'
+    item: typing.Any
+    result: typing.Any
+    error: typing.Optional[BaseException]
+    seconds: float
+    timed_out: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class FanoutMetrics():
+    'Thread-safe task counters, one for executor lifetime and one for every run'
+    FIELDS = ['submitted', 'succeeded', 'failed', 'timed_out', 'cancelled', 'running', 'max_running', 'abandoned']
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.counters: typing.Dict[str, int] = {field: 0 for field in self.FIELDS}
+        self.task_seconds = 0.0
+
+    def on_start(self) -> None:
+        with self.lock:
+            self.counters['running'] += 1
+            self.counters['max_running'] = max(self.counters['max_running'], self.counters['running'])
+
+    def on_finish(self, seconds: float) -> None:
+        with self.lock:
+            self.counters['running'] -= 1
+            self.task_seconds += seconds
+
+    def add(self, field: str, count: int = 1) -> None:
+        with self.lock:
+            self.counters[field] += count
+
+    def as_dict(self) -> typing.Dict[str, typing.Any]:
+        with self.lock:
+            result: typing.Dict[str, typing.Any] = dict(self.counters)
+            finished = result['succeeded'] + result['failed']
+            result['avg_task_seconds'] = round(self.task_seconds / finished, 3) if finished else None
+        return result
+
+
+class FanoutRun():
+    '''
+    One batch of tasks submitted to *FanoutExecutor*. Iterate over it to get *TaskResult* in completion order.
+
+    At most *max_in_flight* tasks of the batch are queued at once and at most *per_target_limit* tasks
+    with the same *target(item)* key run at once, so a sweep does not flood the shared pool or one host.
+    A task that did not finish in *timeout* seconds after it was started by a pool thread is reported as timed out,
+    time spent in pool queue behind other runs is not counted. Its thread can not be killed,
+    so it keeps its target slot until it really finishes and is counted in *abandoned* metric till then.
+    If all slots of a target are held by abandoned tasks that do not finish in one more *timeout*,
+    queued tasks of this target are reported as failed without running.
+    Call *cancel* or stop iterating to drop tasks that are not started yet.
+    '''
+
+    QUEUED_POLL_SECONDS = 1
+
+    def __init__(
+            self,
+            executor: FanoutExecutor,
+            func: typing.Callable[[typing.Any], typing.Any],
+            items: typing.Iterable[typing.Any],
+            target: typing.Optional[typing.Callable[[typing.Any], typing.Hashable]] = None,
+            timeout: typing.Optional[float] = FANOUT_TASK_TIMEOUT,
+            max_in_flight: typing.Optional[int] = None,
+            per_target_limit: int = FANOUT_PER_TARGET_LIMIT,
+    ) -> None:
+        self.executor = executor
+        self.func = func
+        self.items = items
+        self.target = target
+        self.timeout = timeout
+        self.max_in_flight = max_in_flight or executor.max_workers
+        self.per_target_limit = per_target_limit
+        self.metrics = FanoutMetrics()
+        self.cancel_event = threading.Event()
+        # task start times by task index, set by pool threads
+        self.start_times: typing.Dict[int, float] = {}
+
+    def cancel(self) -> None:
+        self.cancel_event.set()
+
+    def is_cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    def call(self, task_index: int, item: typing.Any) -> typing.Any:
+        'Runs in pool thread'
+        start = time.monotonic()
+        self.start_times[task_index] = start
+        self.metrics.on_start()
+        self.executor.metrics.on_start()
+        try:
+            return self.func(item)
+        finally:
+            seconds = time.monotonic() - start
+            self.metrics.on_finish(seconds)
+            self.executor.metrics.on_finish(seconds)
+            # pool threads are reused, so do not keep DB connections opened by tasks
+            close_old_connections()
+
+    def add_metric(self, field: str, count: int = 1) -> None:
+        if count:
+            self.metrics.add(field, count)
+            self.executor.metrics.add(field, count)
+
+    def __iter__(self) -> typing.Iterator[TaskResult]:
+        queues: typing.Dict[typing.Hashable, typing.Deque[typing.Any]] = collections.OrderedDict()
+        queued_count = 0
+        for index, item in enumerate(self.items):
+            key = self.target(item) if self.target else index
+            queues.setdefault(key, collections.deque()).append(item)
+            queued_count += 1
+        ready_keys = collections.deque(queues)
+        submitted_count = 0
+        running_counts: typing.Counter[typing.Hashable] = collections.Counter()
+        in_flight: typing.Dict[concurrent.futures.Future, typing.Tuple[typing.Any, typing.Hashable, int]] = {}
+        abandoned: typing.Dict[concurrent.futures.Future, typing.Hashable] = {}
+
+        def release(key: typing.Hashable) -> None:
+            running_counts[key] -= 1
+            if queues[key] and running_counts[key] == self.per_target_limit - 1:
+                ready_keys.append(key)
+
+        try:
+            while (queued_count or in_flight) and not self.is_cancelled():
+                while ready_keys and len(in_flight) < self.max_in_flight:
+                    key = ready_keys.popleft()
+                    item = queues[key].popleft()
+                    queued_count -= 1
+                    running_counts[key] += 1
+                    if queues[key] and running_counts[key] < self.per_target_limit:
+                        ready_keys.append(key)
+                    future = self.executor.submit(self.call, submitted_count, item)
+                    in_flight[future] = (item, key, submitted_count)
+                    submitted_count += 1
+                    self.add_metric('submitted')
+
+                wait_timeout = None
+                if self.timeout is not None and not in_flight:
+                    # all queued targets are busy with abandoned tasks, give them one more timeout to finish
+                    wait_timeout = self.timeout
+                elif self.timeout is not None:
+                    # queued tasks are polled to notice when they start
+                    wait_timeout = self.QUEUED_POLL_SECONDS
+                    start_times = [self.start_times.get(task_index) for _, _, task_index in in_flight.values()]
+                    if None not in start_times:
+                        wait_timeout = self.timeout
+                    started_times = [i for i in start_times if i is not None]
+                    if started_times:
+                        wait_timeout = min(wait_timeout, max(0.0, min(started_times) + self.timeout - time.monotonic()))
+                done, _ = concurrent.futures.wait(
+                    list(in_flight) + list(abandoned),
+                    timeout=wait_timeout,
+                    return_when=concurrent.futures.FIRST_COMPLETED,
+                )
+
+                for future in done:
+                    if future in abandoned:
+                        release(abandoned.pop(future))
+                        continue
+                    item, key, task_index = in_flight.pop(future)
+                    release(key)
+                    start = self.start_times.pop(task_index, time.monotonic())
+                    error = future.exception()
+                    if error is None:
+                        self.add_metric('succeeded')
+                        yield TaskResult(item, future.result(), None, time.monotonic() - start)
+                    else:
+                        self.add_metric('failed')
+                        yield TaskResult(item, None, error, time.monotonic() - start)
+
+                if not in_flight and not ready_keys and not done:
+                    for key, queue in queues.items():
+                        while queue:
+                            item = queue.popleft()
+                            queued_count -= 1
+                            self.add_metric('failed')
+                            yield TaskResult(item, None, concurrent.futures.TimeoutError(f'Target {key} is busy with tasks that did not finish in {self.timeout} seconds'), 0.0)
+
+                if self.timeout is None:
+                    continue
+                now = time.monotonic()
+                for future, (item, key, task_index) in list(in_flight.items()):
+                    start = self.start_times.get(task_index)
+                    if start is None or now - start < self.timeout or future.done():
+                        continue
+                    del in_flight[future]
+                    del self.start_times[task_index]
+                    abandoned[future] = key
+                    self.add_metric('timed_out')
+                    self.add_metric('abandoned')
+                    future.add_done_callback(lambda _: self.add_metric('abandoned', -1))
+                    yield TaskResult(item, None, concurrent.futures.TimeoutError(f'Task did not finish in {self.timeout} seconds'), now - start, timed_out=True)
+        finally:
+            cancelled_count = queued_count
+            for future in in_flight:
+                if future.cancel():
+                    cancelled_count += 1
+            self.add_metric('cancelled', cancelled_count)
+
+    def results(self) -> typing.List[TaskResult]:
+        'Wait for all tasks and get results in completion order'
+        return list(self)
+
+
+class FanoutExecutor():
+    '''
+    Shared pool of *max_workers* threads for IO-bound tasks, replaces thread pools created per request.
+
+    Threads are started on first use, pool is recreated in forked child processes
+    and shut down on exit, so no threads are leaked. Use *run* to submit a batch of tasks.
+    '''
+
+    def __init__(self, max_workers: int = FANOUT_MAX_WORKERS) -> None:
+        self.max_workers = max_workers
+        self.lock = threading.Lock()
+        self.pool: typing.Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self.metrics = FanoutMetrics()
+
+    def submit(self, func: typing.Callable[..., typing.Any], *args: typing.Any) -> concurrent.futures.Future:
+        with self.lock:
+            if self.pool is None:
+                self.pool = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='fanout')
+            return self.pool.submit(func, *args)
+
+    def run(
+            self,
+            func: typing.Callable[[typing.Any], typing.Any],
+            items: typing.Iterable[typing.Any],
+            target: typing.Optional[typing.Callable[[typing.Any], typing.Hashable]] = None,
+            timeout: typing.Optional[float] = FANOUT_TASK_TIMEOUT,
+            max_in_flight: typing.Optional[int] = None,
+            per_target_limit: int = FANOUT_PER_TARGET_LIMIT,
+    ) -> FanoutRun:
+        '''
+        Call *func* for every item in pool threads, results are streamed when iterating over returned run.
+
+        *target* - function to get key from item, e.g. hostname, tasks with the same key are limited by *per_target_limit*
+        *timeout* - seconds to wait for one task after it was started by a pool thread
+        *max_in_flight* - max tasks of this run submitted to pool at once, *max_workers* by default
+        '''
+        return FanoutRun(self, func, items, target=target, timeout=timeout, max_in_flight=max_in_flight, per_target_limit=per_target_limit)
+
+    def shutdown(self) -> None:
+        with self.lock:
+            pool = self.pool
+            self.pool = None
+        if pool:
+            pool.shutdown(wait=False)
+
+    def reset_after_fork(self) -> None:
+        'Forget inherited pool, its threads do not exist in child process'
+        self.lock = threading.Lock()
+        self.pool = None
+        self.metrics = FanoutMetrics()
+
+
+fanout_executor = FanoutExecutor()
+atexit.register(fanout_executor.shutdown)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=fanout_executor.reset_after_fork)
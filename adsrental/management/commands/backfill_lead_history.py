@@ -0,0 +1,102 @@
+import time
+import datetime
+import argparse
+import typing
+import multiprocessing
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from adsrental.models.lead import Lead
+from adsrental.models.lead_history import LeadHistory
+from adsrental.raspberry_pi_log import LogStats, get_log_stats
+
+
+def scan_log(job: typing.Tuple[str, str, datetime.date]) -> typing.Tuple[str, datetime.date, typing.Optional[LogStats]]:
+    'Process pool worker, works only with files'
+    leadid, rpid, date = job
+    return leadid, date, get_log_stats(rpid, date)
+
+
+class Command(BaseCommand):
+    '''
+    Restore :model:`adsrental.LeadHistory` from RaspberryPi logs for a range of dates.
+
+    Same calculation as *date* mode of *LeadHistoryView*, but existing entries are loaded with one query,
+    logs are scanned in parallel processes and new entries are inserted in batches.
+    '''
+    help = 'Restore LeadHistory from RaspberryPi logs for a date range'
+
+    def add_arguments(self, parser: argparse.ArgumentParser) -> None:
+        parser.add_argument('--start', type=str, required=True, help='First date in YYYY-mm-dd format')
+        parser.add_argument('--end', type=str, help='Last date in YYYY-mm-dd format, same as start by default')
+        parser.add_argument('--rpid', type=str, help='Process only one RaspberryPi')
+        parser.add_argument('--processes', type=int, default=multiprocessing.cpu_count(), help='Log scanner processes count')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Entries inserted per query')
+        parser.add_argument('--force', action='store_true', help='Replace existing entries')
+
+    @staticmethod
+    def get_dates(start: datetime.date, end: datetime.date) -> typing.List[datetime.date]:
+        return [start + datetime.timedelta(days=i) for i in range((end - start).days + 1)]
+
+    def handle(self, *args: str, **options: typing.Any) -> None:
+        start_date = datetime.datetime.strptime(options['start'], '%Y-%m-%d').date()
+        end_date = datetime.datetime.strptime(options['end'], '%Y-%m-%d').date() if options['end'] else start_date
+        dates = self.get_dates(start_date, end_date)
+
+        leads = Lead.objects.filter(status__in=Lead.STATUSES_ACTIVE, raspberry_pi__isnull=False)
+        if options['rpid']:
+            leads = leads.filter(raspberry_pi__rpid=options['rpid'])
+        leads_map = {lead.leadid: lead for lead in leads}
+
+        lead_histories = LeadHistory.objects.filter(date__gte=start_date, date__lte=end_date, lead__in=leads)
+        existing_pairs = set()
+        if options['force']:
+            deleted_count, _ = lead_histories.delete()
+            print(f'Removed {deleted_count} existing entries')
+        else:
+            existing_pairs = set(lead_histories.values_list('lead_id', 'date'))
+
+        jobs = [
+            (lead.leadid, lead.raspberry_pi_id, date)
+            for date in dates
+            for lead in leads_map.values()
+            if (lead.leadid, date) not in existing_pairs
+        ]
+        print(f'{len(leads_map)} leads, {len(dates)} days, {len(existing_pairs)} existing entries skipped, {len(jobs)} logs to scan')
+
+        # forked processes should not share DB connections with this one
+        connections.close_all()
+        start = time.time()
+        logs_count = 0
+        bytes_count = 0
+        created_count = 0
+        batch: typing.List[LeadHistory] = []
+        with multiprocessing.Pool(processes=options['processes']) as pool:
+            for index, (leadid, date, log_stats) in enumerate(pool.imap_unordered(scan_log, jobs, chunksize=16), start=1):
+                if log_stats:
+                    logs_count += 1
+                    bytes_count += log_stats.size
+                batch.append(LeadHistory.from_log_stats(leads_map[leadid], date, log_stats))
+                if len(batch) >= options['batch_size']:
+                    LeadHistory.objects.bulk_create(batch)
+                    created_count += len(batch)
+                    batch = []
+                if index % 10000 == 0:
+                    self.report(index, logs_count, bytes_count, time.time() - start)
+
+        LeadHistory.objects.bulk_create(batch)
+        created_count += len(batch)
+        self.report(len(jobs), logs_count, bytes_count, time.time() - start)
+        print(f'Created {created_count} entries')
+
+    @staticmethod
+    def report(jobs_count: int, logs_count: int, bytes_count: int, seconds: float) -> None:
+        seconds = max(seconds, 0.001)
+        print('{jobs} entries in {seconds:.1f}s: {jobs_rate:.1f} entries/s, {logs} logs, {mb_rate:.2f} MB/s read from disk'.format(
+            jobs=jobs_count,
+            seconds=seconds,
+            jobs_rate=jobs_count / seconds,
+            logs=logs_count,
+            mb_rate=bytes_count / 1024 / 1024 / seconds,
+        ))
@@ -0,0 +1,53 @@
+import timeit
+import argparse
+import typing
+from distutils.version import StrictVersion  # pylint: disable=no-name-in-module,import-error
+
+from django.core.management.base import BaseCommand
+from django.conf import settings
+
+from adsrental.raspberry_pi_firmware import firmware_policy
+
+
+class Command(BaseCommand):
+    help = 'Compare ping firmware decision time for StrictVersion comparison and precompiled firmware policy'
+
+    def add_arguments(self, parser: argparse.ArgumentParser) -> None:
+        parser.add_argument('--firmware', type=str, default=settings.RASPBERRY_PI_VERSION, help='RaspberryPi firmware version to report')
+        parser.add_argument('--beta', action='store_true')
+        parser.add_argument('--number', type=int, default=100000)
+
+    @staticmethod
+    def decide_strict_version(version: str, is_beta: bool, restart_required: bool) -> typing.Tuple[bool, bool]:
+        'Decision logic used by LogView before firmware policy'
+        restart = restart_required or StrictVersion(version) < StrictVersion('1.1.2')
+        if is_beta:
+            update = StrictVersion(version) < StrictVersion(settings.BETA_RASPBERRY_PI_VERSION)
+        else:
+            update = version != settings.RASPBERRY_PI_VERSION
+        return restart, update
+
+    def report(self, title: str, seconds: float, number: int) -> None:
+        print('{title}\t{per_call:.3f}us per call'.format(
+            title=title,
+            per_call=seconds / number * 1000000,
+        ))
+
+    def handle(self, *args: str, **options: typing.Any) -> None:
+        version = options['firmware']
+        is_beta = options['beta']
+        number = options['number']
+        rpids = ['RP{:08d}'.format(i) for i in range(1000)]
+
+        self.report('StrictVersion', timeit.timeit(
+            lambda: self.decide_strict_version(version, is_beta, False),
+            number=number,
+        ), number)
+        self.report('FirmwarePolicy', timeit.timeit(
+            lambda: firmware_policy.decide(rpids[0], version, is_beta, False),
+            number=number,
+        ), number)
+        self.report('FirmwarePolicy, 1000 RPIDs', timeit.timeit(
+            lambda: [firmware_policy.decide(rpid, version, is_beta, False) for rpid in rpids],
+            number=max(number // 1000, 1),
+        ), max(number // 1000, 1) * 1000)
@@ -0,0 +1,67 @@
+import time
+import argparse
+import statistics
+import typing
+from urllib.parse import urlencode
+from wsgiref.util import setup_testing_defaults
+
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+
+from adsrental.middlewares.ping_fast_path import PingFastPathMiddleware
+
+
+class Command(BaseCommand):
+    help = 'Compare ping latency for full Django stack and ping fast path'
+
+    def add_arguments(self, parser: argparse.ArgumentParser) -> None:
+        parser.add_argument('rpid', type=str)
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--firmware', type=str, default='', help='RaspberryPi firmware version to report')
+
+    @staticmethod
+    def get_environ(rpid: str, version: str) -> typing.Dict[str, typing.Any]:
+        environ: typing.Dict[str, typing.Any] = {}
+        setup_testing_defaults(environ)
+        query = {'rpid': rpid, 'p': ''}
+        if version:
+            query['version'] = version
+        environ.update(
+            PATH_INFO='/log/',
+            QUERY_STRING=urlencode(query),
+            REMOTE_ADDR='127.0.0.1',
+        )
+        return environ
+
+    def measure(self, application: typing.Callable, rpid: str, version: str, requests_count: int) -> typing.List[float]:
+        results = []
+        for _ in range(requests_count):
+            environ = self.get_environ(rpid, version)
+            start = time.perf_counter()
+            b''.join(application(environ, lambda status, headers: None))
+            results.append((time.perf_counter() - start) * 1000)
+
+        return results
+
+    def report(self, title: str, results: typing.List[float]) -> None:
+        results = sorted(results)
+        print('{title}\tmean {mean:.3f}ms\tp50 {p50:.3f}ms\tp95 {p95:.3f}ms\tp99 {p99:.3f}ms'.format(
+            title=title,
+            mean=statistics.mean(results),
+            p50=results[len(results) // 2],
+            p95=results[int(len(results) * 0.95)],
+            p99=results[int(len(results) * 0.99)],
+        ))
+
+    def handle(self, *args: str, **options: typing.Any) -> None:
+        rpid = options['rpid']
+        version = options['firmware']
+        requests_count = options['requests']
+        django_application = get_wsgi_application()
+        fast_path_application = PingFastPathMiddleware(django_application)
+
+        # warm up ping cache so both runs are served from cache
+        self.measure(django_application, rpid, version, 1)
+
+        self.report('Django', self.measure(django_application, rpid, version, requests_count))
+        self.report('Fast path', self.measure(fast_path_application, rpid, version, requests_count))
@@ -0,0 +1,56 @@
+import os
+import datetime
+import argparse
+
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.utils import timezone
+
+from adsrental.raspberry_pi_log import get_log_path, get_index_path, is_index_message, format_index_line, resolve_log_path, open_log
+
+
+class Command(BaseCommand):
+    help = 'Build daily index of interesting RaspberryPi log lines for days logged before index was introduced'
+
+    def add_arguments(self, parser: argparse.ArgumentParser) -> None:
+        parser.add_argument('--date', type=str, help='Date in YYYYmmdd format, yesterday by default')
+        parser.add_argument('--force', action='store_true', help='Rebuild index if it already exists')
+
+    def handle(self, *args: str, **options: str) -> None:
+        today = timezone.localtime(timezone.now()).date()
+        if options['date']:
+            date = datetime.datetime.strptime(options['date'], '%Y%m%d').date()
+        else:
+            date = today - datetime.timedelta(days=1)
+
+        if date >= today:
+            # workers keep current index open and append to it, replaced file would lose their lines
+            print(f'Index for {date} is still written by workers and can not be built')
+            return
+
+        index_path = get_index_path(date)
+        existing_index_path = resolve_log_path(index_path)
+        if existing_index_path and not options['force']:
+            print(f'Index {existing_index_path} already exists, use --force to rebuild')
+            return
+
+        # index is built in a temporary file and replaced at once, so readers never see a partial index
+        os.makedirs(os.path.dirname(index_path), exist_ok=True)
+        tmp_index_path = f'{index_path}.tmp'
+        lines_count = 0
+        with open(tmp_index_path, 'w', encoding='utf-8') as index_file:
+            for rpid in sorted(os.listdir(settings.RASPBERRY_PI_LOG_PATH)):
+                log_path = resolve_log_path(get_log_path(rpid, date))
+                if log_path is None:
+                    continue
+
+                with open_log(log_path) as log_file:
+                    for line in log_file:
+                        if is_index_message(line):
+                            index_file.write(format_index_line(rpid, line))
+                            lines_count += 1
+
+        os.replace(tmp_index_path, index_path)
+        if existing_index_path and existing_index_path != index_path:
+            os.remove(existing_index_path)
+        print(f'Indexed {lines_count} lines to {index_path}')
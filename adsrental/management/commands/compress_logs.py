@@ -0,0 +1,32 @@
+import os
+import time
+import argparse
+
+from django.core.management.base import BaseCommand
+
+from adsrental.raspberry_pi_log import iter_log_paths_to_compress, compress_log, RASPBERRY_PI_LOG_COMPRESS_DAYS
+
+
+class Command(BaseCommand):
+    help = 'Compress RaspberryPi logs and log indexes older than given number of days with gzip'
+
+    def add_arguments(self, parser: argparse.ArgumentParser) -> None:
+        parser.add_argument('--days', type=int, default=RASPBERRY_PI_LOG_COMPRESS_DAYS)
+        parser.add_argument('--test', action='store_true', help='Only show logs that would be compressed')
+
+    def handle(self, *args: str, **options: int) -> None:
+        start = time.time()
+        counter = 0
+        size_before = 0
+        size_after = 0
+        for log_path in iter_log_paths_to_compress(days=options['days']):
+            counter += 1
+            if options['test']:
+                print(f'Would compress {log_path}')
+                continue
+
+            size_before += os.path.getsize(log_path)
+            compressed_path = compress_log(log_path)
+            size_after += os.path.getsize(compressed_path)
+
+        print(f'Compressed {counter} logs in {time.time() - start:.2f}s, {size_before} bytes to {size_after} bytes')
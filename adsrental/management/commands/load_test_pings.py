@@ -0,0 +1,216 @@
+import time
+import uuid
+import random
+import argparse
+import statistics
+import typing
+import collections
+from multiprocessing.pool import ThreadPool
+from urllib.parse import urlencode
+from wsgiref.util import setup_testing_defaults
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from adsrental.models.lead import Lead
+from adsrental.models.lead_account import LeadAccount
+from adsrental.models.raspberry_pi import RaspberryPi
+from adsrental.models.ec2_instance import EC2Instance
+from adsrental.utils import PingCacheHelper
+
+
+class Command(BaseCommand):
+    '''
+    Create synthetic fleet and replay RaspberryPi traffic against device endpoints.
+
+    Requests are sent in process to the same WSGI application as served by uwsgi, including ping fast path,
+    or to a local server if *--url* is provided. With local server all devices report the same client IP.
+    Every request type is replayed separately, so latency, DB queries and cache commands
+    are reported per type. DB queries are counted only in process,
+    cache commands are counted from redis stats, so they include other clients of the same redis.
+
+    Synthetic fleet is written to DB, so command runs only with *LOCAL* or *DEBUG* settings.
+    '''
+    help = 'Create synthetic fleet and replay ping traffic, report latency, DB queries and cache commands per request type'
+
+    REQUEST_TYPES = ['p', 'h', 'client_log', 'troubleshoot', 'connection_data', 'ec2_data', 'update_ping']
+
+    def add_arguments(self, parser: argparse.ArgumentParser) -> None:
+        parser.add_argument('--fleet', type=int, default=100, help='Number of synthetic devices')
+        parser.add_argument('--requests', type=int, default=1000, help='Number of requests per request type')
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--types', type=str, default=','.join(self.REQUEST_TYPES), help='Comma-separated request types')
+        parser.add_argument('--prefix', type=str, default='LT', help='RPID prefix for synthetic devices')
+        parser.add_argument('--url', type=str, default='', help='Local server URL, e.g. http://localhost:8000, requests are sent in process if empty')
+        parser.add_argument('--host', type=str, default='localhost', help='Host header for in process requests')
+        parser.add_argument('--firmware', type=str, default=settings.RASPBERRY_PI_VERSION, help='RaspberryPi firmware version to report')
+        parser.add_argument('--cleanup', action='store_true', help='Remove synthetic fleet and exit')
+
+    @staticmethod
+    def get_rpid(prefix: str, index: int) -> str:
+        return '{}{:08d}'.format(prefix, index)
+
+    def create_fleet(self, prefix: str, size: int) -> typing.List[str]:
+        'Create missing Leads, LeadAccounts, RaspberryPis and EC2Instances for synthetic fleet'
+        rpids = [self.get_rpid(prefix, i) for i in range(1, size + 1)]
+        existing_rpids = set(RaspberryPi.objects.filter(rpid__in=rpids).values_list('rpid', flat=True))
+        now = timezone.now()
+        for index, rpid in enumerate(rpids, start=1):
+            if rpid in existing_rpids:
+                continue
+
+            raspberry_pi = RaspberryPi.objects.create(rpid=rpid, first_seen=now, first_tested=now, last_seen=now, online_since_date=now)
+            lead = Lead.objects.create(
+                leadid=str(uuid.uuid4()),
+                first_name='Load',
+                last_name='Test {}'.format(index),
+                email='{}@loadtest.local'.format(rpid.lower()),
+                status=Lead.STATUS_IN_PROGRESS,
+                raspberry_pi=raspberry_pi,
+            )
+            raspberry_pi.leadid = lead.leadid
+            raspberry_pi.save()
+            LeadAccount.objects.create(
+                lead=lead,
+                username='{}@loadtest.local'.format(rpid.lower()),
+                password='password',
+                account_type=LeadAccount.ACCOUNT_TYPE_FACEBOOK,
+                status=LeadAccount.STATUS_IN_PROGRESS,
+            )
+            EC2Instance.objects.create(
+                rpid=rpid,
+                lead=lead,
+                email=lead.email,
+                instance_id='i-{}'.format(rpid.lower()),
+                hostname='{}.loadtest.local'.format(rpid.lower()),
+                ip_address='10.0.{}.{}'.format(index // 250 % 250, index % 250),
+                status=EC2Instance.STATUS_RUNNING,
+            )
+
+        return rpids
+
+    def delete_fleet(self, prefix: str) -> None:
+        EC2Instance.objects.filter(rpid__startswith=prefix).delete()
+        Lead.objects.filter(raspberry_pi__rpid__startswith=prefix).delete()
+        RaspberryPi.objects.filter(rpid__startswith=prefix).delete()
+        ping_cache_helper = PingCacheHelper()
+        ping_cache_helper.remove_rpids([rpid for rpid in ping_cache_helper.iter_rpids() if rpid.startswith(prefix)])
+
+    @staticmethod
+    def get_ip_address(rpid: str) -> str:
+        return '10.1.{}.{}'.format(int(rpid[-6:-3]) % 250, int(rpid[-3:]) % 250)
+
+    def get_path(self, request_type: str, rpid: str, version: str) -> str:
+        if request_type == 'p':
+            return '/log/?' + urlencode({'rpid': rpid, 'p': '', 'version': version, 'hostname': '{}.loadtest.local'.format(rpid.lower())})
+        if request_type == 'h':
+            return '/log/?' + urlencode({'rpid': rpid, 'h': ''})
+        if request_type == 'client_log':
+            return '/log/?' + urlencode({'rpid': rpid, 'client_log': 'Load test message'})
+        if request_type == 'troubleshoot':
+            return '/log/?' + urlencode({
+                'rpid': rpid, 'p': '', 'version': version, 'troubleshoot': '1', 'tunnel_up': '1', 'reverse_tunnel_up': '1',
+                'hostname': '{}.loadtest.local'.format(rpid.lower()),
+            })
+        if request_type == 'connection_data':
+            return '/rpi/{}/connection_data/'.format(rpid)
+        if request_type == 'ec2_data':
+            return '/rpi/ec2_data/{}/'.format(rpid)
+        if request_type == 'update_ping':
+            return '/cron/update_ping/'
+        raise ValueError('Unknown request type: {}'.format(request_type))
+
+    def get_environ(self, options: typing.Dict[str, typing.Any], path: str, rpid: str) -> typing.Dict[str, typing.Any]:
+        environ: typing.Dict[str, typing.Any] = {}
+        setup_testing_defaults(environ)
+        path_info, _, query_string = path.partition('?')
+        environ.update(
+            PATH_INFO=path_info,
+            QUERY_STRING=query_string,
+            HTTP_HOST=options['host'],
+            REMOTE_ADDR=self.get_ip_address(rpid),
+        )
+        return environ
+
+    def send_request(self, options: typing.Dict[str, typing.Any], application: typing.Callable, request_type: str, rpid: str) -> typing.Tuple[float, int]:
+        'Send one request, returns latency in milliseconds and DB queries count, -1 if unknown'
+        path = self.get_path(request_type, rpid, options['firmware'])
+        if options['url']:
+            start = time.perf_counter()
+            requests.get(options['url'].rstrip('/') + path, timeout=30)
+            return (time.perf_counter() - start) * 1000, -1
+
+        environ = self.get_environ(options, path, rpid)
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            b''.join(application(environ, lambda status, headers: None))
+            latency = (time.perf_counter() - start) * 1000
+        return latency, len(queries)
+
+    @staticmethod
+    def get_cache_commands_count() -> typing.Optional[int]:
+        redis = PingCacheHelper.get_redis_connection()
+        if redis is None:
+            return None
+        return int(redis.info('stats')['total_commands_processed'])
+
+    def report(self, request_type: str, results: typing.List[typing.Tuple[float, int]], cache_commands: typing.Optional[int], seconds: float) -> None:
+        latencies = sorted([i[0] for i in results])
+        queries = [i[1] for i in results if i[1] >= 0]
+        print('{request_type:<16}{rps:>8.1f} rps  p50 {p50:.2f}ms  p95 {p95:.2f}ms  p99 {p99:.2f}ms  queries {queries}  cache ops {cache_ops}'.format(
+            request_type=request_type,
+            rps=len(results) / seconds,
+            p50=latencies[len(latencies) // 2],
+            p95=latencies[int(len(latencies) * 0.95)],
+            p99=latencies[int(len(latencies) * 0.99)],
+            queries='{:.1f}'.format(statistics.mean(queries)) if queries else 'n/a',
+            # one command is INFO call itself
+            cache_ops='{:.1f}'.format((cache_commands - 1) / len(results)) if cache_commands is not None else 'n/a',
+        ))
+
+    def handle(self, *args: str, **options: typing.Any) -> None:
+        if not settings.LOCAL and not settings.DEBUG:
+            raise CommandError('Load test writes synthetic fleet to DB, run it only with LOCAL or DEBUG settings')
+
+        prefix = options['prefix']
+        if options['cleanup']:
+            self.delete_fleet(prefix)
+            print('Removed synthetic fleet {}*'.format(prefix))
+            return
+
+        request_types = [i.strip() for i in options['types'].split(',') if i.strip()]
+        for request_type in request_types:
+            if request_type not in self.REQUEST_TYPES:
+                raise ValueError('Unknown request type: {}'.format(request_type))
+
+        application = None
+        if not options['url']:
+            from config.wsgi import application
+
+        start = time.time()
+        rpids = self.create_fleet(prefix, options['fleet'])
+        print('Fleet of {} devices ready in {:.2f}s'.format(len(rpids), time.time() - start))
+
+        pool = ThreadPool(processes=options['concurrency'])
+        stats: typing.Dict[str, typing.Any] = collections.OrderedDict()
+        for request_type in request_types:
+            requests_count = options['requests'] if request_type != 'update_ping' else max(options['requests'] // 100, 1)
+            jobs = [(request_type, random.choice(rpids)) for _ in range(requests_count)]
+            cache_commands_before = self.get_cache_commands_count()
+            start = time.perf_counter()
+            results = pool.starmap(lambda request_type, rpid: self.send_request(options, application, request_type, rpid), jobs)
+            seconds = time.perf_counter() - start
+            cache_commands_after = self.get_cache_commands_count()
+            cache_commands = None
+            if cache_commands_before is not None and cache_commands_after is not None:
+                cache_commands = cache_commands_after - cache_commands_before
+            stats[request_type] = (results, cache_commands, seconds)
+        pool.close()
+        pool.join()
+
+        for request_type, (results, cache_commands, seconds) in stats.items():
+            self.report(request_type, results, cache_commands, seconds)
@@ -1,4 +1,3 @@
-from multiprocessing.pool import ThreadPool
 import datetime
 import logging
 import argparse
@@ -10,11 +9,13 @@ from django.conf import settings
 from adsrental.models.lead import Lead
 from adsrental.models.lead_account import LeadAccount
 from adsrental.models.ec2_instance import EC2Instance
+from adsrental.fanout import fanout_executor
 
 
 class Command(BaseCommand):
     help = 'Revive old EC2 EC2'
     force = False
+    timeout = 90
 
     def add_arguments(self, parser: argparse.ArgumentParser) -> None:
         parser.add_argument('--facebook', action='store_true')
@@ -65,9 +66,15 @@ class Command(BaseCommand):
                 print(info_str + '\t' + 'Test')
             return
 
-        pool = ThreadPool(processes=threads)
-        results = pool.map(self.revive, ec2_instances)
+        run = fanout_executor.run(self.revive, ec2_instances, timeout=self.timeout, max_in_flight=threads)
+        revived_count = 0
+        for result in run:
+            if not result.ok:
+                print(f'{result.item.rpid}\tFailed: {result.error!r}')
+            elif result.result:
+                revived_count += 1
 
         print('================')
-        print(results)
+        print('Attempted updates', revived_count)
+        print(run.metrics.as_dict())
         print('================')
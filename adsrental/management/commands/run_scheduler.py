@@ -0,0 +1,202 @@
+import time
+import uuid
+import socket
+import datetime
+import argparse
+import traceback
+import typing
+import multiprocessing
+from multiprocessing.connection import Connection
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from adsrental.models.cron_job_run import CronJobRun
+from adsrental.scheduler import CronJob, JOBS, JOBS_MAP, is_due, get_rows_count
+
+
+class Worker(typing.NamedTuple):
+    'Long-lived process for persistent jobs, gets run datetimes and sends results over *connection*'
+    process: multiprocessing.Process
+    connection: Connection
+
+
+class RunningJob(typing.NamedTuple):
+    job: CronJob
+    run: CronJobRun
+    process: multiprocessing.Process
+    result_connection: Connection
+    token: str
+    started: float
+
+
+class Command(BaseCommand):
+    '''
+    Run periodic jobs from *adsrental.scheduler.JOBS* out of uwsgi workers.
+
+    Every job runs in a separate process, so it can be terminated on timeout.
+    Persistent jobs run in a long-lived worker process per job, that is reused between runs
+    and replaced only after timeout or crash, so process-wide connection pools are kept.
+    A job is skipped if its previous run is still in progress on this or any other host,
+    every run is saved to :model:`adsrental.CronJobRun`.
+    '''
+    help = 'Run periodic jobs with locks, timeouts and run history'
+    poll_seconds = 1
+    result_max_length = 10000
+
+    def __init__(self, *args: typing.Any, **kwargs: typing.Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.workers: typing.Dict[str, Worker] = {}
+
+    def add_arguments(self, parser: argparse.ArgumentParser) -> None:
+        parser.add_argument('--job', type=str, help='Run only this job now and exit')
+        parser.add_argument('--list', action='store_true', help='List jobs and exit')
+
+    def start_job(self, job: CronJob, now: datetime.datetime) -> typing.Optional[RunningJob]:
+        token = str(uuid.uuid4())
+        if not job.acquire_lock(token):
+            CronJobRun(name=job.name, host=socket.gethostname()).finish(CronJobRun.STATUS_SKIPPED, result='Previous run is still in progress')
+            print(f'{now} {job.name}: skipped, previous run is still in progress')
+            return None
+
+        run = CronJobRun(name=job.name, host=socket.gethostname())
+        run.save()
+
+        if job.persistent:
+            worker = self.get_worker(job)
+            worker.connection.send(now)
+            print(f'{now} {job.name}: started in worker {worker.process.pid}')
+            return RunningJob(job, run, worker.process, worker.connection, token, time.monotonic())
+
+        # forked process should not share DB connections with scheduler
+        connections.close_all()
+        parent_connection, child_connection = multiprocessing.Pipe(duplex=False)
+        process = multiprocessing.Process(target=self.run_job_process, args=(job, now, child_connection), name=f'cron_{job.name}', daemon=True)
+        process.start()
+        child_connection.close()
+        print(f'{now} {job.name}: started')
+        return RunningJob(job, run, process, parent_connection, token, time.monotonic())
+
+    @staticmethod
+    def run_job_process(job: CronJob, now: datetime.datetime, result_connection: Connection) -> None:
+        try:
+            status_code, content = job.run(now)
+            result_connection.send((status_code == 200, content))
+        except Exception:  # pylint: disable=broad-except
+            result_connection.send((False, traceback.format_exc()))
+        finally:
+            connections.close_all()
+
+    def get_worker(self, job: CronJob) -> Worker:
+        'Get alive worker process for persistent job, start a new one if needed'
+        worker = self.workers.get(job.name)
+        if worker and worker.process.is_alive():
+            return worker
+
+        # forked process should not share DB connections with scheduler
+        connections.close_all()
+        parent_connection, child_connection = multiprocessing.Pipe()
+        process = multiprocessing.Process(target=self.run_worker_process, args=(job, child_connection), name=f'cron_worker_{job.name}', daemon=True)
+        process.start()
+        child_connection.close()
+        self.workers[job.name] = Worker(process, parent_connection)
+        return self.workers[job.name]
+
+    @staticmethod
+    def run_worker_process(job: CronJob, connection: Connection) -> None:
+        'Run job every time scheduler sends run datetime, exits when scheduler closes connection'
+        while True:
+            try:
+                now = connection.recv()
+            except EOFError:
+                return
+            try:
+                status_code, content = job.run(now)
+                connection.send((status_code == 200, content))
+            except Exception:  # pylint: disable=broad-except
+                connection.send((False, traceback.format_exc()))
+            finally:
+                # DB connections are not reused between runs, they can be closed by server meanwhile
+                connections.close_all()
+
+    def stop_worker(self, job: CronJob) -> None:
+        worker = self.workers.pop(job.name, None)
+        if worker is None:
+            return
+        if worker.process.is_alive():
+            worker.process.terminate()
+        worker.process.join()
+        worker.connection.close()
+
+    def finish_job(self, running_job: RunningJob, status: str, content: str) -> None:
+        running_job.job.release_lock(running_job.token)
+        if not running_job.job.persistent:
+            running_job.result_connection.close()
+        rows_count = get_rows_count(content) if status == CronJobRun.STATUS_SUCCESS else None
+        running_job.run.finish(status, rows_count=rows_count, result=content[:self.result_max_length])
+        print(f'{datetime.datetime.now()} {running_job.job.name}: {status} in {running_job.run.duration}s, {rows_count} rows')
+
+    def check_running_job(self, running_job: RunningJob) -> bool:
+        'Save result if job is finished or timed out, returns True if job is still running'
+        if running_job.result_connection.poll():
+            try:
+                is_success, content = running_job.result_connection.recv()
+            except EOFError:
+                is_success, content = False, 'Job process exited without result'
+                if running_job.job.persistent:
+                    self.stop_worker(running_job.job)
+            if not running_job.job.persistent:
+                running_job.process.join()
+            self.finish_job(running_job, CronJobRun.STATUS_SUCCESS if is_success else CronJobRun.STATUS_FAILED, content)
+            return False
+
+        if not running_job.process.is_alive():
+            if running_job.job.persistent:
+                self.stop_worker(running_job.job)
+            self.finish_job(running_job, CronJobRun.STATUS_FAILED, f'Job process exited with code {running_job.process.exitcode}')
+            return False
+
+        if time.monotonic() - running_job.started > running_job.job.timeout:
+            if running_job.job.persistent:
+                self.stop_worker(running_job.job)
+            else:
+                running_job.process.terminate()
+                running_job.process.join()
+            self.finish_job(running_job, CronJobRun.STATUS_TIMEOUT, f'Terminated after {running_job.job.timeout} seconds')
+            return False
+
+        return True
+
+    def run_forever(self) -> None:
+        running_jobs: typing.Dict[str, RunningJob] = {}
+        last_minute = None
+        while True:
+            now = datetime.datetime.now().replace(second=0, microsecond=0)
+            if now != last_minute:
+                last_minute = now
+                for job in JOBS:
+                    if not is_due(job.schedule, now):
+                        continue
+                    running_job = self.start_job(job, now)
+                    if running_job:
+                        running_jobs[f'{job.name}_{running_job.token}'] = running_job
+
+            for key, running_job in list(running_jobs.items()):
+                if not self.check_running_job(running_job):
+                    del running_jobs[key]
+
+            time.sleep(self.poll_seconds)
+
+    def handle(self, *args: str, **options: typing.Any) -> None:
+        if options['list']:
+            for job in JOBS:
+                print(f'{job.schedule:<16}{job.name:<32}timeout {job.timeout}s')
+            return
+
+        if options['job']:
+            running_job = self.start_job(JOBS_MAP[options['job']], datetime.datetime.now())
+            while running_job and self.check_running_job(running_job):
+                time.sleep(self.poll_seconds)
+            return
+
+        self.run_forever()
@@ -0,0 +1,31 @@
+import time
+import argparse
+
+from django.core.management.base import BaseCommand
+from django.conf import settings
+
+from adsrental.utils import PingCacheHelper
+
+
+class Command(BaseCommand):
+    '''
+    Create ping cache entries for active leads with online RaspberryPi.
+
+    Run on server start before workers accept pings, so a cache flush or *CACHE_VERSION* change
+    on deploy does not make the whole fleet miss the cache at once.
+    '''
+    help = 'Create ping cache entries for all active leads that do not have one'
+
+    def add_arguments(self, parser: argparse.ArgumentParser) -> None:
+        parser.add_argument('--chunk-size', type=int, default=500)
+        parser.add_argument('--force', action='store_true', help='Warm up even if cache version did not change')
+
+    def handle(self, *args: str, **options: int) -> None:
+        start = time.time()
+        ping_cache_helper = PingCacheHelper()
+        if options['force']:
+            counter = ping_cache_helper.warm_up(chunk_size=options['chunk_size'])
+            ping_cache_helper.cache.set(ping_cache_helper.VERSION_KEY, settings.CACHE_VERSION, None)
+        else:
+            counter = ping_cache_helper.warm_up_if_required(chunk_size=options['chunk_size'])
+        print(f'Created {counter} entries in {time.time() - start:.2f}s')
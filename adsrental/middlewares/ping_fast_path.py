@@ -0,0 +1,57 @@
+import typing
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+
+from adsrental.utils import PingCacheHelper
+from adsrental.views.log import LogView
+
+
+PING_FAST_PATH = getattr(settings, 'PING_FAST_PATH', True)
+PING_FAST_PATH_URLS = getattr(settings, 'PING_FAST_PATH_URLS', ['/log/', '/app/log/'])
+
+
+class PingFastPathMiddleware:
+    '''
+    WSGI middleware that serves RaspberryPi pings from cache without Django middleware stack.
+
+    Handles only `/log/?p=...&rpid=...` requests with valid ping cache entry that do not need DB access.
+    All other requests, including cache misses and pings that reset RaspberryPi cache, are passed to Django.
+    '''
+
+    def __init__(self, application: typing.Callable) -> None:
+        self.application = application
+
+    @staticmethod
+    def is_ping_request(environ: typing.Dict[str, typing.Any]) -> bool:
+        if environ.get('REQUEST_METHOD') != 'GET':
+            return False
+        if environ.get('PATH_INFO') not in PING_FAST_PATH_URLS:
+            return False
+
+        query_string = environ.get('QUERY_STRING', '')
+        return query_string.startswith('p=') or '&p=' in query_string
+
+    def __call__(self, environ: typing.Dict[str, typing.Any], start_response: typing.Callable) -> typing.Iterable[bytes]:
+        if not PING_FAST_PATH or not self.is_ping_request(environ):
+            return self.application(environ, start_response)
+
+        request = WSGIRequest(environ)
+        rpid = request.GET.get('rpid', '').strip()
+        if not rpid or 'm' in request.GET or 'client_log' in request.GET or 'h' in request.GET:
+            return self.application(environ, start_response)
+
+        ping_cache_helper = PingCacheHelper()
+        ping_data = ping_cache_helper.get(rpid)
+        if not ping_data:
+            return self.application(environ, start_response)
+
+        view = LogView()
+        ping_data = ping_cache_helper.get_data_for_request(request, ping_data)
+        if view.is_db_required(ping_data):
+            return self.application(environ, start_response)
+
+        response = view.get_ping_response(request, rpid, ping_data, ping_cache_helper)
+        status = '{} {}'.format(response.status_code, response.reason_phrase)
+        start_response(status, list(response.items()))
+        return [response.content]
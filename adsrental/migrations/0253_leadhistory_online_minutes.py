@@ -0,0 +1,18 @@
+# Generated by Django 2.1.7 on 2019-08-10 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adsrental', '0252_auto_20190721_1234'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='leadhistory',
+            name='online_minutes',
+            field=models.IntegerField(default=0, help_text='Minutes device was online, counted on every ping'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 2.1.7 on 2019-08-12 12:00
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adsrental', '0253_leadhistory_online_minutes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CronJobRun',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(db_index=True, help_text='Job name from adsrental.scheduler.JOBS', max_length=100)),
+                ('status', models.CharField(choices=[('running', 'Running'), ('success', 'Success'), ('failed', 'Failed'), ('timeout', 'Timeout'), ('skipped', 'Skipped')], default='running', max_length=20)),
+                ('host', models.CharField(blank=True, default='', help_text='Host that ran this job', max_length=255)),
+                ('started', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('finished', models.DateTimeField(blank=True, null=True)),
+                ('duration', models.FloatField(blank=True, help_text='Duration in seconds', null=True)),
+                ('rows_count', models.IntegerField(blank=True, help_text='Number of processed rows reported by job', null=True)),
+                ('result', models.TextField(blank=True, help_text='Job response or error, truncated', null=True)),
+            ],
+            options={
+                'verbose_name': 'Cron Job Run',
+                'verbose_name_plural': 'Cron Job Runs',
+            },
+        ),
+    ]
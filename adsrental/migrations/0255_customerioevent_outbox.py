@@ -0,0 +1,43 @@
+# Generated by Django 2.1.7 on 2019-08-14 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adsrental', '0254_cronjobrun'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customerioevent',
+            name='pending',
+            field=models.BooleanField(db_index=True, default=False, help_text='Waiting in outbox to be sent to customer.io.'),
+        ),
+        migrations.AddField(
+            model_name='customerioevent',
+            name='attempts',
+            field=models.IntegerField(default=0, help_text='Failed send attempts count.'),
+        ),
+        migrations.AddField(
+            model_name='customerioevent',
+            name='next_attempt_date',
+            field=models.DateTimeField(blank=True, help_text='Do not retry sending before this date.', null=True),
+        ),
+        migrations.AddField(
+            model_name='customerioevent',
+            name='sent_date',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='customerioevent',
+            name='error',
+            field=models.TextField(blank=True, help_text='Last send error.', null=True),
+        ),
+        migrations.AlterField(
+            model_name='customerioevent',
+            name='name',
+            field=models.CharField(choices=[('shipped', 'Shipped'), ('delivered', 'Delivered'), ('offline', 'Offline'), ('lead_approved', 'Approved'), ('banned', 'Banned'), ('available_banned', 'Banned from available status'), ('banned_has_accounts', 'Banned but has other active accounts'), ('security_checkpoint', 'Security checkpoint reported'), ('not_qualified', 'Not qualified'), ('identify', 'Lead info update')], help_text='Event name. Used in customer.io filters.', max_length=255),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 2.1.7 on 2019-08-16 12:00
+
+from django.db import migrations, models
+
+
+def remove_duplicates(apps, schema_editor):
+    'Keep only the latest LeadHistory for every lead and date'
+    LeadHistory = apps.get_model('adsrental', 'LeadHistory')
+    duplicates = LeadHistory.objects.values('lead_id', 'date').annotate(
+        max_id=models.Max('id'),
+        entries_count=models.Count('id'),
+    ).filter(entries_count__gt=1)
+    for duplicate in duplicates:
+        LeadHistory.objects.filter(
+            lead_id=duplicate['lead_id'],
+            date=duplicate['date'],
+        ).exclude(id=duplicate['max_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adsrental', '0255_customerioevent_outbox'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, reverse_code=migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='leadhistory',
+            unique_together={('lead', 'date')},
+        ),
+    ]
@@ -15,3 +15,4 @@ from adsrental.models.bundler_payment import BundlerPayment  # noqa: F401
 from adsrental.models.lead_account_issue import LeadAccountIssue  # noqa: F401
 from adsrental.models.bundler_team import BundlerTeam  # noqa: F401
 from adsrental.models.lead_account_issue_image import LeadAccountIssueImage  # noqa: F401
+from adsrental.models.cron_job_run import CronJobRun  # noqa: F401
@@ -3,9 +3,10 @@ from __future__ import annotations
 import datetime
 import typing
 
-from django.db import models
+from django.db import models, transaction
 from django.apps import apps
 from django.utils import timezone
+from django_bulk_update.helper import bulk_update
 
 
 if typing.TYPE_CHECKING:
@@ -39,59 +40,132 @@ class BundlerLeadStat(models.Model):
     def __str__(self) -> str:
         return self.bundler.name
 
+    COUNTER_FIELDS = [
+        'in_progress_total',
+        'in_progress_offline',
+        'in_progress_wrong_pw',
+        'in_progress_security_checkpoint',
+        'in_progress_total_issue',
+        'autobans_last_30_days',
+        'autobans_total',
+        'bans_last_30_days',
+        'bans_total',
+        'qualified_today',
+        'qualified_yesterday',
+        'qualified_total',
+        'delivered_last_14_days',
+        'delivered_not_connected_last_14_days',
+    ]
+
     @classmethod
     def calculate(cls, bundler: Bundler) -> None:
-        obj = cls(bundler=bundler)
+        cls.calculate_many(bundler_ids=[bundler.id])
+
+    @classmethod
+    def get_counters_filters(cls, now: datetime.datetime) -> typing.Dict[str, models.Q]:
+        '''
+        Get conditions for Facebook :model:`adsrental.LeadAccount` counted in every counter field.
+        Device is online if it was seen in last *RaspberryPi.online_minutes_ttl* minutes.
+        '''
         LeadAccount = apps.get_model('adsrental', 'LeadAccount')
-        lead_accounts = LeadAccount.objects.filter(
-            lead__bundler=obj.bundler,
-            account_type__in=LeadAccount.ACCOUNT_TYPES_FACEBOOK,
-        ).prefetch_related('lead', 'lead__raspberry_pi')
-        now = timezone.localtime(timezone.now())
+        RaspberryPi = apps.get_model('adsrental', 'RaspberryPi')
         last_30_days_start = now - datetime.timedelta(days=30)
         last_14_days_start = now - datetime.timedelta(days=14)
-        delivered_last_14_days_lead_accounts = lead_accounts.filter(
+        today_start = now.replace(hour=0, minute=0, second=0)
+
+        in_progress = models.Q(status=LeadAccount.STATUS_IN_PROGRESS)
+        wrong_password = models.Q(wrong_password_date__isnull=False)
+        security_checkpoint = models.Q(security_checkpoint_date__isnull=False)
+        offline = models.Q(lead__raspberry_pi__isnull=False) & (
+            models.Q(lead__raspberry_pi__last_seen__isnull=True) |
+            models.Q(lead__raspberry_pi__first_seen__isnull=True) |
+            models.Q(lead__raspberry_pi__last_seen__lte=now - datetime.timedelta(minutes=RaspberryPi.online_minutes_ttl))
+        )
+        banned = models.Q(ban_reason__isnull=False) & ~models.Q(ban_reason='')
+        auto_banned = banned & models.Q(ban_reason__in=LeadAccount.AUTO_BAN_REASONS)
+        banned_last_30_days = models.Q(banned_date__gt=last_30_days_start)
+        qualified = models.Q(qualified_date__isnull=False)
+        delivered_last_14_days = models.Q(
             lead__delivery_date__lte=now - datetime.timedelta(days=2),
             lead__delivery_date__gte=last_14_days_start,
-        ).exclude(
-            status=LeadAccount.STATUS_AVAILABLE,
+        ) & ~models.Q(status=LeadAccount.STATUS_AVAILABLE)
+
+        return dict(
+            in_progress_total=in_progress,
+            in_progress_offline=in_progress & offline,
+            in_progress_wrong_pw=in_progress & wrong_password,
+            in_progress_security_checkpoint=in_progress & security_checkpoint,
+            in_progress_total_issue=in_progress & models.Q(lead__raspberry_pi__isnull=False) & (offline | wrong_password | security_checkpoint),
+            autobans_last_30_days=auto_banned & banned_last_30_days,
+            autobans_total=auto_banned,
+            bans_last_30_days=banned & banned_last_30_days,
+            bans_total=banned,
+            qualified_today=qualified & models.Q(qualified_date__gt=today_start),
+            qualified_yesterday=qualified & models.Q(qualified_date__lte=today_start, qualified_date__gt=today_start - datetime.timedelta(days=1)),
+            qualified_total=qualified,
+            delivered_last_14_days=delivered_last_14_days,
+            delivered_not_connected_last_14_days=delivered_last_14_days & models.Q(in_progress_date__isnull=True, status=LeadAccount.STATUS_QUALIFIED),
         )
-        obj.delivered_last_14_days = delivered_last_14_days_lead_accounts.count()
-        obj.delivered_not_connected_last_14_days = delivered_last_14_days_lead_accounts.filter(
-            in_progress_date__isnull=True,
-            status=LeadAccount.STATUS_QUALIFIED,
-        ).count()
-        for lead_account in lead_accounts:
-            lead = lead_account.lead
-            raspberry_pi = lead.raspberry_pi
-            if lead_account.status == LeadAccount.STATUS_IN_PROGRESS:
-                obj.in_progress_total += 1
-                if lead_account.is_wrong_password():
-                    obj.in_progress_wrong_pw += 1
-                if lead_account.is_security_checkpoint_reported():
-                    obj.in_progress_security_checkpoint += 1
-                if raspberry_pi:
-                    if not raspberry_pi.online():
-                        obj.in_progress_offline += 1
-                    if not raspberry_pi.online() or lead_account.is_wrong_password() or lead_account.is_security_checkpoint_reported():
-                        obj.in_progress_total_issue += 1
-
-            if lead_account.ban_reason:
-                if lead_account.ban_reason in LeadAccount.AUTO_BAN_REASONS:
-                    obj.autobans_total += 1
-                    if lead_account.banned_date and lead_account.banned_date > last_30_days_start:
-                        obj.autobans_last_30_days += 1
-
-                obj.bans_total += 1
-                if lead_account.banned_date and lead_account.banned_date > last_30_days_start:
-                    obj.bans_last_30_days += 1
-
-            if lead_account.qualified_date:
-                obj.qualified_total += 1
-                if lead_account.qualified_date > now.replace(hour=0, minute=0, second=0):
-                    obj.qualified_today += 1
-                elif lead_account.qualified_date > now.replace(hour=0, minute=0, second=0) - datetime.timedelta(days=1):
-                    obj.qualified_yesterday += 1
-
-        cls.objects.filter(bundler=bundler).delete()
-        obj.save()
+
+    @classmethod
+    def calculate_many(cls, bundler_ids: typing.Optional[typing.List[int]] = None) -> int:
+        '''
+        Calculate stats for all bundlers, or only for *bundler_ids*.
+
+        All counters for all bundlers are calculated by one grouped query with conditional counts,
+        existing entries are updated with one bulk update and missing ones created with one bulk insert.
+        Every bundler has exactly one entry afterwards, with zeros if it has no accounts.
+
+        Returns amount of processed bundlers.
+        '''
+        Bundler = apps.get_model('adsrental', 'Bundler')
+        LeadAccount = apps.get_model('adsrental', 'LeadAccount')
+        now = timezone.localtime(timezone.now())
+
+        bundlers = Bundler.objects.all()
+        lead_accounts = LeadAccount.objects.filter(
+            lead__bundler__isnull=False,
+            account_type__in=LeadAccount.ACCOUNT_TYPES_FACEBOOK,
+        )
+        if bundler_ids is not None:
+            bundlers = bundlers.filter(id__in=bundler_ids)
+            lead_accounts = lead_accounts.filter(lead__bundler_id__in=bundler_ids)
+
+        counters_map = {}
+        for row in lead_accounts.order_by().values('lead__bundler_id').annotate(**{
+                field: models.Count('id', filter=condition)
+                for field, condition in cls.get_counters_filters(now).items()
+        }):
+            counters_map[row.pop('lead__bundler_id')] = row
+
+        existing_map: typing.Dict[int, BundlerLeadStat] = {}
+        duplicate_ids = []
+        for bundler_lead_stat in cls.objects.filter(bundler_id__in=bundlers.values('id')).order_by('id'):
+            if bundler_lead_stat.bundler_id in existing_map:
+                duplicate_ids.append(bundler_lead_stat.id)
+                continue
+            existing_map[bundler_lead_stat.bundler_id] = bundler_lead_stat
+
+        new_bundler_lead_stats = []
+        changed_bundler_lead_stats = []
+        bundler_ids = list(bundlers.values_list('id', flat=True))
+        for bundler_id in bundler_ids:
+            bundler_lead_stat = existing_map.get(bundler_id)
+            if bundler_lead_stat:
+                changed_bundler_lead_stats.append(bundler_lead_stat)
+            else:
+                bundler_lead_stat = cls(bundler_id=bundler_id)
+                new_bundler_lead_stats.append(bundler_lead_stat)
+
+            counters = counters_map.get(bundler_id, {})
+            for field in cls.COUNTER_FIELDS:
+                setattr(bundler_lead_stat, field, counters.get(field, 0))
+            bundler_lead_stat.updated = now
+
+        with transaction.atomic():
+            if duplicate_ids:
+                cls.objects.filter(id__in=duplicate_ids).delete()
+            bulk_update(changed_bundler_lead_stats, update_fields=cls.COUNTER_FIELDS + ['updated'])
+            cls.objects.bulk_create(new_bundler_lead_stats)
+
+        return len(bundler_ids)
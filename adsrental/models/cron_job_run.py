@@ -0,0 +1,49 @@
+import typing
+
+from django.db import models
+from django.utils import timezone
+
+
+class CronJobRun(models.Model):
+    '''
+    Created for every periodic job run by *run_scheduler* command.
+    Used to check job durations, results and overlaps.
+    '''
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCESS = 'success'
+    STATUS_FAILED = 'failed'
+    STATUS_TIMEOUT = 'timeout'
+    STATUS_SKIPPED = 'skipped'
+
+    STATUS_CHOICES = (
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_SUCCESS, 'Success'),
+        (STATUS_FAILED, 'Failed'),
+        (STATUS_TIMEOUT, 'Timeout'),
+        (STATUS_SKIPPED, 'Skipped'),
+    )
+
+    name = models.CharField(max_length=100, db_index=True, help_text='Job name from adsrental.scheduler.JOBS')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_RUNNING)
+    host = models.CharField(max_length=255, blank=True, default='', help_text='Host that ran this job')
+    started = models.DateTimeField(default=timezone.now, db_index=True)
+    finished = models.DateTimeField(null=True, blank=True)
+    duration = models.FloatField(null=True, blank=True, help_text='Duration in seconds')
+    rows_count = models.IntegerField(null=True, blank=True, help_text='Number of processed rows reported by job')
+    result = models.TextField(blank=True, null=True, help_text='Job response or error, truncated')
+
+    class Meta:
+        verbose_name = 'Cron Job Run'
+        verbose_name_plural = 'Cron Job Runs'
+
+    def finish(self, status: str, rows_count: typing.Optional[int] = None, result: typing.Optional[str] = None) -> None:
+        'Save run result and duration'
+        self.status = status
+        self.finished = timezone.now()
+        self.duration = round((self.finished - self.started).total_seconds(), 3)
+        self.rows_count = rows_count
+        self.result = result
+        self.save()
+
+    def __str__(self) -> str:
+        return '{} at {}'.format(self.name, self.started)
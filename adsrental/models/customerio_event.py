@@ -6,6 +6,10 @@ from adsrental.models.mixins import FulltextSearchMixin
 class CustomerIOEvent(models.Model, FulltextSearchMixin):
     '''
     Stores a single event for CustomerIO entry. Related to :model:`adsrental.Lead`.
+
+    Works as an outbox: events are saved with *pending* flag and sent to customer.io
+    by *customerio_outbox* cron job, failed events are retried with exponential backoff.
+    *identify* event saves current lead info to customer.io when it is sent.
     '''
     NAME_SHIPPED = 'shipped'
     NAME_DELIVERED = 'delivered'
@@ -15,6 +19,8 @@ class CustomerIOEvent(models.Model, FulltextSearchMixin):
     NAME_AVAILABLE_BANNED = 'available_banned'
     NAME_BANNED_HAS_ACCOUNTS = 'banned_has_accounts'
     NAME_SECURITY_CHECKPOINT = 'security_checkpoint'
+    NAME_NOT_QUALIFIED = 'not_qualified'
+    NAME_IDENTIFY = 'identify'
     NAME_CHOICES = [
         (NAME_SHIPPED, 'Shipped'),
         (NAME_DELIVERED, 'Delivered'),
@@ -24,10 +30,24 @@ class CustomerIOEvent(models.Model, FulltextSearchMixin):
         (NAME_AVAILABLE_BANNED, 'Banned from available status'),
         (NAME_BANNED_HAS_ACCOUNTS, 'Banned but has other active accounts'),
         (NAME_SECURITY_CHECKPOINT, 'Security checkpoint reported'),
+        (NAME_NOT_QUALIFIED, 'Not qualified'),
+        (NAME_IDENTIFY, 'Lead info update'),
     ]
 
+    MAX_ATTEMPTS = 8
+    RETRY_BASE_SECONDS = 60
+
     lead = models.ForeignKey('adsrental.Lead', null=True, blank=True, default=None, help_text='Linked lead.', on_delete=models.CASCADE)
     name = models.CharField(max_length=255, choices=NAME_CHOICES, help_text='Event name. Used in customer.io filters.')
     kwargs = models.TextField(blank=True, null=True, help_text='Extra data sent to event, like hours_offline')
     sent = models.BooleanField(default=True, help_text='Is published to customer.io or not.')
+    pending = models.BooleanField(default=False, db_index=True, help_text='Waiting in outbox to be sent to customer.io.')
+    attempts = models.IntegerField(default=0, help_text='Failed send attempts count.')
+    next_attempt_date = models.DateTimeField(null=True, blank=True, help_text='Do not retry sending before this date.')
+    sent_date = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True, null=True, help_text='Last send error.')
     created = models.DateTimeField(auto_now_add=True)
+
+    def get_retry_delay(self) -> int:
+        'Seconds to wait before next attempt, doubles after every failed attempt'
+        return self.RETRY_BASE_SECONDS * 2 ** (self.attempts - 1)
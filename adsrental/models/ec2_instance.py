@@ -16,6 +16,7 @@ from django_bulk_update.manager import BulkUpdateManager
 import paramiko
 
 from adsrental.utils import BotoResource
+from adsrental.ssh_pool import ssh_pool, get_private_key, SSH_CONNECT_EXCEPTIONS
 
 
 if typing.TYPE_CHECKING:
@@ -77,6 +78,8 @@ class EC2Instance(models.Model):
         verbose_name_plural = 'EC2 Instances'
 
     TUNNEL_UP_TTL_SECONDS = 20 * 60
+    SSH_USERNAME = 'Administrator'
+    SSH_PORT = 40594
 
     RDP_RE = re.compile(r'TCP\s+\d+\.\d+\.\d+\.\d+:23255\s+\S+\s+ESTABLISHED')
     TUNNEL_RE = re.compile(r'TCP\s+\d+\.\d+\.\d+\.\d+:2046\s+\S+\s+LISTENING')
@@ -329,19 +332,14 @@ class EC2Instance(models.Model):
 
     def get_ssh(self, timeout: int = 20) -> paramiko.SSHClient:
         '''
-        Create SSH connection to EC2
+        Get SSH connection to EC2 from process-wide pool, connects if needed.
+        Connection is shared, so do not close it.
         '''
-        private_key = paramiko.RSAKey.from_private_key_file(settings.FARMBOT_KEY)
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-
         try:
-            ssh.connect(self.ip_address, username='Administrator', port=40594, pkey=private_key, timeout=timeout)
-        except (paramiko.ssh_exception.SSHException, EOFError, socket.timeout, OSError, paramiko.ssh_exception.NoValidConnectionsError, ConnectionResetError):
+            return ssh_pool.get_client(self.ip_address, self.SSH_PORT, self.SSH_USERNAME, pkey=get_private_key(settings.FARMBOT_KEY), timeout=timeout)
+        except SSH_CONNECT_EXCEPTIONS:
             raise SSHConnectException('Cannot connect, EC2 SSH is down')
 
-        return ssh
-
     def ssh_execute(
             self,
             cmd: str,
@@ -349,25 +347,40 @@ class EC2Instance(models.Model):
             timeout: int = 20,
     ) -> str:
         '''
-        Safe execute SSH command on EC2 and get output.
+        Safe execute SSH command on EC2 and get output. Runs in a new channel of pooled connection.
         '''
         ssh = self.get_ssh(timeout)
         try:
             ssh_stdin, ssh_stdout, ssh_stderr = ssh.exec_command(cmd, timeout=timeout)
-        except (paramiko.ssh_exception.SSHException, EOFError, socket.timeout, OSError, paramiko.ssh_exception.NoValidConnectionsError, ConnectionResetError):
+        except SSH_CONNECT_EXCEPTIONS:
+            ssh_pool.discard(self.ip_address, self.SSH_PORT, self.SSH_USERNAME)
             raise SSHConnectException('Cannot connect, EC2 SSH is down')
-        if input_list:
-            for line in input_list:
-                ssh_stdin.write('{}\n'.format(line))
-                ssh_stdin.flush()
         try:
-            stderr = ssh_stderr.read()
-            stdout = ssh_stdout.read()
-        except socket.timeout:
-            return ''
-        ssh.close()
+            if input_list:
+                for line in input_list:
+                    ssh_stdin.write('{}\n'.format(line))
+                    ssh_stdin.flush()
+            try:
+                stderr = ssh_stderr.read()
+                stdout = ssh_stdout.read()
+            except socket.timeout:
+                return ''
+        finally:
+            ssh_stdout.channel.close()
         return 'OUT: {}\nERR: {}'.format(stdout.decode(), stderr.decode())
 
+    def ssh_execute_nowait(self, cmd: str, timeout: int = 20) -> None:
+        '''
+        Start SSH command on EC2 and do not wait for output. Channel is closed by EC2 when command finishes,
+        pooled connection stays open.
+        '''
+        ssh = self.get_ssh(timeout)
+        try:
+            ssh.exec_command(cmd, timeout=timeout)
+        except SSH_CONNECT_EXCEPTIONS:
+            ssh_pool.discard(self.ip_address, self.SSH_PORT, self.SSH_USERNAME)
+            raise SSHConnectException('Cannot connect, EC2 SSH is down')
+
     @staticmethod
     def get_tag(boto_instance: boto3.resources.base.ServiceResource, key: str) -> typing.Optional[str]:
         '''
@@ -505,24 +518,14 @@ class EC2Instance(models.Model):
         if '0x1' in output:
             return
 
-        ssh = self.get_ssh()
-        cmd_to_execute = 'reg add "HKCU\\Software\\Microsoft\\Windows\\CurrentVersion\\Internet Settings" /v ProxyServer /t REG_SZ /d socks=127.0.0.1:3808 /f'
-        ssh.exec_command(cmd_to_execute)
-        cmd_to_execute = 'reg add "HKCU\\Software\\Microsoft\\Windows\\CurrentVersion\\Internet Settings" /v ProxyOverride /t REG_SZ /d localhost;127.0.0.1;169.254.169.254; /f'
-        ssh.exec_command(cmd_to_execute)
-        cmd_to_execute = 'reg add "HKCU\\Software\\Microsoft\\Windows\\CurrentVersion\\Internet Settings" /v ProxyEnable /t REG_DWORD /d 1 /f'
-        ssh.exec_command(cmd_to_execute)
-        ssh.close()
+        self.ssh_execute_nowait('reg add "HKCU\\Software\\Microsoft\\Windows\\CurrentVersion\\Internet Settings" /v ProxyServer /t REG_SZ /d socks=127.0.0.1:3808 /f')
+        self.ssh_execute_nowait('reg add "HKCU\\Software\\Microsoft\\Windows\\CurrentVersion\\Internet Settings" /v ProxyOverride /t REG_SZ /d localhost;127.0.0.1;169.254.169.254; /f')
+        self.ssh_execute_nowait('reg add "HKCU\\Software\\Microsoft\\Windows\\CurrentVersion\\Internet Settings" /v ProxyEnable /t REG_DWORD /d 1 /f')
 
     def disable_proxy(self) -> None:
-        ssh = self.get_ssh()
-        cmd_to_execute = 'reg add "HKCU\\Software\\Microsoft\\Windows\\CurrentVersion\\Internet Settings" /v ProxyServer /t REG_SZ /d socks=127.0.0.1:3808 /f'
-        ssh.exec_command(cmd_to_execute)
-        cmd_to_execute = 'reg add "HKCU\\Software\\Microsoft\\Windows\\CurrentVersion\\Internet Settings" /v ProxyOverride /t REG_SZ /d localhost;127.0.0.1;169.254.169.254; /f'
-        ssh.exec_command(cmd_to_execute)
-        cmd_to_execute = 'reg add "HKCU\\Software\\Microsoft\\Windows\\CurrentVersion\\Internet Settings" /v ProxyEnable /t REG_DWORD /d 0 /f'
-        ssh.exec_command(cmd_to_execute)
-        ssh.close()
+        self.ssh_execute_nowait('reg add "HKCU\\Software\\Microsoft\\Windows\\CurrentVersion\\Internet Settings" /v ProxyServer /t REG_SZ /d socks=127.0.0.1:3808 /f')
+        self.ssh_execute_nowait('reg add "HKCU\\Software\\Microsoft\\Windows\\CurrentVersion\\Internet Settings" /v ProxyOverride /t REG_SZ /d localhost;127.0.0.1;169.254.169.254; /f')
+        self.ssh_execute_nowait('reg add "HKCU\\Software\\Microsoft\\Windows\\CurrentVersion\\Internet Settings" /v ProxyEnable /t REG_DWORD /d 0 /f')
 
     def troubleshoot_old_pi_version(self) -> None:
         'Force update old version that do no support firmware update.'
@@ -7,7 +7,7 @@ import datetime
 
 import requests
 from django.utils import timezone
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
 from django.utils import dateformat
 from django_bulk_update.query import BulkUpdateQuerySet
@@ -19,7 +19,7 @@ from adsrental.models.lead import Lead
 from adsrental.models.comment import Comment
 from adsrental.models.lead_change import LeadChange
 from adsrental.models.bundler_payment import BundlerPayment
-from adsrental.utils import CustomerIOClient, AdsdbClient
+from adsrental.utils import CustomerIOClient, AdsdbClient, PingCacheHelper
 
 if typing.TYPE_CHECKING:
     from adsrental.models.user import User
@@ -50,7 +50,87 @@ class LeadAccountQuerySet(BulkUpdateQuerySet):
 
 
 class LeadAccountManager(models.Manager.from_queryset(LeadAccountQuerySet)):
-    pass
+    def bulk_ban(
+            self,
+            queryset: models.query.QuerySet,
+            reason: typing.Optional[str],
+            edited_by: typing.Optional[User],
+            note: typing.Optional[str] = None,
+            comment: typing.Optional[str] = None,
+            ban_leads: bool = False,
+    ) -> typing.List[LeadAccount]:
+        '''
+        Same as *LeadAccount.ban* for all not banned accounts in *queryset*.
+
+        Statuses, LeadChange entries, comments and comments caches are saved with a few queries
+        in one transaction, customer.io events are saved to outbox with one query.
+        Bundler payments are still generated per account.
+
+        *comment* - extra comment for every banned account and lead
+        *ban_leads* - ban leads of banned accounts as well
+
+        Returns list of banned accounts.
+        '''
+        now = timezone.localtime(timezone.now())
+        lead_accounts = list(queryset.exclude(status=self.model.STATUS_BANNED).select_related('lead', 'lead__bundler'))
+        if not lead_accounts:
+            return []
+
+        with transaction.atomic():
+            lead_changes = []
+            comments = []
+            for lead_account in lead_accounts:
+                old_value = lead_account.status
+                lead_account.old_status = old_value
+                lead_account.status = self.model.STATUS_BANNED
+                lead_account.ban_reason = reason
+                lead_account.banned_date = now
+                lead_account.ban_note = note
+                lead_account.generate_payments()
+                comments.append((lead_account, f'Status changed from {old_value} to {lead_account.status}'))
+                comments.append((lead_account, 'Bundler payments generated'))
+                lead_changes.append(LeadChange(
+                    lead=lead_account.lead, lead_account=lead_account, field=LeadChange.FIELD_STATUS,
+                    value=lead_account.status, old_value=old_value, edited_by=edited_by,
+                ))
+
+            self.model.bulk_add_comments(comments, edited_by)
+            if comment:
+                self.model.bulk_add_comments([(i, comment) for i in lead_accounts])
+            self.bulk_update(lead_accounts, update_fields=['status', 'old_status', 'ban_reason', 'banned_date', 'ban_note', 'comments_cache'])
+
+            LeadChange.objects.bulk_create(lead_changes)
+
+            leads = list({i.lead_id: i.lead for i in lead_accounts}.values())
+            if ban_leads:
+                Lead.bulk_ban(leads, edited_by, comment=comment)
+
+            active_accounts_map: typing.Dict[str, typing.List[LeadAccount]] = {}
+            for active_account in self.model.objects.filter(
+                    lead_id__in=[i.leadid for i in leads],
+                    active=True,
+                    status__in=self.model.STATUSES_ACTIVE,
+            ):
+                active_accounts_map.setdefault(active_account.lead_id, []).append(active_account)
+
+            leads_events = []
+            for lead_account in lead_accounts:
+                active_accounts = active_accounts_map.get(lead_account.lead_id)
+                if active_accounts:
+                    active_accounts_str = '{} account{}'.format(
+                        ' and '.join([i.account_type for i in active_accounts]),
+                        's' if len(active_accounts) > 1 else '',
+                    )
+                    leads_events.append((lead_account.lead, CustomerIOClient.EVENT_BANNED_HAS_ACCOUNTS, dict(
+                        account_type=lead_account.account_type,
+                        active_accounts=active_accounts_str,
+                    )))
+            CustomerIOClient().send_leads_events(leads_events)
+
+            rpids = [i.raspberry_pi_id for i in leads if i.raspberry_pi_id]
+            transaction.on_commit(lambda: PingCacheHelper().refresh_many(rpids))
+
+        return lead_accounts
 
 
 class LeadAccount(models.Model, FulltextSearchMixin, CommentsMixin):
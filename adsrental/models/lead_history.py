@@ -11,6 +11,8 @@ from django_bulk_update.manager import BulkUpdateManager
 
 from adsrental.models.lead import Lead
 from adsrental.models.lead_account import LeadAccount
+from adsrental.utils import OnlineMinutesHelper
+from adsrental.raspberry_pi_log import LogStats
 
 
 class LeadHistory(models.Model):
@@ -21,6 +23,9 @@ class LeadHistory(models.Model):
     ONLINE_CHECKS_MIN = 3
     WRONG_PASSWORD_CHECKS_MIN = 21
     SEC_CHECKPOINT_CHECKS_MIN = 21
+    CHECKS_PER_DAY = 24
+    MINUTES_PER_CHECK = 60
+    PINGS_PER_CHECK = 20
 
     MAX_PAYMENT = decimal.Decimal('25.00')
     NEW_MAX_PAYMENT = decimal.Decimal('15.00')
@@ -31,11 +36,15 @@ class LeadHistory(models.Model):
     class Meta:
         verbose_name = 'Lead Timestamp'
         verbose_name_plural = 'Lead Timestamps'
+        unique_together = (
+            ('lead', 'date', ),
+        )
 
     lead = models.ForeignKey(Lead, on_delete=models.CASCADE)
     date = models.DateField(db_index=True)
     checks_offline = models.IntegerField(default=0)
     checks_online = models.IntegerField(default=0)
+    online_minutes = models.IntegerField(default=0, help_text='Minutes device was online, counted on every ping')
     checks_wrong_password = models.IntegerField(default=0)
     checks_wrong_password_facebook = models.IntegerField(default=0)
     checks_wrong_password_google = models.IntegerField(default=0)
@@ -50,13 +59,27 @@ class LeadHistory(models.Model):
 
     objects = BulkUpdateManager()
 
-    def check_lead(self) -> None:
-        'Update stats for this entry'
+    def set_online_minutes(self, online_minutes: int) -> None:
+        'Set exact online minutes and convert them to hourly online and offline checks'
+        self.online_minutes = online_minutes
+        self.checks_online = min((online_minutes + self.MINUTES_PER_CHECK // 2) // self.MINUTES_PER_CHECK, self.CHECKS_PER_DAY)
+        self.checks_offline = self.CHECKS_PER_DAY - self.checks_online
+
+    def check_lead(self, online_minutes: typing.Optional[int] = None) -> None:
+        '''
+        Update stats for this entry
+
+        *online_minutes* - exact online minutes from *OnlineMinutesHelper*, if provided
+        online and offline checks are calculated from them instead of checking if device is online now
+        '''
         if not self.lead.is_active():
-            self.checks_offline += 1
+            if online_minutes is None:
+                self.checks_offline += 1
             return
 
-        if self.lead.raspberry_pi.online():
+        if online_minutes is not None:
+            self.set_online_minutes(online_minutes)
+        elif self.lead.raspberry_pi.online():
             self.checks_online += 1
         else:
             self.checks_offline += 1
@@ -83,13 +106,93 @@ class LeadHistory(models.Model):
     @classmethod
     def upsert_for_lead(cls, lead: Lead) -> None:
         'Create or update stats for this entry'
-        today = datetime.date.today()
-        lead_history = cls.objects.filter(lead=lead, date=today).first()
-        if not lead_history:
-            lead_history = cls(lead=lead, date=today)
+        cls.bulk_upsert_for_date([lead], datetime.date.today())
 
-        lead_history.check_lead()
-        lead_history.save()
+    @classmethod
+    def bulk_upsert_for_date(cls, leads: typing.Iterable[Lead], date: datetime.date) -> typing.Tuple[int, int]:
+        '''
+        Create or update stats for all *leads* for *date* with exact online minutes from *OnlineMinutesHelper*.
+
+        Leads are loaded with RaspberryPis and accounts in two queries, existing entries in one,
+        all counters are calculated in memory and saved with one bulk insert and one bulk update.
+
+        Returns created and updated entries count.
+        '''
+        lead_ids = [lead.leadid for lead in leads]
+        if not lead_ids:
+            return 0, 0
+
+        leads = Lead.objects.filter(leadid__in=lead_ids).select_related('raspberry_pi').prefetch_related('lead_accounts')
+        lead_histories_map = {i.lead_id: i for i in cls.objects.filter(date=date, lead_id__in=lead_ids)}
+        online_minutes_map = OnlineMinutesHelper().get_many([lead.raspberry_pi_id for lead in leads if lead.raspberry_pi_id], date)
+
+        new_lead_histories = []
+        changed_lead_histories = []
+        now = timezone.now()
+        for lead in leads:
+            lead_history = lead_histories_map.get(lead.leadid)
+            if lead_history:
+                changed_lead_histories.append(lead_history)
+            else:
+                lead_history = cls(lead=lead, date=date)
+                new_lead_histories.append(lead_history)
+
+            lead_history.lead = lead
+            lead_history.updated = now
+            lead_history.check_lead(online_minutes=online_minutes_map.get(lead.raspberry_pi_id, 0))
+
+        cls.objects.bulk_create(new_lead_histories, batch_size=1000)
+        cls.objects.bulk_update(changed_lead_histories, update_fields=[
+            'checks_offline',
+            'checks_online',
+            'online_minutes',
+            'checks_wrong_password',
+            'checks_wrong_password_facebook',
+            'checks_wrong_password_google',
+            'checks_wrong_password_amazon',
+            'checks_sec_checkpoint_facebook',
+            'checks_sec_checkpoint_google',
+            'checks_sec_checkpoint_amazon',
+            'updated',
+        ], batch_size=1000)
+        return len(new_lead_histories), len(changed_lead_histories)
+
+    @classmethod
+    def from_log_stats(cls, lead: Lead, date: datetime.date, log_stats: typing.Optional[LogStats]) -> 'LeadHistory':
+        '''
+        Create not saved entry from RaspberryPi daily log counters, used to restore history for past dates.
+        Potentially inaccurate, device is considered offline for the whole day if log does not exist.
+        '''
+        checks_online = 0
+        checks_wrong_password = 0
+        if log_stats:
+            checks_online = min(log_stats.pings_online // cls.PINGS_PER_CHECK, cls.CHECKS_PER_DAY)
+            checks_wrong_password = 1 if log_stats.wrong_password else 0
+        return cls(
+            lead=lead,
+            date=date,
+            checks_online=checks_online,
+            checks_offline=cls.CHECKS_PER_DAY - checks_online,
+            checks_wrong_password=checks_wrong_password,
+        )
+
+    @classmethod
+    def flush_online_minutes(cls, date: datetime.date) -> int:
+        '''
+        Update online minutes and checks for existing entries for *date* from *OnlineMinutesHelper* counters.
+        Used to save minutes counted after last hourly run for the previous day. Returns updated entries count.
+        '''
+        lead_histories = list(cls.objects.filter(date=date, lead__raspberry_pi__isnull=False).select_related('lead'))
+        rpids_map = OnlineMinutesHelper().get_many([i.lead.raspberry_pi_id for i in lead_histories], date)
+        changed_lead_histories = []
+        for lead_history in lead_histories:
+            online_minutes = rpids_map.get(lead_history.lead.raspberry_pi_id, 0)
+            if online_minutes > lead_history.online_minutes:
+                lead_history.set_online_minutes(online_minutes)
+                changed_lead_histories.append(lead_history)
+
+        cls.objects.bulk_update(changed_lead_histories, update_fields=['online_minutes', 'checks_online', 'checks_offline'])
+        return len(changed_lead_histories)
 
     def is_online(self) -> bool:
         'Check iff device was online for more than 12 checks.'
@@ -147,7 +250,12 @@ class LeadHistory(models.Model):
     def get_first_day(self) -> datetime.date:
         return self.date.replace(day=1)
 
-    def get_amount_with_note(self) -> typing.Tuple[decimal.Decimal, str]:
+    def get_amount_with_note(self, lead_accounts: typing.Optional[typing.Iterable[LeadAccount]] = None) -> typing.Tuple[decimal.Decimal, str]:
+        '''
+        Calculate amount to be paid for this day and explain it in a note.
+
+        *lead_accounts* - active lead accounts if they are already loaded, queried otherwise
+        '''
         result = decimal.Decimal('0.00')
         if not self.is_online():
             return result, 'Account is offline (${})'.format(result)
@@ -158,7 +266,9 @@ class LeadHistory(models.Model):
 
         days_in_month = (self.get_last_day() - self.get_first_day()).days + 1
         note = []
-        for lead_account in self.lead.lead_accounts.filter(active=True):
+        if lead_accounts is None:
+            lead_accounts = self.lead.lead_accounts.filter(active=True)
+        for lead_account in lead_accounts:
             if not lead_account.in_progress_date:
                 note.append('{type} account is not in-progress yet ($0.00)'.format(
                     type=lead_account.get_account_type_display(),
@@ -51,10 +51,6 @@ class LeadHistoryMonth(models.Model, FulltextSearchMixin):
     objects = BulkUpdateManager()
 
     def aggregate(self) -> None:
-        self.days_offline = 0
-        self.days_online = 0
-        self.days_wrong_password = 0
-        self.days_sec_checkpoint = 0
         lead_histories = LeadHistory.objects.filter(
             lead=self.lead,
             date__gte=self.get_first_day(),
@@ -64,10 +60,31 @@ class LeadHistoryMonth(models.Model, FulltextSearchMixin):
             'lead__raspberry_pi',
             'lead__lead_accounts',
         )
+        self.aggregate_lead_histories(lead_histories)
+        bulk_update(lead_histories, update_fields=['amount', 'note'])
+
+        prev_history = LeadHistoryMonth.objects.filter(lead=self.lead, date__lt=self.get_first_day()).order_by('-date').first()
+        self.aggregate_prev_history(prev_history)
+
+    def aggregate_lead_histories(
+            self,
+            lead_histories: typing.Iterable[LeadHistory],
+            lead_accounts: typing.Optional[typing.List[LeadAccount]] = None,
+    ) -> None:
+        '''
+        Calculate daily amounts and notes for *lead_histories* of this month and sum them up.
+        Lead histories are not saved.
+
+        *lead_accounts* - active lead accounts if they are already loaded, queried for every day otherwise
+        '''
+        self.days_offline = 0
+        self.days_online = 0
+        self.days_wrong_password = 0
+        self.days_sec_checkpoint = 0
 
         total_amount = decimal.Decimal('0.00')
         for lead_history in lead_histories:
-            amount, note = lead_history.get_amount_with_note()
+            amount, note = lead_history.get_amount_with_note(lead_accounts=lead_accounts)
             lead_history.amount = amount
             lead_history.note = note
             total_amount += amount
@@ -80,11 +97,10 @@ class LeadHistoryMonth(models.Model, FulltextSearchMixin):
             else:
                 self.days_offline += 1
 
-        bulk_update(lead_histories, update_fields=['amount', 'note'])
-
         self.amount = total_amount
 
-        prev_history = LeadHistoryMonth.objects.filter(lead=self.lead, date__lt=self.get_first_day()).order_by('-date').first()
+    def aggregate_prev_history(self, prev_history: typing.Optional[LeadHistoryMonth]) -> None:
+        'Add amount moved from *prev_history* and decide if amount should be moved to next month'
         if prev_history and prev_history.move_to_next_month:
             self.amount += prev_history.amount
             self.amount_moved = prev_history.amount
@@ -94,6 +110,75 @@ class LeadHistoryMonth(models.Model, FulltextSearchMixin):
         else:
             self.move_to_next_month = False
 
+    @classmethod
+    def bulk_aggregate(cls, leads: models.query.QuerySet, date: datetime.date) -> typing.List[LeadHistoryMonth]:
+        '''
+        Same as *get_or_create* and *aggregate* for every lead in *leads* for month of *date*.
+
+        Lead histories, active lead accounts, existing and previous month entries are loaded
+        with a few queries for all leads, results are saved with bulk updates and one bulk insert.
+        Entries with zero amount are created only if they already exist, same as single lead flow.
+
+        Returns list of aggregated entries.
+        '''
+        date_month = date.replace(day=1)
+        leads = list(leads.select_related('raspberry_pi').prefetch_related(
+            models.Prefetch('lead_accounts', queryset=LeadAccount.objects.filter(active=True), to_attr='active_lead_accounts'),
+        ))
+        lead_ids = [lead.leadid for lead in leads]
+        if not lead_ids:
+            return []
+
+        items_map = {i.lead_id: i for i in cls.objects.filter(date=date_month, lead_id__in=lead_ids)}
+        last_day = cls(date=date_month).get_last_day()
+
+        lead_histories_map: typing.Dict[str, typing.List[LeadHistory]] = {}
+        leads_map = {lead.leadid: lead for lead in leads}
+        lead_histories = list(LeadHistory.objects.filter(lead_id__in=lead_ids, date__gte=date_month, date__lte=last_day))
+        for lead_history in lead_histories:
+            lead_history.lead = leads_map[lead_history.lead_id]
+            lead_histories_map.setdefault(lead_history.lead_id, []).append(lead_history)
+
+        prev_dates_map = dict(cls.objects.filter(
+            lead_id__in=lead_ids,
+            date__lt=date_month,
+        ).values('lead_id').annotate(max_date=models.Max('date')).values_list('lead_id', 'max_date'))
+        prev_histories_map = {}
+        for prev_history in cls.objects.filter(
+                lead_id__in=prev_dates_map.keys(),
+                date__in=set(prev_dates_map.values()),
+        ):
+            if prev_dates_map[prev_history.lead_id] == prev_history.date:
+                prev_histories_map[prev_history.lead_id] = prev_history
+
+        new_items = []
+        changed_items = []
+        now = timezone.now()
+        for lead in leads:
+            item = items_map.get(lead.leadid) or cls(lead=lead, date=date_month)
+            item.lead = lead
+            item.aggregate_lead_histories(lead_histories_map.get(lead.leadid, []), lead_accounts=lead.active_lead_accounts)
+            item.aggregate_prev_history(prev_histories_map.get(lead.leadid))
+            if item.id:
+                item.updated = now
+                changed_items.append(item)
+            elif item.amount:
+                new_items.append(item)
+
+        bulk_update(lead_histories, update_fields=['amount', 'note'], batch_size=1000)
+        bulk_update(changed_items, update_fields=[
+            'days_offline',
+            'days_online',
+            'days_wrong_password',
+            'days_sec_checkpoint',
+            'amount',
+            'amount_moved',
+            'move_to_next_month',
+            'updated',
+        ], batch_size=1000)
+        cls.objects.bulk_create(new_items, batch_size=1000)
+        return changed_items + new_items
+
     @classmethod
     def get_or_create(cls, lead: Lead, date: datetime.date) -> LeadHistoryMonth:
         date_month = date.replace(day=1)
@@ -7,6 +7,8 @@ import json
 from django.utils import timezone
 from django.conf import settings
 from django.db.models import Q
+from django.apps import apps
+from django.contrib.contenttypes.models import ContentType
 
 
 class FulltextSearchMixin():
@@ -76,16 +78,22 @@ class CommentsMixin():
             res.append(item)
         return res
 
+    COMMENTS_CACHE_SIZE = 50
+
+    @staticmethod
+    def get_comment_cache_data(comment):
+        return dict(
+            created=comment.created.strftime(settings.SYSTEM_DATETIME_FORMAT),
+            text=comment.text,
+            username=comment.get_username(),
+            is_admin=comment.user.is_superuser if comment.user else False,
+            response=comment.response,
+        )
+
     def get_comments_cache(self):
         result = []
-        for comment in self.comments.all().select_related('user').order_by('-created')[:50]:
-            result.append(dict(
-                created=comment.created.strftime(settings.SYSTEM_DATETIME_FORMAT),
-                text=comment.text,
-                username=comment.get_username(),
-                is_admin=comment.user.is_superuser if comment.user else False,
-                response=comment.response,
-            ))
+        for comment in self.comments.all().select_related('user').order_by('-created')[:self.COMMENTS_CACHE_SIZE]:
+            result.append(self.get_comment_cache_data(comment))
         return result
 
     def add_comment(self, message, user=None):
@@ -93,3 +101,33 @@ class CommentsMixin():
         self.comments.create(user=user, text=message)
         self.comments_cache = json.dumps(self.get_comments_cache())
         self.save()
+
+    @classmethod
+    def bulk_add_comments(cls, instances_messages, user=None):
+        '''
+        Same as *add_comment* for many instances of this model. Comments are created with one query,
+        *comments_cache* for all instances is rebuilt with another one. Instances are not saved.
+
+        *instances_messages* - list of (instance, message) tuples, instance can be listed several times
+        '''
+        if not instances_messages:
+            return
+        comment_model = apps.get_model('adsrental', 'Comment')
+        content_type = ContentType.objects.get_for_model(cls)
+        comment_model.objects.bulk_create([
+            comment_model(content_type=content_type, object_id=str(instance.pk), user=user, text=message)
+            for instance, message in instances_messages
+        ])
+
+        instances_map = {str(instance.pk): instance for instance, _ in instances_messages}
+        comments_map = {}
+        for comment in comment_model.objects.filter(
+                content_type=content_type,
+                object_id__in=instances_map.keys(),
+        ).select_related('user').order_by('-created'):
+            comments = comments_map.setdefault(comment.object_id, [])
+            if len(comments) < cls.COMMENTS_CACHE_SIZE:
+                comments.append(cls.get_comment_cache_data(comment))
+
+        for pk, instance in instances_map.items():
+            instance.comments_cache = json.dumps(comments_map.get(pk, []))
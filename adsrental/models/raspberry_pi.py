@@ -1,6 +1,5 @@
 from __future__ import annotations
 
-import re
 import os
 import datetime
 import typing
@@ -14,7 +13,9 @@ from django.conf import settings
 from django_bulk_update.manager import BulkUpdateManager
 
 from adsrental.models.raspberry_pi_session import RaspberryPiSession
-from adsrental.utils import PingCacheHelper
+from adsrental.utils import PingCacheHelper, UniqueIPHelper
+from adsrental import raspberry_pi_log
+from adsrental.fanout import fanout_executor, FanoutRun
 from adsrental.models.user import User
 
 
@@ -61,6 +62,8 @@ class RaspberryPi(models.Model):
     TUNNEL_PASSWORD = 'keepitsecret'
     TUNNEL_PORT_START = 20000
     TUNNEL_PORT_END = 65000
+    TUNNEL_CHECK_TIMEOUT = 5
+    TUNNEL_CHECK_SLOW_SECONDS = 3
 
     PROXY_HOSTNAME_CHOICES = (
         ('178.128.1.68', 'Proxykeeper', ),
@@ -182,6 +185,20 @@ class RaspberryPi(models.Model):
         self.save()
         RaspberryPiSession.end(self)
 
+    @classmethod
+    def report_offline_many(cls, rpids: typing.List[str]) -> int:
+        '''
+        Same as *report_offline* for many devices, uses one query for devices and one for sessions.
+
+        Returns amount of updated devices.
+        '''
+        if not rpids:
+            return 0
+        now = timezone.localtime(timezone.now())
+        updated = cls.objects.filter(rpid__in=rpids).update(last_offline_reported=now, online_since_date=None)
+        RaspberryPiSession.end_many(rpids, end_date=now)
+        return updated
+
     def _update_ping(self, ping_datetime: datetime.datetime) -> bool:
         if not self.first_tested:
             self.first_tested = ping_datetime
@@ -266,10 +283,11 @@ class RaspberryPi(models.Model):
         if not log_files:
             return ''
 
+        # today log is never compressed, but older ones can be
         last_log = sorted(log_files)[-1]
         last_log_path = os.path.join(log_dir, last_log)
-        lines = open(last_log_path).readlines()[-tail:]
-        return '\n'.join([i.rstrip('\n') for i in lines])
+        lines = raspberry_pi_log.tail(last_log_path, tail)
+        return '\n'.join(reversed(lines))
 
     def get_last_seen(self) -> typing.Optional[datetime.datetime]:
         if self.last_seen is None or self.first_seen is None:
@@ -296,8 +314,9 @@ class RaspberryPi(models.Model):
         ping_data = ping_cache_helper.get(self.rpid)
 
         if ping_data:
-            self.process_ping_data(ping_data)
-            self.save()
+            if ping_data.get('last_ping'):
+                self.process_ping_data(ping_data)
+                self.save()
             ping_cache_helper.delete(self.rpid)
 
     def get_cache(self) -> typing.Optional[PingDataType]:
@@ -306,9 +325,13 @@ class RaspberryPi(models.Model):
         return ping_data
 
     def process_ping_data(self, ping_data: PingDataType) -> None:
+        'Save values reported by device, entries created by cache warm up have no *last_ping* and are skipped'
+        last_ping = ping_data.get('last_ping')
+        if not last_ping:
+            return
+
         ip_address = ping_data['ip_address']
         version = ping_data['raspberry_pi_version']
-        last_ping = ping_data.get('last_ping') or timezone.localtime(timezone.now())
 
         lead = self.get_lead()
         if lead and lead.is_active():
@@ -333,14 +356,29 @@ class RaspberryPi(models.Model):
                 http=self.get_proxy_connection_string(),
                 https=self.get_proxy_connection_string(),
             ),
-            timeout=5,
+            timeout=self.TUNNEL_CHECK_TIMEOUT,
+        )
+
+    @classmethod
+    def check_proxy_tunnels(cls, raspberry_pis: typing.Iterable[RaspberryPi]) -> FanoutRun:
+        '''
+        Check proxy tunnels in parallel, results are streamed as they come.
+        Checks are limited per proxykeeper host, so a fleet-wide sweep does not overload one of them.
+        '''
+        return fanout_executor.run(
+            cls.check_proxy_tunnel,
+            raspberry_pis,
+            target=lambda raspberry_pi: raspberry_pi.proxy_hostname,
+            timeout=cls.TUNNEL_CHECK_TIMEOUT * 2,
         )
 
     def get_unique_ips(self) -> typing.List[str]:
-        last_log = self.get_last_log(tail=1000)
-        ips = list(set(re.findall(r'\d+\.\d+\.\d+\.\d+', last_log)))
-        ips = [i for i in ips if i != self.proxy_hostname]
-        return ips
+        'Get distinct IPs device pinged from during last *UniqueIPHelper.WINDOW_SECONDS*, most recent first'
+        return [i['ip_address'] for i in self.get_ip_history()]
+
+    def get_ip_history(self) -> typing.List[typing.Dict[str, typing.Any]]:
+        'Get distinct IPs device pinged from with *first_seen* and *last_seen* datetimes, most recent first'
+        return UniqueIPHelper().get_ips(self.rpid)
 
     class Meta:
         db_table = 'raspberry_pi'
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import typing
+import datetime
 
 from django.db import models
 from django.utils import timezone
@@ -28,3 +29,8 @@ class RaspberryPiSession(models.Model):
     @classmethod
     def end(cls, raspberry_pi: RaspberryPi) -> typing.Union[models.query.QuerySet, typing.List[RaspberryPiSession]]:
         return cls.objects.filter(raspberry_pi=raspberry_pi, end_date__isnull=True).update(end_date=timezone.now())
+
+    @classmethod
+    def end_many(cls, rpids: typing.List[str], end_date: typing.Optional[datetime.datetime] = None) -> int:
+        'Close open sessions for all given RaspberryPi RPIDs in one query'
+        return cls.objects.filter(raspberry_pi_id__in=rpids, end_date__isnull=True).update(end_date=end_date or timezone.now())
@@ -0,0 +1,122 @@
+'RaspberryPi firmware version policy'
+from __future__ import annotations
+
+import re
+import zlib
+import functools
+import typing
+
+from django.conf import settings
+
+
+RASPBERRY_PI_MIN_VERSION = getattr(settings, 'RASPBERRY_PI_MIN_VERSION', '1.1.2')
+RASPBERRY_PI_ROLLOUT_VERSION = getattr(settings, 'RASPBERRY_PI_ROLLOUT_VERSION', None)
+RASPBERRY_PI_ROLLOUT_PERCENT = getattr(settings, 'RASPBERRY_PI_ROLLOUT_PERCENT', 0)
+RASPBERRY_PI_ROLLOUT_RPIDS = getattr(settings, 'RASPBERRY_PI_ROLLOUT_RPIDS', [])
+RASPBERRY_PI_VERSION_CACHE_SIZE = getattr(settings, 'RASPBERRY_PI_VERSION_CACHE_SIZE', 1024)
+
+VERSION_RE = re.compile(r'^(\d+)\.(\d+)(?:\.(\d+))?$')
+
+VersionType = typing.Tuple[int, int, int]
+
+
+@functools.lru_cache(maxsize=RASPBERRY_PI_VERSION_CACHE_SIZE)
+def parse_version(version: str) -> typing.Optional[VersionType]:
+    '''
+    Parse firmware version like *1.2* or *1.2.3* to a comparable tuple.
+    Returns None for malformed versions instead of raising.
+    Results are memoized, so every reported version is parsed only once per process.
+    '''
+    match = VERSION_RE.match(version.strip())
+    if not match:
+        return None
+
+    major, minor, patch = match.groups()
+    return int(major), int(minor), int(patch or 0)
+
+
+class FirmwareDecision(typing.NamedTuple):
+    restart: bool
+    update: bool
+    target_version: str
+
+
+class FirmwarePolicy():
+    '''
+    Decides if RaspberryPi should be restarted or updated based on reported firmware version.
+
+    Target versions are parsed once on creation. Devices older than *min_version* are restarted.
+    Stable devices are updated if version differs from *version*, beta devices are updated if they are
+    older than *beta_version*. If *rollout_version* is set, devices from *rollout_rpids* and
+    *rollout_percent* percent of the fleet get it instead of *version*. Rollout group is chosen
+    by RPID checksum, so the same devices stay in it when percent grows.
+    '''
+
+    def __init__(
+            self,
+            version: str,
+            beta_version: str,
+            min_version: str = RASPBERRY_PI_MIN_VERSION,
+            rollout_version: typing.Optional[str] = RASPBERRY_PI_ROLLOUT_VERSION,
+            rollout_percent: int = RASPBERRY_PI_ROLLOUT_PERCENT,
+            rollout_rpids: typing.Iterable[str] = RASPBERRY_PI_ROLLOUT_RPIDS,
+    ) -> None:
+        self.version = version
+        self.beta_version = beta_version
+        self.beta_version_parsed = parse_version(beta_version)
+        self.min_version_parsed = parse_version(min_version)
+        self.rollout_version = rollout_version
+        self.rollout_percent = rollout_percent
+        self.rollout_rpids = frozenset(rollout_rpids)
+
+    def is_in_rollout(self, rpid: typing.Optional[str]) -> bool:
+        'Check if device gets *rollout_version* instead of stable one'
+        if not self.rollout_version or not rpid:
+            return False
+        if rpid in self.rollout_rpids:
+            return True
+        return zlib.crc32(rpid.encode()) % 100 < self.rollout_percent
+
+    def get_target_version(self, rpid: typing.Optional[str], is_beta: bool) -> str:
+        'Get firmware version device should run'
+        if is_beta:
+            return self.beta_version
+        if self.is_in_rollout(rpid):
+            return typing.cast(str, self.rollout_version)
+        return self.version
+
+    def is_restart_required(self, version: typing.Optional[str]) -> bool:
+        'Check if device firmware is too old to work without restart'
+        if not version:
+            return False
+        version_parsed = parse_version(version)
+        return version_parsed is not None and version_parsed < self.min_version_parsed
+
+    def is_update_required(self, rpid: typing.Optional[str], version: typing.Optional[str], is_beta: bool) -> bool:
+        'Check if device should download new firmware. Devices with malformed versions are updated.'
+        if not version:
+            return False
+
+        if not is_beta:
+            return version != self.get_target_version(rpid, is_beta)
+
+        version_parsed = parse_version(version)
+        return version_parsed is None or version_parsed < self.beta_version_parsed
+
+    def decide(self, rpid: typing.Optional[str], version: typing.Optional[str], is_beta: bool = False, restart_required: bool = False) -> FirmwareDecision:
+        '''
+        Get restart and update decision for a ping in one call.
+
+        *restart_required* - restart was requested by user
+        '''
+        return FirmwareDecision(
+            restart=bool(restart_required) or self.is_restart_required(version),
+            update=self.is_update_required(rpid, version, is_beta),
+            target_version=self.get_target_version(rpid, is_beta),
+        )
+
+
+firmware_policy = FirmwarePolicy(  # pylint: disable=C0103
+    version=settings.RASPBERRY_PI_VERSION,
+    beta_version=settings.BETA_RASPBERRY_PI_VERSION,
+)
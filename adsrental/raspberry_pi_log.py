@@ -0,0 +1,340 @@
+'RaspberryPi device log helpers'
+from __future__ import annotations
+
+import os
+import gzip
+import time
+import shutil
+import atexit
+import datetime
+import threading
+import itertools
+import collections
+import typing
+
+from django.conf import settings
+
+
+RASPBERRY_PI_LOG_BUFFERED = getattr(settings, 'RASPBERRY_PI_LOG_BUFFERED', False)
+RASPBERRY_PI_LOG_MAX_OPEN_FILES = getattr(settings, 'RASPBERRY_PI_LOG_MAX_OPEN_FILES', 256)
+RASPBERRY_PI_LOG_MAX_BUFFER_LINES = getattr(settings, 'RASPBERRY_PI_LOG_MAX_BUFFER_LINES', 20)
+RASPBERRY_PI_LOG_MAX_BUFFER_SECONDS = getattr(settings, 'RASPBERRY_PI_LOG_MAX_BUFFER_SECONDS', 5)
+RASPBERRY_PI_LOG_TAIL_BLOCK_SIZE = getattr(settings, 'RASPBERRY_PI_LOG_TAIL_BLOCK_SIZE', 64 * 1024)
+RASPBERRY_PI_LOG_COMPRESS_DAYS = getattr(settings, 'RASPBERRY_PI_LOG_COMPRESS_DAYS', 7)
+# sibling of logs dir, so index is not listed as a RaspberryPi logs dir
+RASPBERRY_PI_LOG_INDEX_PATH = getattr(settings, 'RASPBERRY_PI_LOG_INDEX_PATH', os.path.normpath(settings.RASPBERRY_PI_LOG_PATH) + '_index')
+RASPBERRY_PI_LOG_INDEX_MARKERS = (
+    'Client >>>',
+    'restarting',
+    'Restarting RaspberryPi',
+    'Sending info about config update',
+    'RaspberryPi image updated',
+)
+
+
+def get_log_filename(date: datetime.date) -> str:
+    'Get daily log filename for given date'
+    return '{}.log'.format(date.strftime('%Y%m%d'))
+
+
+def get_log_path(rpid: str, date: datetime.date) -> str:
+    'Get full path to daily log for given RPID and date'
+    return os.path.join(settings.RASPBERRY_PI_LOG_PATH, rpid, get_log_filename(date))
+
+
+COMPRESSED_SUFFIX = '.gz'
+
+
+def resolve_log_path(log_path: str) -> typing.Optional[str]:
+    'Get path to existing plain or compressed version of *log_path*, or None if log does not exist'
+    if log_path.endswith(COMPRESSED_SUFFIX):
+        log_path = log_path[:-len(COMPRESSED_SUFFIX)]
+    if os.path.exists(log_path):
+        return log_path
+    if os.path.exists(log_path + COMPRESSED_SUFFIX):
+        return log_path + COMPRESSED_SUFFIX
+    return None
+
+
+def open_log(log_path: str) -> typing.TextIO:
+    '''
+    Open plain or compressed log for reading as text.
+    Compressed logs are decompressed on the fly, so they can be streamed line by line.
+    '''
+    if log_path.endswith(COMPRESSED_SUFFIX):
+        return typing.cast(typing.TextIO, gzip.open(log_path, 'rt', errors='replace'))
+    return open(log_path, errors='replace')
+
+
+def compress_log(log_path: str) -> str:
+    '''
+    Compress plain log to *log_path*.gz and remove original, returns compressed log path.
+    Compressed file is written under a temporary name and renamed, so readers never see a partial file.
+    '''
+    compressed_path = log_path + COMPRESSED_SUFFIX
+    temp_path = compressed_path + '.tmp'
+    with open(log_path, 'rb') as log_file, gzip.open(temp_path, 'wb') as compressed_file:
+        shutil.copyfileobj(log_file, compressed_file)
+    shutil.copystat(log_path, temp_path)
+    os.replace(temp_path, compressed_path)
+    os.remove(log_path)
+    return compressed_path
+
+
+def iter_log_paths_to_compress(days: int = RASPBERRY_PI_LOG_COMPRESS_DAYS) -> typing.Iterator[str]:
+    'Iterate over plain daily logs and indexes for dates older than *days* days'
+    max_filename = get_log_filename(datetime.date.today() - datetime.timedelta(days=max(days, 1)))
+    log_dirs = [os.path.join(settings.RASPBERRY_PI_LOG_PATH, dirname) for dirname in os.listdir(settings.RASPBERRY_PI_LOG_PATH)]
+    for log_dir in log_dirs + [RASPBERRY_PI_LOG_INDEX_PATH]:
+        if not os.path.isdir(log_dir):
+            continue
+        for filename in os.listdir(log_dir):
+            if filename.endswith('.log') and filename <= max_filename:
+                yield os.path.join(log_dir, filename)
+
+
+def iter_lines_reversed(log_path: str, block_size: int = RASPBERRY_PI_LOG_TAIL_BLOCK_SIZE) -> typing.Iterator[str]:
+    '''
+    Iterate over log lines from the end of file, newest first, without trailing newlines.
+
+    File is read backwards in *block_size* blocks, so only the blocks containing
+    requested lines are read regardless of file size.
+    '''
+    with open(log_path, 'rb') as log_file:
+        position = log_file.seek(0, os.SEEK_END)
+        remainder = b''
+        while position > 0:
+            read_size = min(block_size, position)
+            position -= read_size
+            log_file.seek(position)
+            lines = (log_file.read(read_size) + remainder).split(b'\n')
+            # first line can be incomplete, keep it for the next block
+            remainder = lines.pop(0)
+            for line in reversed(lines):
+                if line:
+                    yield line.decode(errors='replace')
+        if remainder:
+            yield remainder.decode(errors='replace')
+
+
+def tail(log_path: str, lines_count: int, offset: int = 0) -> typing.List[str]:
+    '''
+    Get up to *lines_count* last lines of plain or compressed log, newest first.
+
+    *offset* - number of newest lines to skip, used to browse older lines
+
+    Compressed logs cannot be read backwards, so they are streamed keeping only last lines in memory.
+    '''
+    resolved_log_path = resolve_log_path(log_path)
+    if resolved_log_path is None:
+        return []
+
+    if not resolved_log_path.endswith(COMPRESSED_SUFFIX):
+        return list(itertools.islice(iter_lines_reversed(resolved_log_path), offset, offset + lines_count))
+
+    with open_log(resolved_log_path) as log_file:
+        lines = collections.deque((line.rstrip('\n') for line in log_file if line.strip('\n')), maxlen=offset + lines_count)
+    return list(reversed(lines))[offset:]
+
+
+class LogStats(typing.NamedTuple):
+    'Counters collected from daily log'
+    pings_online: int
+    wrong_password: bool
+    size: int
+
+
+def get_log_stats(rpid: str, date: datetime.date) -> typing.Optional[LogStats]:
+    '''
+    Stream daily log for given RPID and date line by line, count successful pings
+    and check if wrong password was reported. Returns None if log does not exist.
+    *size* is log file size on disk, compressed for compressed logs.
+    '''
+    log_path = resolve_log_path(get_log_path(rpid, date))
+    if log_path is None:
+        return None
+
+    pings_online = 0
+    wrong_password = False
+    with open_log(log_path) as log_file:
+        for line in log_file:
+            pings_online += line.count('"result": true')
+            if not wrong_password and 'Wrong password' in line:
+                wrong_password = True
+    return LogStats(pings_online, wrong_password, os.path.getsize(log_path))
+
+
+def get_index_path(date: datetime.date) -> str:
+    'Get full path to daily index of interesting lines from all RPIDs'
+    return os.path.join(RASPBERRY_PI_LOG_INDEX_PATH, get_log_filename(date))
+
+
+def is_index_message(message: str) -> bool:
+    'Check if log message is interesting enough to be added to daily index: restarts, client messages, config updates'
+    return any(marker in message for marker in RASPBERRY_PI_LOG_INDEX_MARKERS)
+
+
+def format_index_line(rpid: str, line: str) -> str:
+    'Format daily index line, RPID never contains tabs'
+    return '{}\t{}'.format(rpid, line)
+
+
+def read_index(date: datetime.date, rpid: typing.Optional[str] = None) -> typing.Iterator[typing.Tuple[str, str]]:
+    '''
+    Iterate over *(rpid, line)* pairs in daily index, oldest first.
+
+    *rpid* - if provided, only lines for this RPID are returned
+    '''
+    index_path = resolve_log_path(get_index_path(date))
+    if index_path is None:
+        return
+
+    prefix = format_index_line(rpid, '') if rpid else ''
+    with open_log(index_path) as index_file:
+        for index_line in index_file:
+            if prefix and not index_line.startswith(prefix):
+                continue
+            line_rpid, _, line = index_line.partition('\t')
+            yield line_rpid, line
+
+
+class RaspberryPiLogWriter():
+    '''
+    Appends lines to RaspberryPi daily logs.
+
+    Up to *max_open_files* log files are kept open, least recently used are closed first.
+    Files are opened in append mode, so concurrent workers do not overwrite each other.
+    By default every line is written immediately in a single *write* call, so lines from all workers
+    are in chronological order and nothing is lost if worker is killed.
+
+    If *buffered* is True, lines are buffered in memory per log file and written in a single *write* call
+    when buffer has *max_buffer_lines* lines or oldest line is older than *max_buffer_seconds*.
+    It saves write calls, but every worker process has its own buffers, so lines from different workers
+    are not in chronological order and buffered lines are lost if worker is killed.
+    '''
+
+    def __init__(
+            self,
+            buffered: bool = RASPBERRY_PI_LOG_BUFFERED,
+            max_open_files: int = RASPBERRY_PI_LOG_MAX_OPEN_FILES,
+            max_buffer_lines: int = RASPBERRY_PI_LOG_MAX_BUFFER_LINES,
+            max_buffer_seconds: float = RASPBERRY_PI_LOG_MAX_BUFFER_SECONDS,
+    ) -> None:
+        self.buffered = buffered
+        self.max_open_files = max_open_files
+        self.max_buffer_lines = max_buffer_lines
+        self.max_buffer_seconds = max_buffer_seconds
+        self.lock = threading.RLock()
+        self.files: 'collections.OrderedDict[str, typing.BinaryIO]' = collections.OrderedDict()
+        self.buffers: typing.Dict[str, typing.List[str]] = {}
+        self.buffers_created: typing.Dict[str, float] = {}
+        self.flusher_pid: typing.Optional[int] = None
+
+    def write(self, rpid: str, now: datetime.datetime, line: str) -> None:
+        '''
+        Add line to RPID log for *now* date.
+
+        *rpid* - RPID string
+        *now* - local datetime of log entry, defines log filename
+        *line* - line to write, should end with newline
+        '''
+        self._append(get_log_path(rpid, now), line)
+
+    def write_index(self, rpid: str, now: datetime.datetime, line: str) -> None:
+        '''
+        Add line to daily index of interesting lines for *now* date.
+
+        Index is read by aggregated log view instead of scanning every RPID log.
+        '''
+        self._append(get_index_path(now), format_index_line(rpid, line))
+
+    def flush(self, log_path: typing.Optional[str] = None) -> None:
+        'Write buffered lines to disk for given log path, or for all logs if path is not provided.'
+        with self.lock:
+            log_paths = [log_path] if log_path else list(self.buffers.keys())
+            for path in log_paths:
+                lines = self.buffers.pop(path, None)
+                self.buffers_created.pop(path, None)
+                if lines:
+                    self._write_lines(path, lines)
+
+    def flush_expired(self) -> None:
+        'Write buffered lines for logs that have been buffered for more than *max_buffer_seconds*.'
+        deadline = time.monotonic() - self.max_buffer_seconds
+        with self.lock:
+            for log_path, created in list(self.buffers_created.items()):
+                if created <= deadline:
+                    self.flush(log_path)
+
+    def close(self) -> None:
+        'Flush all buffers and close all open files.'
+        with self.lock:
+            self.flush()
+            while self.files:
+                _, log_file = self.files.popitem()
+                log_file.close()
+
+    def _append(self, log_path: str, line: str) -> None:
+        with self.lock:
+            if not self.buffered:
+                self._write_lines(log_path, [line])
+                return
+
+            self._ensure_flusher()
+            buffer = self.buffers.setdefault(log_path, [])
+            if not buffer:
+                self.buffers_created[log_path] = time.monotonic()
+            buffer.append(line)
+            if len(buffer) >= self.max_buffer_lines:
+                self.flush(log_path)
+
+    def _get_file(self, log_path: str) -> typing.BinaryIO:
+        log_file = self.files.get(log_path)
+        if log_file is not None:
+            self.files.move_to_end(log_path)
+            return log_file
+
+        log_dir = os.path.dirname(log_path)
+        if not os.path.exists(log_dir):
+            os.makedirs(log_dir, exist_ok=True)
+
+        log_file = open(log_path, 'ab', buffering=0)
+        self.files[log_path] = log_file
+        while len(self.files) > self.max_open_files:
+            _, old_log_file = self.files.popitem(last=False)
+            old_log_file.close()
+
+        return log_file
+
+    def _write_lines(self, log_path: str, lines: typing.List[str]) -> None:
+        data = ''.join(lines).encode()
+        try:
+            self._get_file(log_path).write(data)
+        except (OSError, ValueError):
+            # file could be removed or closed, reopen and try once more
+            log_file = self.files.pop(log_path, None)
+            if log_file is not None:
+                log_file.close()
+            self._get_file(log_path).write(data)
+
+    def _ensure_flusher(self) -> None:
+        'Start background thread that flushes old buffers. Restarts it after fork.'
+        if self.flusher_pid == os.getpid():
+            return
+
+        self.flusher_pid = os.getpid()
+        self.buffers.clear()
+        self.buffers_created.clear()
+        self.files.clear()
+        thread = threading.Thread(target=self._flusher_loop, name='raspberry_pi_log_flusher', daemon=True)
+        thread.start()
+
+    def _flusher_loop(self) -> None:
+        pid = os.getpid()
+        while self.flusher_pid == pid:
+            time.sleep(self.max_buffer_seconds)
+            self.flush_expired()
+
+
+raspberry_pi_log_writer = RaspberryPiLogWriter()  # pylint: disable=C0103
+atexit.register(raspberry_pi_log_writer.close)
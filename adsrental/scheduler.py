@@ -0,0 +1,177 @@
+'Periodic jobs run by run_scheduler command instead of curl calls from crontab'
+from __future__ import annotations
+
+import json
+import datetime
+import typing
+
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.contrib.auth.models import AnonymousUser
+from django.test import RequestFactory
+from django.views import View
+
+from adsrental.views.cron.sync_ec2 import SyncEC2View
+from adsrental.views.cron.bundler_lead_stats_calculate import BundlerLeadStatsCalculateView
+from adsrental.views.cron.lead_history import LeadHistoryView
+from adsrental.views.cron.update_ping import UpdatePingView
+from adsrental.views.cron.sync_delivered import SyncDeliveredView
+from adsrental.views.cron.sync_from_shipstation import SyncFromShipStationView
+from adsrental.views.cron.sync_offline import SyncOfflineView
+from adsrental.views.cron.autoban import AutoBanView
+from adsrental.views.cron.check_ec2 import CheckEC2View
+from adsrental.views.cron.sync_adsdb import SyncAdsDBView
+from adsrental.views.cron.fix_primary import FixPrimaryView
+from adsrental.views.cron.event_not_qualified import EventNotQualifiedView
+from adsrental.views.cron.generate_bundler_bonuses import GenerateBundlerBonusesView
+from adsrental.views.cron.customerio_outbox import CustomerIOOutboxView
+from adsrental.views.cron.check_proxy_tunnels import CheckProxyTunnelsView
+
+
+WEEKDAYS = ['SUN', 'MON', 'TUE', 'WED', 'THU', 'FRI', 'SAT']
+STATS_KEYS = ('metrics', 'ssh_pool')
+ParamsType = typing.Union[typing.Dict[str, str], typing.Callable[[datetime.datetime], typing.Dict[str, str]]]
+
+
+class CronJob(typing.NamedTuple):
+    '''
+    Periodic job definition.
+
+    *schedule* - crontab expression: minute, hour, day of month, month, day of week
+    *view_class* - view that does the job, called with GET *params* like cron did with curl
+    *params* - GET params dict, or callable that gets run datetime and returns params dict
+    *timeout* - seconds after which job process is terminated
+    *persistent* - run in a long-lived worker process reused between runs instead of a new process,
+    so process-wide pools like SSH connections survive between runs
+    '''
+    name: str
+    schedule: str
+    view_class: typing.Type[View]
+    params: ParamsType = {}
+    timeout: int = 30 * 60
+    persistent: bool = False
+
+    def get_params(self, now: datetime.datetime) -> typing.Dict[str, str]:
+        if callable(self.params):
+            return self.params(now)
+        return self.params
+
+    def get_lock_key(self) -> str:
+        return 'cron_job_lock_{}'.format(self.name)
+
+    def acquire_lock(self, token: str) -> bool:
+        '''
+        Acquire distributed lock for this job in cache, so job does not overlap with itself
+        on this or other hosts. Lock expires a minute after job timeout, if it was not released.
+        '''
+        return cache.add(self.get_lock_key(), token, self.timeout + 60)
+
+    def release_lock(self, token: str) -> None:
+        'Release lock if it is still held by *token*'
+        if cache.get(self.get_lock_key()) == token:
+            cache.delete(self.get_lock_key())
+
+    def run(self, now: datetime.datetime) -> typing.Tuple[int, str]:
+        'Call job view in current process, returns HTTP status code and response content'
+        request = RequestFactory().get('/cron/{}/'.format(self.name), self.get_params(now), HTTP_SECRET=settings.CRON_SECRET)
+        request.user = AnonymousUser()
+        response = self.view_class.as_view()(request)
+        return response.status_code, response.content.decode(errors='replace')
+
+
+def get_rows_count(content: str) -> typing.Optional[int]:
+    '''
+    Get number of processed rows from job JSON response.
+    Sums *count*, *\\*_count* and *\\*_updated* values if present, otherwise sums lengths of lists.
+    Executor *metrics* and pool stats are not rows, so they are skipped.
+    '''
+    try:
+        data = json.loads(content)
+    except ValueError:
+        return None
+    if not isinstance(data, dict):
+        return None
+
+    counts = [
+        value for key, value in data.items()
+        if isinstance(value, int) and not isinstance(value, bool) and (key == 'count' or key.endswith(('_count', '_updated')))
+    ]
+    if counts:
+        return sum(counts)
+    return sum(len(value) for key, value in data.items() if isinstance(value, (list, dict)) and key not in STATS_KEYS)
+
+
+def match_cron_field(field: str, value: int, names: typing.Optional[typing.List[str]] = None, field_min: int = 0) -> bool:
+    '''
+    Check if *value* matches crontab field like *, */10, 1-5, 0,30 or MON.
+    *field_min* - lowest field value where * steps start, 1 for day of month and month, 0 for others
+    '''
+    for part in field.split(','):
+        step = 1
+        if '/' in part:
+            part, step_str = part.split('/')
+            step = int(step_str)
+        if names and part.upper() in names:
+            part = str(names.index(part.upper()))
+        if part == '*':
+            if (value - field_min) % step == 0:
+                return True
+            continue
+        if '-' in part:
+            start, end = [int(i) for i in part.split('-')]
+        else:
+            start = end = int(part)
+        if start <= value <= end and (value - start) % step == 0:
+            return True
+
+    return False
+
+
+def is_due(schedule: str, now: datetime.datetime) -> bool:
+    '''
+    Check if crontab *schedule* matches *now* minute.
+    Like cron, if both day of month and day of week are restricted, either of them can match.
+    '''
+    minute, hour, day, month, weekday = schedule.split()
+    day_matches = match_cron_field(day, now.day, field_min=1)
+    weekday_matches = match_cron_field(weekday, (now.weekday() + 1) % 7, names=WEEKDAYS)
+    if day.startswith('*') or weekday.startswith('*'):
+        days_match = day_matches and weekday_matches
+    else:
+        days_match = day_matches or weekday_matches
+    return (
+        match_cron_field(minute, now.minute) and
+        match_cron_field(hour, now.hour) and
+        match_cron_field(month, now.month, field_min=1) and
+        days_match
+    )
+
+
+JOBS = [
+    CronJob('sync_ec2', '0 * * * *', SyncEC2View, dict(pending='true', execute='true')),
+    CronJob('auto_ban', '0 0 * * *', AutoBanView, dict(execute='true')),
+    CronJob('sync_from_shipstation', '0 * * * *', SyncFromShipStationView, dict(days_ago='1')),
+    CronJob('sync_delivered', '0 * * * *', SyncDeliveredView),
+    CronJob('lead_history', '0 * * * *', LeadHistoryView, dict(now='true')),
+    CronJob('fix_primary', '0 * * * *', FixPrimaryView),
+    CronJob('sync_offline', '*/10 * * * *', SyncOfflineView, timeout=10 * 60),
+    CronJob('check_ec2', '*/10 * * * *', CheckEC2View, timeout=10 * 60, persistent=True),
+    CronJob('check_proxy_tunnels', '*/10 * * * *', CheckProxyTunnelsView, timeout=10 * 60, persistent=True),
+    CronJob('update_ping', '*/2 * * * *', UpdatePingView, timeout=5 * 60),
+    CronJob('bundler_lead_stat', '0 * * * *', BundlerLeadStatsCalculateView),
+    CronJob('sync_adsdb', '0 * * * *', SyncAdsDBView, dict(execute='true')),
+    CronJob('event_not_qualified', '*/4 * * * *', EventNotQualifiedView, timeout=10 * 60),
+    CronJob('generate_bundler_bonuses', '0 5 * * *', GenerateBundlerBonusesView, dict(execute='true')),
+    CronJob('customerio_outbox', '* * * * *', CustomerIOOutboxView, timeout=10 * 60),
+    CronJob('lead_history_aggregate', '0 5 1 * *', LeadHistoryView, lambda now: dict(
+        date=(now - relativedelta(months=1)).strftime('%Y-%m-%d'),
+        aggregate='true',
+    ), timeout=2 * 60 * 60),
+    CronJob('lead_history_aggregate_current', '0 6 * * *', LeadHistoryView, lambda now: dict(
+        date=now.strftime('%Y-%m-%d'),
+        aggregate='true',
+    ), timeout=2 * 60 * 60),
+]
+
+JOBS_MAP = {job.name: job for job in JOBS}
@@ -0,0 +1,65 @@
+'Model signal handlers'
+import typing
+
+from django.db import models, transaction
+from django.db.models.signals import pre_save, post_save
+from django.dispatch import receiver
+
+from adsrental.models.lead import Lead
+from adsrental.models.lead_account import LeadAccount
+from adsrental.models.raspberry_pi import RaspberryPi
+from adsrental.models.ec2_instance import EC2Instance
+from adsrental.utils import PingCacheHelper
+
+
+# model -> field that links instance to RaspberryPi if it can be reassigned
+RPID_FIELDS = {
+    Lead: 'raspberry_pi_id',
+    EC2Instance: 'rpid',
+}
+
+
+def get_instance_rpid(instance: models.Model) -> typing.Optional[str]:
+    'Get RPID of ping cache entry affected by given model instance change'
+    if isinstance(instance, RaspberryPi):
+        return instance.rpid
+    if isinstance(instance, Lead):
+        return instance.raspberry_pi_id
+    if isinstance(instance, LeadAccount):
+        return instance.lead.raspberry_pi_id
+    if isinstance(instance, EC2Instance):
+        return instance.rpid
+
+    return None
+
+
+@receiver(pre_save, sender=Lead, dispatch_uid='remember_ping_cache_rpid')
+@receiver(pre_save, sender=EC2Instance, dispatch_uid='remember_ping_cache_rpid')
+def remember_ping_cache_rpid(sender: typing.Type[models.Model], instance: models.Model, raw: bool = False, **kwargs: typing.Any) -> None:  # pylint: disable=W0613
+    'Remember RPID instance was linked to before save, so its ping cache entry is evicted if RaspberryPi is reassigned'
+    if raw or instance.pk is None:
+        return
+
+    field = RPID_FIELDS[sender]
+    instance._ping_cache_old_rpid = sender.objects.filter(pk=instance.pk).values_list(field, flat=True).first()  # pylint: disable=W0212
+
+
+@receiver(post_save, sender=Lead, dispatch_uid='refresh_ping_cache')
+@receiver(post_save, sender=LeadAccount, dispatch_uid='refresh_ping_cache')
+@receiver(post_save, sender=RaspberryPi, dispatch_uid='refresh_ping_cache')
+@receiver(post_save, sender=EC2Instance, dispatch_uid='refresh_ping_cache')
+def refresh_ping_cache(sender: typing.Type[models.Model], instance: models.Model, raw: bool = False, **kwargs: typing.Any) -> None:  # pylint: disable=W0613
+    '''
+    Update ping cache entry for RaspberryPi when related DB data changes, so devices get
+    new lead status, hostname or restart request on next ping.
+    Entry of RaspberryPi that was unlinked from instance is removed, so it is built from DB on next ping.
+    '''
+    if raw:
+        return
+
+    rpid = get_instance_rpid(instance)
+    old_rpid = getattr(instance, '_ping_cache_old_rpid', None)
+    if old_rpid and old_rpid != rpid:
+        transaction.on_commit(lambda: PingCacheHelper().delete(old_rpid))
+    if rpid:
+        transaction.on_commit(lambda: PingCacheHelper().refresh(rpid))
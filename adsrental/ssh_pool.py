@@ -0,0 +1,169 @@
+'Process-wide pool of authenticated SSH connections to EC2 instances'
+from __future__ import annotations
+
+import os
+import time
+import socket
+import atexit
+import threading
+import functools
+import typing
+
+import paramiko
+from django.conf import settings
+
+
+# longer than 10 minutes interval of check_ec2 job, so connections survive between its runs
+SSH_POOL_IDLE_SECONDS = getattr(settings, 'SSH_POOL_IDLE_SECONDS', 15 * 60)
+# should be larger than running EC2 fleet, sweep over more hosts than pool size evicts every connection before reuse
+SSH_POOL_MAX_SIZE = getattr(settings, 'SSH_POOL_MAX_SIZE', 500)
+SSH_CONNECT_EXCEPTIONS = (
+    paramiko.ssh_exception.SSHException,
+    paramiko.ssh_exception.NoValidConnectionsError,
+    EOFError,
+    socket.timeout,
+    ConnectionResetError,
+    OSError,
+)
+
+KeyType = typing.Tuple[str, int, str]
+
+
+@functools.lru_cache(maxsize=8)
+def _load_private_key(path: str, mtime: float) -> paramiko.RSAKey:  # pylint: disable=unused-argument
+    return paramiko.RSAKey.from_private_key_file(path)
+
+
+def get_private_key(path: str) -> paramiko.RSAKey:
+    'Get parsed RSA key from file, key is parsed again only if file was changed'
+    return _load_private_key(path, os.path.getmtime(path))
+
+
+class PooledConnection():
+    def __init__(self, client: paramiko.SSHClient) -> None:
+        self.client = client
+        self.last_used = time.monotonic()
+
+    def is_alive(self) -> bool:
+        'Check that transport is still connected, sends SSH ignore packet to detect dropped connections'
+        transport = self.client.get_transport()
+        if transport is None or not transport.is_active() or not transport.is_authenticated():
+            return False
+        try:
+            transport.send_ignore()
+        except SSH_CONNECT_EXCEPTIONS:
+            return False
+        return True
+
+    def is_idle(self, now: float, idle_seconds: float) -> bool:
+        return now - self.last_used > idle_seconds
+
+    def close(self) -> None:
+        try:
+            self.client.close()
+        except SSH_CONNECT_EXCEPTIONS:
+            pass
+
+
+class SSHConnectionPool():
+    '''
+    Keeps authenticated paramiko connections keyed by host, port and username, so every command
+    opens only a new channel on existing transport instead of a new TCP connection and SSH handshake.
+
+    Connections unused for *idle_seconds* are closed, dead ones are replaced on next use.
+    *connects_count* and *reuses_count* show how often connections are really reused.
+    Pool is emptied in forked child processes, as transports can not be shared between processes.
+    Paramiko transports support concurrent channels, so one connection can be used from several threads.
+    '''
+
+    def __init__(self, idle_seconds: float = SSH_POOL_IDLE_SECONDS, max_size: int = SSH_POOL_MAX_SIZE) -> None:
+        self.idle_seconds = idle_seconds
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.connections: typing.Dict[KeyType, PooledConnection] = {}
+        self.connects_count = 0
+        self.reuses_count = 0
+
+    def get_stats(self) -> typing.Dict[str, int]:
+        with self.lock:
+            return dict(size=len(self.connections), connects_count=self.connects_count, reuses_count=self.reuses_count)
+
+    def connect(self, host: str, port: int, username: str, pkey: paramiko.PKey, timeout: int) -> paramiko.SSHClient:
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        client.connect(host, username=username, port=port, pkey=pkey, timeout=timeout)
+        return client
+
+    def get_client(self, host: str, port: int, username: str, pkey: paramiko.PKey, timeout: int = 20) -> paramiko.SSHClient:
+        '''
+        Get connected client for host from pool, or connect a new one.
+        Raises one of *SSH_CONNECT_EXCEPTIONS* if host is not reachable.
+        '''
+        key = (host, port, username)
+        self.evict_idle()
+        with self.lock:
+            connection = self.connections.get(key)
+        if connection and connection.is_alive():
+            connection.last_used = time.monotonic()
+            with self.lock:
+                self.reuses_count += 1
+            return connection.client
+        if connection:
+            self.discard(host, port, username)
+
+        client = self.connect(host, port, username, pkey, timeout)
+        with self.lock:
+            self.connects_count += 1
+            existing_connection = self.connections.get(key)
+            if existing_connection is None:
+                self.connections[key] = PooledConnection(client)
+                extra_connections = self._pop_least_recently_used(len(self.connections) - self.max_size)
+            else:
+                # other thread connected first, keep its connection
+                existing_connection.last_used = time.monotonic()
+                extra_connections = [PooledConnection(client)]
+                client = existing_connection.client
+        for extra_connection in extra_connections:
+            extra_connection.close()
+        return client
+
+    def _pop_least_recently_used(self, count: int) -> typing.List[PooledConnection]:
+        if count <= 0:
+            return []
+        keys = sorted(self.connections, key=lambda k: self.connections[k].last_used)[:count]
+        return [self.connections.pop(key) for key in keys]
+
+    def discard(self, host: str, port: int, username: str) -> None:
+        'Close and remove connection, used when command fails on a broken connection'
+        with self.lock:
+            connection = self.connections.pop((host, port, username), None)
+        if connection:
+            connection.close()
+
+    def evict_idle(self) -> None:
+        now = time.monotonic()
+        with self.lock:
+            idle_keys = [key for key, connection in self.connections.items() if connection.is_idle(now, self.idle_seconds)]
+            idle_connections = [self.connections.pop(key) for key in idle_keys]
+        for connection in idle_connections:
+            connection.close()
+
+    def close_all(self) -> None:
+        with self.lock:
+            connections = list(self.connections.values())
+            self.connections = {}
+        for connection in connections:
+            connection.close()
+
+    def reset_after_fork(self) -> None:
+        'Forget inherited connections without closing them, they belong to parent process'
+        self.lock = threading.Lock()
+        self.connections = {}
+        self.connects_count = 0
+        self.reuses_count = 0
+
+
+ssh_pool = SSHConnectionPool()
+atexit.register(ssh_pool.close_all)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=ssh_pool.reset_after_fork)
@@ -19,6 +19,7 @@ fi
 RASPBERRYPI_ID="`head -n 1 ${HOME}/rpid.conf`"
 CONNECTION_DATA=$(curl -s "http://adsrental.com/rpi/${RASPBERRYPI_ID}/connection_data/")
 IS_BETA=`echo "$CONNECTION_DATA" | jq -r '.is_beta'`
+UPDATE_VERSION=`echo "$CONNECTION_DATA" | jq -r '.update_version'`
 ${HOME}/new-pi/client_log.sh "Response: $CONNECTION_DATA Beta: $IS_BETA"
 
 # setings.RASPBERRY_PI_VERSION
@@ -27,6 +28,10 @@ if [[ "${IS_BETA}" == "true" ]]; then
     # setings.BETA_RASPBERRY_PI_VERSION
     VERSION="2.0.8"
 fi
+# version chosen by server, includes staged rollout
+if [[ "${UPDATE_VERSION}" != "" && "${UPDATE_VERSION}" != "null" ]]; then
+    VERSION="${UPDATE_VERSION}"
+fi
 
 cd /home/pi/new-pi/
 curl https://s3-us-west-2.amazonaws.com/mvp-store/pi_patch_${VERSION}.zip > pi_patch.zip
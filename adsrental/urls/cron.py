@@ -13,6 +13,8 @@ from adsrental.views.cron.sync_adsdb import SyncAdsDBView
 from adsrental.views.cron.fix_primary import FixPrimaryView
 from adsrental.views.cron.event_not_qualified import EventNotQualifiedView
 from adsrental.views.cron.generate_bundler_bonuses import GenerateBundlerBonusesView
+from adsrental.views.cron.customerio_outbox import CustomerIOOutboxView
+from adsrental.views.cron.check_proxy_tunnels import CheckProxyTunnelsView
 
 
 urlpatterns = [  # pylint: disable=C0103
@@ -24,9 +26,11 @@ urlpatterns = [  # pylint: disable=C0103
     path('update_ping/', UpdatePingView.as_view(), name='cron_update_ping'),
     path('auto_ban/', AutoBanView.as_view(), name='cron_auto_ban'),
     path('check_ec2/', CheckEC2View.as_view(), name='cron_check_ec2'),
+    path('check_proxy_tunnels/', CheckProxyTunnelsView.as_view(), name='cron_check_proxy_tunnels'),
     path('bundler_lead_stat/', BundlerLeadStatsCalculateView.as_view(), name='cron_bundler_lead_stat'),
     path('sync_adsdb/', SyncAdsDBView.as_view(), name='cron_sync_adsdb'),
     path('fix_primary/', FixPrimaryView.as_view(), name='cron_fix_primary'),
     path('event_not_qualified/', EventNotQualifiedView.as_view(), name='cron_event_not_qualified'),
     path('generate_bundler_bonuses/', GenerateBundlerBonusesView.as_view(), name='generate_bundler_bonuses'),
+    path('customerio_outbox/', CustomerIOOutboxView.as_view(), name='cron_customerio_outbox'),
 ]
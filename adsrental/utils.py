@@ -1,6 +1,7 @@
 'Helper classes'
 from __future__ import annotations
 
+import os
 import json
 import time
 import uuid
@@ -8,20 +9,28 @@ import secrets
 import string
 import random
 import datetime
+import threading
+import collections
+import contextlib
 import typing
 
 import requests
 import boto3
 import botocore
+import botocore.config
 from django.http.request import HttpRequest
 from django.utils import timezone
 from django.core.cache import cache
 from django.conf import settings
 from django.apps import apps
+from django.db import models
+from django_redis import get_redis_connection
+from django_bulk_update.helper import bulk_update
 import customerio
 from shipstation.api import ShipStation, ShipStationOrder, ShipStationAddress, ShipStationItem, ShipStationWeight
 
 from adsrental.models.customerio_event import CustomerIOEvent
+from adsrental.fanout import fanout_executor
 
 if typing.TYPE_CHECKING:
     from adsrental.models.lead import Lead
@@ -57,13 +66,11 @@ class CustomerIOClient():
         '''
         return self.client
 
-    def send_lead(self, lead: Lead) -> None:
+    def identify_lead(self, lead: Lead) -> None:
         '''
-        Save lead info like email and phone to customer.io database.
+        Save lead info like email and phone to customer.io database right now.
 
         *lead* - :model:`adsrental.Lead` instance
-
-        Returns customerio.CustomerIO instance.
         '''
         clean_phone = '+1' + (''.join([i for i in lead.phone if i.isdigit()])) if lead.phone else ''
         if self.client:
@@ -84,15 +91,43 @@ class CustomerIOClient():
 
             )
 
+    def send_lead(self, lead: Lead) -> None:
+        '''
+        Queue lead info update to customer.io. Lead info is read when outbox is processed,
+        so several updates queued in a row are sent only once.
+
+        *lead* - :model:`adsrental.Lead` instance
+        '''
+        if not self.client:
+            return
+        CustomerIOEvent(
+            lead=lead,
+            name=CustomerIOEvent.NAME_IDENTIFY,
+            sent=False,
+            pending=True,
+        ).save()
+
+    def send_leads(self, leads: typing.List[Lead]) -> None:
+        'Same as *send_lead* for many leads, queues all updates with one query.'
+        if not self.client:
+            return
+        CustomerIOEvent.objects.bulk_create([
+            CustomerIOEvent(
+                lead=lead,
+                name=CustomerIOEvent.NAME_IDENTIFY,
+                sent=False,
+                pending=True,
+            ) for lead in leads
+        ])
+
     def send_lead_event(self, lead: Lead, event: str, **kwargs: str) -> None:
         '''
         Create a new :model:`adsrental.Lead` event, like banned or approved.
+        Event is sent to customer.io later by *customerio_outbox* cron job.
 
         *lead* - :model:`adsrental.Lead` instance
         *event* - event name, should be one of listed.
         All other keyword arguments are passed to  CustomerIOEvent kwrags
-
-        Returns customerio.CustomerIO instance.
         '''
         send = True
         if not self.client:
@@ -102,17 +137,124 @@ class CustomerIOClient():
         CustomerIOEvent(
             lead=lead,
             name=event,
-            sent=send,
+            sent=False,
+            pending=send,
             kwargs=json.dumps(kwargs),
         ).save()
-        if self.client and send:
-            retries = 0
+
+    def send_leads_events(self, leads_events: typing.List[typing.Tuple[Lead, str, typing.Dict[str, typing.Any]]]) -> None:
+        '''
+        Same as *send_lead_event* for many leads, saves all events in one query.
+
+        *leads_events* - list of (lead, event, kwargs) tuples
+        '''
+        CustomerIOEvent.objects.bulk_create([
+            CustomerIOEvent(
+                lead=lead,
+                name=event,
+                sent=False,
+                pending=bool(self.client and lead.customerio_enabled),
+                kwargs=json.dumps(kwargs),
+            ) for lead, event, kwargs in leads_events
+        ])
+
+    def send_outbox_events(self, events: typing.List[CustomerIOEvent], now: datetime.datetime) -> None:
+        '''
+        Send queued events of one lead in creation order and update their state, does not save them.
+
+        Lead info is sent once even if several *identify* events are queued.
+        If event fails, its retry is delayed exponentially and following events of this lead
+        are delayed as well to keep order. Event is dropped after *CustomerIOEvent.MAX_ATTEMPTS* failures.
+        '''
+        identified = False
+        failed_event: typing.Optional[CustomerIOEvent] = None
+        for event in events:
+            if failed_event:
+                event.next_attempt_date = failed_event.next_attempt_date
+                continue
+
             try:
-                return self.client.track(customer_id=lead.leadid, name=event, **kwargs)
-            except customerio.CustomerIOException:
-                retries += 1
-                if retries >= 3:
-                    raise
+                if event.lead is None:
+                    event.pending = False
+                    event.error = 'Lead does not exist'
+                    continue
+                if event.name == CustomerIOEvent.NAME_IDENTIFY:
+                    if not identified:
+                        self.identify_lead(event.lead)
+                        identified = True
+                elif event.lead.customerio_enabled:
+                    self.client.track(customer_id=event.lead.leadid, name=event.name, **json.loads(event.kwargs or '{}'))
+                else:
+                    event.pending = False
+                    continue
+            except Exception as e:  # pylint: disable=broad-except
+                event.attempts += 1
+                event.error = '{}: {}'.format(type(e).__name__, e)
+                event.next_attempt_date = now + datetime.timedelta(seconds=event.get_retry_delay())
+                if event.attempts >= CustomerIOEvent.MAX_ATTEMPTS:
+                    event.pending = False
+                else:
+                    failed_event = event
+                continue
+
+            event.sent = True
+            event.pending = False
+            event.sent_date = now
+            event.error = None
+
+    @classmethod
+    def send_outbox(cls, batch_size: int = 1000, threads: int = 4) -> typing.Dict[str, int]:
+        '''
+        Send up to *batch_size* pending :model:`adsrental.CustomerIOEvent` entries ready for (re)try.
+
+        Leads are processed by up to *threads* parallel tasks on *fanout_executor*, every thread reuses its own
+        customer.io HTTP session. Events of one lead are always sent by one task in order,
+        and leads with an event waiting for retry are skipped until it is retried.
+
+        Returns sent, retry and dropped events count.
+        '''
+        if not cls().is_enabled():
+            return dict(sent_count=0, retry_count=0, dropped_count=0)
+
+        now = timezone.now()
+        retry_lead_ids = CustomerIOEvent.objects.filter(
+            pending=True,
+            next_attempt_date__gt=now,
+            lead__isnull=False,
+        ).values('lead_id')
+        events = list(CustomerIOEvent.objects.filter(
+            pending=True,
+        ).filter(
+            models.Q(next_attempt_date__isnull=True) | models.Q(next_attempt_date__lte=now),
+        ).exclude(
+            lead_id__in=retry_lead_ids,
+        ).select_related('lead', 'lead__raspberry_pi').order_by('id')[:batch_size])
+        if not events:
+            return dict(sent_count=0, retry_count=0, dropped_count=0)
+
+        lead_events: typing.Dict[typing.Optional[int], typing.List[CustomerIOEvent]] = collections.OrderedDict()
+        for event in events:
+            lead_events.setdefault(event.lead_id, []).append(event)
+
+        thread_data = threading.local()
+
+        def send(lead_events_list: typing.List[CustomerIOEvent]) -> None:
+            if not hasattr(thread_data, 'client'):
+                thread_data.client = cls()
+            thread_data.client.send_outbox_events(lead_events_list, now)
+
+        # no timeout, events are updated in place and saved only after all tasks are finished
+        run = fanout_executor.run(send, lead_events.values(), target=lambda i: i[0].lead_id, timeout=None, max_in_flight=threads)
+        errors = [result.error for result in run if not result.ok]
+
+        bulk_update(events, update_fields=['sent', 'pending', 'attempts', 'next_attempt_date', 'sent_date', 'error'])
+        if errors:
+            raise errors[0]
+        return dict(
+            sent_count=len([i for i in events if i.sent]),
+            retry_count=len([i for i in events if i.pending]),
+            dropped_count=len([i for i in events if not i.sent and not i.pending]),
+        )
 
     def is_enabled(self) -> bool:
         'Check if client is initialized.'
@@ -212,27 +354,110 @@ class ShipStationClient():
         return data
 
 
-class BotoResource():
-    'Handles AWS boto operations.'
+class BotoRegistry():
+    '''
+    Process-wide registry of AWS session, clients and resources, created on first use.
+
+    Clients are thread-safe, so one client per service is shared by all threads and keeps its connection pool.
+    Resources are not thread-safe, so they are cached per thread.
+    Registry is emptied in forked child processes, as connection pools can not be shared between processes.
+    Use *override* to replace a client or resource with a stub in tests.
+    '''
+    MAX_POOL_CONNECTIONS = getattr(settings, 'AWS_MAX_POOL_CONNECTIONS', 50)
 
     def __init__(self) -> None:
-        self.session = boto3.Session(
-            aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-        )
-        self.resources: typing.Dict = {}
+        self.lock = threading.RLock()
+        self.session: typing.Optional[boto3.Session] = None
+        self.clients: typing.Dict[typing.Tuple[str, str], botocore.client.BaseClient] = {}
+        self.local = threading.local()
+        self.overrides: typing.Dict[str, typing.Dict[str, typing.Any]] = {}
+
+    def get_session(self) -> boto3.Session:
+        with self.lock:
+            if self.session is None:
+                self.session = boto3.Session(
+                    aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+                    aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+                )
+            return self.session
+
+    def get_client(self, service: str, region_name: typing.Optional[str] = None) -> botocore.client.BaseClient:
+        region_name = region_name or settings.AWS_REGION
+        with self.lock:
+            if 'client' in self.overrides.get(service, {}):
+                return self.overrides[service]['client']
+            key = (service, region_name)
+            if key not in self.clients:
+                # session is not thread-safe, so clients are created under lock
+                self.clients[key] = self.get_session().client(
+                    service,
+                    region_name=region_name,
+                    config=botocore.config.Config(max_pool_connections=self.MAX_POOL_CONNECTIONS),
+                )
+            return self.clients[key]
+
+    def get_resource(self, service: str, region_name: typing.Optional[str] = None) -> boto3.resources.base.ServiceResource:
+        region_name = region_name or settings.AWS_REGION
+        with self.lock:
+            if 'resource' in self.overrides.get(service, {}):
+                return self.overrides[service]['resource']
+        resources = getattr(self.local, 'resources', None)
+        if resources is None:
+            resources = self.local.resources = {}
+        key = (service, region_name)
+        if key not in resources:
+            with self.lock:
+                resources[key] = self.get_session().resource(service, region_name=region_name)
+        return resources[key]
+
+    @contextlib.contextmanager
+    def override(self, service: str, client: typing.Any = None, resource: typing.Any = None) -> typing.Iterator[None]:
+        'Return given stub client and/or resource for service inside this context'
+        stubs = {}
+        if client is not None:
+            stubs['client'] = client
+        if resource is not None:
+            stubs['resource'] = resource
+        with self.lock:
+            previous = self.overrides.get(service)
+            self.overrides[service] = stubs
+        try:
+            yield
+        finally:
+            with self.lock:
+                if previous is None:
+                    self.overrides.pop(service, None)
+                else:
+                    self.overrides[service] = previous
+
+    def reset(self) -> None:
+        'Drop cached session, clients and resources, they are created again on next use'
+        with self.lock:
+            self.session = None
+            self.clients = {}
+            self.local = threading.local()
+
+    def reset_after_fork(self) -> None:
+        'Inherited lock can be held by other thread of parent process, so it is replaced first'
+        self.lock = threading.RLock()
+        self.reset()
+
 
-    def get_resource(self, service: str = 'ec2') -> boto3.resource:
-        'Get boto resource for given service. Chaches results.'
-        if not self.resources.get(service):
-            resource = self.session.resource(
-                service, region_name=settings.AWS_REGION)
-            self.resources[service] = resource
+boto_registry = BotoRegistry()
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=boto_registry.reset_after_fork)
 
-        return self.resources[service]
+
+class BotoResource():
+    'Handles AWS boto operations. Sessions, clients and resources are shared via *boto_registry*.'
+
+    def get_resource(self, service: str = 'ec2') -> boto3.resources.base.ServiceResource:
+        'Get boto resource for given service, cached per thread.'
+        return boto_registry.get_resource(service)
 
     def get_client(self, service: str) -> botocore.client.BaseClient:
-        return self.session.client(service, region_name=settings.AWS_REGION)
+        'Get boto client for given service, shared by all threads.'
+        return boto_registry.get_client(service)
 
     def get_by_essential_key(self, key: str) -> typing.Optional[boto3.resources.base.ServiceResource]:
         'Get first valid instnce for given RPID.'
@@ -320,7 +545,7 @@ class BotoResource():
 
     def create_r53_entry(self, ec2_instance: EC2Instance) -> None:
         ec2_resource = self.get_resource('ec2')
-        route53_client = boto3.client('route53')
+        route53_client = self.get_client('route53')
         hostname = ec2_instance.get_r53_hostname()
         elastic_ip = ec2_resource.allocate_address(Domain='vpc')
         ec2_resource.associate_address(
@@ -446,7 +671,12 @@ class BotoResource():
 class PingCacheHelper():
     'Simplifies cache operations for updating timestamps'
     KEY_TEMPLATE = 'ping_{}'
-    KEYS = 'ping_keys'
+    RPIDS_KEY = 'ping_rpids'
+    DIRTY_RPIDS_KEY = 'ping_dirty_rpids'
+    VERSION_KEY = 'ping_cache_version'
+    WARM_UP_LOCK_KEY = 'ping_cache_warm_up_lock'
+    WARM_UP_LOCK_SECONDS = 30 * 60
+    RPIDS_SCAN_COUNT = 1000
     TTL_SECONDS = 600
 
     STATUS_QUALIFIED = 'Qualified'
@@ -457,11 +687,104 @@ class PingCacheHelper():
 
     def __init__(self) -> None:
         self.cache = cache
+        self.redis = self.get_redis_connection()
+
+    @staticmethod
+    def get_redis_connection() -> typing.Optional[typing.Any]:
+        'Get raw redis client if cache backend supports it, used for atomic RPIDs index'
+        try:
+            return get_redis_connection('default')
+        except NotImplementedError:
+            return None
 
     def get_key(self, rpid: str) -> str:
         'Get keys string for given rpid'
         return self.KEY_TEMPLATE.format(rpid)
 
+    def add_rpid(self, rpid: str) -> None:
+        '''
+        Add rpid to RPIDs index and to dirty RPIDs set, that are flushed to DB by cron.
+        Uses atomic SADD if redis is available, so concurrent workers do not overwrite each other.
+        '''
+        if self.redis is not None:
+            pipeline = self.redis.pipeline(transaction=False)
+            self.queue_add_rpid(pipeline, rpid)
+            pipeline.execute()
+            return
+
+        for key in (self.RPIDS_KEY, self.DIRTY_RPIDS_KEY):
+            rpids = self.cache.get(key, set())
+            if rpid not in rpids:
+                rpids.add(rpid)
+                self.cache.set(key, rpids, None)
+
+    def queue_add_rpid(self, pipeline: typing.Any, rpid: str) -> None:
+        'Same as *add_rpid*, but only queues commands to redis *pipeline*'
+        pipeline.sadd(self.cache.make_key(self.RPIDS_KEY), rpid)
+        pipeline.sadd(self.cache.make_key(self.DIRTY_RPIDS_KEY), rpid)
+
+    def add_indexed_rpids(self, rpids: typing.Iterable[str]) -> None:
+        'Add rpids to RPIDs index only, they are not flushed to DB until device pings'
+        rpids = list(rpids)
+        if not rpids:
+            return
+
+        if self.redis is not None:
+            self.redis.sadd(self.cache.make_key(self.RPIDS_KEY), *rpids)
+            return
+
+        indexed_rpids = self.cache.get(self.RPIDS_KEY, set())
+        if not set(rpids) <= indexed_rpids:
+            self.cache.set(self.RPIDS_KEY, indexed_rpids | set(rpids), None)
+
+    def pop_dirty_rpids(self) -> typing.Set[str]:
+        'Get and clear rpids that were updated since last call in one atomic operation.'
+        if self.redis is not None:
+            pipeline = self.redis.pipeline(transaction=True)
+            pipeline.smembers(self.cache.make_key(self.DIRTY_RPIDS_KEY))
+            pipeline.delete(self.cache.make_key(self.DIRTY_RPIDS_KEY))
+            rpids, _ = pipeline.execute()
+            return {rpid.decode() if isinstance(rpid, bytes) else rpid for rpid in rpids}
+
+        rpids = self.cache.get(self.DIRTY_RPIDS_KEY, set())
+        self.cache.delete(self.DIRTY_RPIDS_KEY)
+        return rpids
+
+    def get_many(self, rpids: typing.Iterable[str]) -> typing.Dict[str, typing.Dict]:
+        'Get valid data for several rpids in one cache request, result is a map rpid -> data'
+        keys_map = {self.get_key(rpid): rpid for rpid in rpids}
+        result = {}
+        for key, data in self.cache.get_many(list(keys_map.keys())).items():
+            if self.is_data_valid(data):
+                result[keys_map[key]] = data
+        return result
+
+    def remove_rpids(self, rpids: typing.Iterable[str]) -> None:
+        'Remove rpids from RPIDs index in one operation.'
+        rpids = list(rpids)
+        if not rpids:
+            return
+
+        if self.redis is not None:
+            self.redis.srem(self.cache.make_key(self.RPIDS_KEY), *rpids)
+            return
+
+        indexed_rpids = self.cache.get(self.RPIDS_KEY, set())
+        if indexed_rpids & set(rpids):
+            self.cache.set(self.RPIDS_KEY, indexed_rpids - set(rpids), None)
+
+    def iter_rpids(self) -> typing.Iterator[str]:
+        '''
+        Iterate over all indexed rpids. Uses SSCAN in batches of *RPIDS_SCAN_COUNT*
+        so redis is not blocked on a large fleet. Rpid can be yielded more than once.
+        '''
+        if self.redis is not None:
+            for rpid in self.redis.sscan_iter(self.cache.make_key(self.RPIDS_KEY), count=self.RPIDS_SCAN_COUNT):
+                yield rpid.decode() if isinstance(rpid, bytes) else rpid
+            return
+
+        yield from self.cache.get(self.RPIDS_KEY, set())
+
     def get(self, rpid: str) -> typing.Optional[typing.Dict]:
         'Get data for rpid if it is valid'
         data = self.cache.get(self.get_key(rpid))
@@ -480,64 +803,6 @@ class PingCacheHelper():
 
         return True
 
-    @staticmethod
-    def is_ec2_instance_data_consistent(data: typing.Dict, ec2_instance: EC2Instance) -> bool:
-        ec2_ip_address = data['ec2_ip_address']
-        ec2_instance_status = data['ec2_instance_status']
-
-        if not ec2_instance:
-            if ec2_ip_address:
-                return False
-
-            return True
-
-        if ec2_instance_status != ec2_instance.status:
-            return False
-
-        if ec2_instance.is_status_temp():
-            return False
-
-        if ec2_ip_address != ec2_instance.ip_address:
-            return False
-
-        return True
-
-    @classmethod
-    def is_data_consistent(cls, data: typing.Dict, raspberry_pi: RaspberryPi, ec2_instance: EC2Instance) -> bool:
-        'Check if cache data is consistent against current DB state'
-        wrong_password = data['wrong_password']
-        lead_status = data['lead_status']
-        restart_required = data.get('restart_required', False)
-        new_config_required = data.get('new_config_required', False)
-        created = data.get('created')
-
-        if not created:
-            return False
-
-        if restart_required != raspberry_pi.restart_required:
-            return False
-
-        if new_config_required != raspberry_pi.new_config_required:
-            return False
-
-        if raspberry_pi.is_proxy_tunnel:
-            reported_hostname = data.get('reported_hostname')
-            hostname = raspberry_pi.proxy_hostname
-            if reported_hostname != hostname:
-                return False
-
-        if not cls.is_ec2_instance_data_consistent(data, ec2_instance):
-            return False
-
-        lead = raspberry_pi.get_lead()
-        if lead and lead_status != lead.status:
-            return False
-
-        if lead and wrong_password != lead.is_wrong_password():
-            return False
-
-        return True
-
     def set(self, rpid: str, data: typing.Dict) -> None:
         '''
         Create cache entry for rpid
@@ -545,12 +810,20 @@ class PingCacheHelper():
         *rpid* - rpid string
         *data* - redis-compatible data to set
         '''
+        if self.redis is not None:
+            pipeline = self.redis.pipeline(transaction=False)
+            self.queue_set(pipeline, rpid, data)
+            pipeline.execute()
+            return
+
         key = self.get_key(rpid)
         self.cache.set(key, data, self.TTL_SECONDS)
-        keys = self.cache.get(self.KEYS, [])
-        if key not in keys:
-            keys.append(key)
-            self.cache.set(self.KEYS, keys)
+        self.add_rpid(rpid)
+
+    def queue_set(self, pipeline: typing.Any, rpid: str, data: typing.Dict) -> None:
+        'Same as *set*, but only queues commands to redis *pipeline*, so ping is saved in one round trip with other commands'
+        self.cache.set(self.get_key(rpid), data, self.TTL_SECONDS, client=pipeline)
+        self.queue_add_rpid(pipeline, rpid)
 
     def get_hostname(self, lead: Lead, raspberry_pi: RaspberryPi, ec2_instance: EC2Instance) -> typing.Optional[str]:
         if not lead or not lead.is_active():
@@ -563,59 +836,219 @@ class PingCacheHelper():
 
         return None
 
-    def get_actual_data(self, rpid: str) -> typing.Dict:
+    @classmethod
+    def get_leads_queryset(cls) -> models.query.QuerySet:
         '''
-        Get data for rpid for DB
-
-        *rpid* - rpid string
+        Get leads queryset with RaspberryPi, EC2 instance and lead accounts counters
+        needed to build cache data, so each entry is built without extra queries.
         '''
         lead_model = apps.get_model('adsrental', 'Lead')
-        lead = lead_model.objects.filter(raspberry_pi__rpid=rpid).select_related('ec2instance', 'raspberry_pi').first()
+        return lead_model.objects.select_related('ec2instance', 'raspberry_pi').annotate(
+            active_accounts_count=models.Count(
+                'lead_account',
+                filter=models.Q(lead_account__status__in=cls.STATUSES_ACTIVE),
+            ),
+            wrong_password_accounts_count=models.Count(
+                'lead_account',
+                filter=models.Q(lead_account__active=True, lead_account__wrong_password_date__isnull=False),
+            ),
+        )
+
+    def get_lead(self, rpid: str) -> typing.Optional[Lead]:
+        'Get lead with RaspberryPi, EC2 instance and lead accounts counters for rpid'
+        return self.get_leads_queryset().filter(raspberry_pi__rpid=rpid).first()
+
+    def get_db_data(self, lead: typing.Optional[Lead]) -> typing.Dict:
+        '''
+        Get part of cache data that depends only on DB state.
+
+        *lead* - :model:`adsrental.Lead` instance from *get_leads_queryset* or None
+        '''
         raspberry_pi = lead and lead.raspberry_pi
         ec2_instance = lead and lead.get_ec2_instance()
-        restart_required = raspberry_pi and raspberry_pi.restart_required
-        if restart_required:
-            raspberry_pi.restart_required = False
-            raspberry_pi.save()
+        return dict(
+            lead_status=lead and lead.status,
+            lead_active_accounts_count=lead.active_accounts_count if lead else 0,
+            wrong_password=lead.wrong_password_accounts_count > 0 if lead else False,
+            is_proxy_tunnel=raspberry_pi.is_proxy_tunnel if raspberry_pi else False,
+            is_beta=raspberry_pi.is_beta if raspberry_pi else False,
+            ec2_instance_id=ec2_instance and ec2_instance.instance_id,
+            ec2_instance_status=ec2_instance and ec2_instance.status,
+            ec2_hostname=ec2_instance and lead.is_active() and ec2_instance.is_running() and ec2_instance.hostname,
+            hostname=self.get_hostname(lead, raspberry_pi, ec2_instance),
+            ec2_ip_address=ec2_instance and ec2_instance.ip_address,
+        )
 
-        new_config_required = raspberry_pi and raspberry_pi.new_config_required
-        if new_config_required:
-            raspberry_pi.new_config_required = False
-            raspberry_pi.save()
+    def build_data(self, rpid: str, lead: typing.Optional[Lead], restart_required: bool = False, new_config_required: bool = False) -> typing.Dict:
+        '''
+        Build new cache data for rpid. Values reported by device are taken from DB,
+        *last_ping* is None until device pings, so entry is not flushed to DB before that.
 
+        *lead* - :model:`adsrental.Lead` instance from *get_leads_queryset* or None
+        '''
+        raspberry_pi = lead and lead.raspberry_pi
         data = dict(
             v=settings.CACHE_VERSION,
             created=timezone.now(),
             rpid=rpid,
-            lead_status=lead and lead.status,
-            lead_active_accounts_count=lead.lead_accounts.filter(status__in=PingCacheHelper.STATUSES_ACTIVE).count() if lead else 0,
-            wrong_password=lead.is_wrong_password() if lead else False,
             restart_required=restart_required,
             new_config_required=new_config_required,
-            is_proxy_tunnel=raspberry_pi.is_proxy_tunnel if raspberry_pi else False,
-            is_beta=raspberry_pi.is_beta if raspberry_pi else False,
-            ec2_instance_id=ec2_instance and ec2_instance.instance_id,
-            ec2_instance_status=ec2_instance and ec2_instance.status,
-            ec2_hostname=ec2_instance and lead.is_active() and ec2_instance.is_running() and ec2_instance.hostname,
             initial_ip_address=raspberry_pi.ip_address if raspberry_pi else False,
-            hostname=self.get_hostname(lead, raspberry_pi, ec2_instance),
-            ec2_ip_address=ec2_instance and ec2_instance.ip_address,
+            ip_address=raspberry_pi.ip_address if raspberry_pi else None,
+            reported_hostname=None,
+            raspberry_pi_version=raspberry_pi.version if raspberry_pi else None,
             last_ping=None,
         )
-
+        data.update(self.get_db_data(lead))
         return data
 
+    def get_actual_data(self, rpid: str) -> typing.Dict:
+        '''
+        Get data for rpid for DB. Resets RaspberryPi restart and new config flags, as they are sent to device.
+
+        *rpid* - rpid string
+        '''
+        lead = self.get_lead(rpid)
+        raspberry_pi = lead and lead.raspberry_pi
+        restart_required = bool(raspberry_pi and raspberry_pi.restart_required)
+        new_config_required = bool(raspberry_pi and raspberry_pi.new_config_required)
+        if restart_required or new_config_required:
+            raspberry_pi.restart_required = False
+            raspberry_pi.new_config_required = False
+            raspberry_pi_model = apps.get_model('adsrental', 'RaspberryPi')
+            raspberry_pi_model.objects.filter(rpid=rpid).update(restart_required=False, new_config_required=False)
+
+        return self.build_data(rpid, lead, restart_required=restart_required, new_config_required=new_config_required)
+
+    def warm_up(self, chunk_size: int = 500) -> int:
+        '''
+        Create cache entries for all active leads with online RaspberryPi that do not have one yet.
+        Uses one query per *chunk_size* leads, so it is safe to run for the whole fleet,
+        for example after cache flush or *CACHE_VERSION* change.
+
+        RaspberryPis with pending restart or new config are skipped, so they get flags on next ping.
+        Returns amount of created entries.
+        '''
+        lead_model = apps.get_model('adsrental', 'Lead')
+        raspberry_pi_model = apps.get_model('adsrental', 'RaspberryPi')
+        leads = self.get_leads_queryset().filter(
+            status__in=lead_model.STATUSES_ACTIVE,
+            raspberry_pi__isnull=False,
+            raspberry_pi__last_seen__gte=timezone.now() - datetime.timedelta(minutes=raspberry_pi_model.online_minutes_ttl),
+            raspberry_pi__restart_required=False,
+            raspberry_pi__new_config_required=False,
+        ).order_by('raspberry_pi__rpid')
+
+        counter = 0
+        leads_chunk: typing.List[Lead] = []
+        for lead in leads.iterator(chunk_size=chunk_size):
+            leads_chunk.append(lead)
+            if len(leads_chunk) >= chunk_size:
+                counter += self._warm_up_leads(leads_chunk)
+                leads_chunk = []
+        counter += self._warm_up_leads(leads_chunk)
+
+        return counter
+
+    def _warm_up_leads(self, leads: typing.List[Lead]) -> int:
+        if not leads:
+            return 0
+
+        existing_rpids = self.get_many([lead.raspberry_pi.rpid for lead in leads]).keys()
+        entries = {}
+        for lead in leads:
+            rpid = lead.raspberry_pi.rpid
+            if rpid in existing_rpids:
+                continue
+            entries[self.get_key(rpid)] = self.build_data(rpid, lead)
+
+        self.cache.set_many(entries, self.TTL_SECONDS)
+        self.add_indexed_rpids(data['rpid'] for data in entries.values())
+        return len(entries)
+
+    def warm_up_if_required(self, chunk_size: int = 500) -> int:
+        '''
+        Run *warm_up* if cache was flushed or *CACHE_VERSION* changed since last warm up.
+        Called by *warm_up_ping_cache* command on server start, before workers get pings,
+        and by *UpdatePingView*, so cache flushed at runtime is warmed up too.
+        Version is saved only after successful warm up, so failed one is retried on next call.
+        Concurrent calls are skipped while warm up is running.
+        Returns amount of created entries.
+        '''
+        if self.cache.get(self.VERSION_KEY) == settings.CACHE_VERSION:
+            return 0
+        if not self.cache.add(self.WARM_UP_LOCK_KEY, True, self.WARM_UP_LOCK_SECONDS):
+            return 0
+
+        try:
+            counter = self.warm_up(chunk_size=chunk_size)
+            self.cache.set(self.VERSION_KEY, settings.CACHE_VERSION, None)
+        finally:
+            self.cache.delete(self.WARM_UP_LOCK_KEY)
+        return counter
+
+    def refresh_many(self, rpids: typing.Iterable[str], cached_data: typing.Optional[typing.Dict[str, typing.Dict]] = None) -> int:
+        '''
+        Update DB-dependent values in existing cache entries for rpids, values reported by devices are kept.
+        Uses one cache request to get entries, one DB query and one cache request to save changed entries.
+        Entry is removed if RaspberryPi restart or new config is requested, so next ping gets it from DB.
+
+        Ping can overwrite refreshed entry with data it read before refresh, so *UpdatePingView*
+        calls this for all pinged rpids with *cached_data* it already has, and stale entries are fixed on next run.
+
+        *cached_data* - map rpid -> data from *get_many*, if already fetched
+        Returns amount of updated entries.
+        '''
+        rpids_data_map = cached_data if cached_data is not None else self.get_many(rpids)
+        if not rpids_data_map:
+            return 0
+
+        leads = self.get_leads_queryset().filter(raspberry_pi__rpid__in=list(rpids_data_map.keys()))
+        leads_map = {lead.raspberry_pi_id: lead for lead in leads}
+        entries = {}
+        deleted_rpids = []
+        for rpid, data in rpids_data_map.items():
+            lead = leads_map.get(rpid)
+            raspberry_pi = lead and lead.raspberry_pi
+            if raspberry_pi and (raspberry_pi.restart_required or raspberry_pi.new_config_required):
+                deleted_rpids.append(rpid)
+                continue
+
+            db_data = self.get_db_data(lead)
+            if all(data.get(key) == value for key, value in db_data.items()):
+                continue
+            data.update(db_data)
+            entries[self.get_key(rpid)] = data
+
+        if entries:
+            self.cache.set_many(entries, self.TTL_SECONDS)
+        if deleted_rpids:
+            self.cache.delete_many([self.get_key(rpid) for rpid in deleted_rpids])
+            self.remove_rpids(deleted_rpids)
+        return len(entries)
+
+    def refresh(self, rpid: str) -> bool:
+        '''
+        Same as *refresh_many* for one rpid.
+        Called on :model:`adsrental.Lead`, :model:`adsrental.LeadAccount`, :model:`adsrental.RaspberryPi`
+        and :model:`adsrental.EC2Instance` save.
+
+        Returns True if entry was updated.
+        '''
+        return self.refresh_many([rpid]) > 0
+
     def delete(self, rpid: str) -> None:
         '''Delete cache data for rpid'''
         key = self.get_key(rpid)
         self.cache.delete(key)
-        keys = self.cache.get(self.KEYS, [])
-        if key in keys:
-            keys = [i for i in keys if i != key]
-            self.cache.set(self.KEYS, keys)
+        self.remove_rpids([rpid])
+
+    def get_data_for_request(self, request: HttpRequest, ping_data: typing.Optional[typing.Dict] = None) -> typing.Dict:
+        '''
+        Get data from cache or db using request.GET
 
-    def get_data_for_request(self, request: HttpRequest) -> typing.Dict:
-        '''Get data from cache or db using request.GET'''
+        *ping_data* - cache data if it is already fetched, to skip extra cache lookup
+        '''
         rpid = request.GET.get('rpid', '').strip()
         troubleshoot = request.GET.get('troubleshoot')
         ip_address = request.META.get('REMOTE_ADDR')
@@ -625,7 +1058,8 @@ class PingCacheHelper():
         reverse_tunnel_up = request.GET.get('reverse_tunnel_up', '1') == '1'
         now = timezone.localtime(timezone.now())
 
-        ping_data = self.get(rpid)
+        if ping_data is None:
+            ping_data = self.get(rpid)
         if not ping_data:
             ping_data = self.get_actual_data(rpid)
         else:
@@ -646,6 +1080,205 @@ class PingCacheHelper():
         return ping_data
 
 
+class UniqueIPHelper():
+    '''
+    Tracks distinct source IPs for every RPID with first seen and last seen timestamps.
+
+    Updated on every ping in one redis round trip, so IP churn can be checked without reading
+    RaspberryPi logs. Only IPs seen during last *WINDOW_SECONDS* are reported.
+    Fleet-wide distinct IP counts are kept in a sorted set and recalculated when a new IP appears.
+    '''
+    FIRST_SEEN_KEY_TEMPLATE = 'rpi_ips_first_{}'
+    LAST_SEEN_KEY_TEMPLATE = 'rpi_ips_last_{}'
+    COUNTS_KEY = 'rpi_ips_counts'
+    WINDOW_SECONDS = getattr(settings, 'RASPBERRY_PI_UNIQUE_IPS_WINDOW_SECONDS', 24 * 60 * 60)
+
+    def __init__(self) -> None:
+        self.cache = cache
+        self.redis = PingCacheHelper.get_redis_connection()
+
+    @staticmethod
+    def decode(value: typing.Union[str, bytes]) -> str:
+        return value.decode() if isinstance(value, bytes) else value
+
+    def get_first_seen_key(self, rpid: str) -> str:
+        return self.cache.make_key(self.FIRST_SEEN_KEY_TEMPLATE.format(rpid))
+
+    def get_last_seen_key(self, rpid: str) -> str:
+        return self.cache.make_key(self.LAST_SEEN_KEY_TEMPLATE.format(rpid))
+
+    def track(self, rpid: str, ip_address: typing.Optional[str], now: typing.Optional[datetime.datetime] = None) -> None:
+        '''
+        Register ping from *ip_address* for *rpid*.
+
+        *now* - ping datetime, current time by default
+        '''
+        if not ip_address:
+            return
+
+        timestamp = int((now or timezone.now()).timestamp())
+        if self.redis is None:
+            ips = self.cache.get(self.FIRST_SEEN_KEY_TEMPLATE.format(rpid), {})
+            first_seen, _ = ips.get(ip_address, (timestamp, timestamp))
+            ips[ip_address] = (first_seen, timestamp)
+            ips = {k: v for k, v in ips.items() if v[1] > timestamp - self.WINDOW_SECONDS}
+            self.cache.set(self.FIRST_SEEN_KEY_TEMPLATE.format(rpid), ips, self.WINDOW_SECONDS)
+            counts = self.cache.get(self.COUNTS_KEY, {})
+            if counts.get(rpid) != len(ips):
+                counts[rpid] = len(ips)
+                self.cache.set(self.COUNTS_KEY, counts, None)
+            return
+
+        pipeline = self.redis.pipeline(transaction=False)
+        self.queue_track(pipeline, rpid, ip_address, timestamp)
+        self.on_tracked(rpid, timestamp, pipeline.execute())
+
+    def queue_track(self, pipeline: typing.Any, rpid: str, ip_address: typing.Optional[str], timestamp: int) -> None:
+        'Same as *track* for redis, but only queues commands to *pipeline*. Pass results of these commands to *on_tracked*.'
+        if not ip_address:
+            return
+
+        first_seen_key = self.get_first_seen_key(rpid)
+        last_seen_key = self.get_last_seen_key(rpid)
+        pipeline.hsetnx(first_seen_key, ip_address, timestamp)
+        pipeline.hset(last_seen_key, ip_address, timestamp)
+        pipeline.expire(first_seen_key, self.WINDOW_SECONDS)
+        pipeline.expire(last_seen_key, self.WINDOW_SECONDS)
+
+    def on_tracked(self, rpid: str, timestamp: int, results: typing.List[typing.Any]) -> None:
+        'Update fleet-wide counter if *queue_track* commands *results* show a new IP'
+        is_new_ip = results and results[0]
+        if is_new_ip:
+            self.refresh_count(rpid, timestamp)
+
+    def refresh_count(self, rpid: str, timestamp: typing.Optional[int] = None) -> int:
+        '''
+        Remove IPs that were not seen during last *WINDOW_SECONDS* and update fleet-wide counter for *rpid*.
+        Redis only, returns number of distinct IPs.
+        '''
+        if timestamp is None:
+            timestamp = int(time.time())
+        first_seen_key = self.get_first_seen_key(rpid)
+        last_seen_key = self.get_last_seen_key(rpid)
+        last_seen_map = self.redis.hgetall(last_seen_key)
+        expired_ips = [ip for ip, last_seen in last_seen_map.items() if int(last_seen) <= timestamp - self.WINDOW_SECONDS]
+        pipeline = self.redis.pipeline(transaction=False)
+        if expired_ips:
+            pipeline.hdel(first_seen_key, *expired_ips)
+            pipeline.hdel(last_seen_key, *expired_ips)
+        count = len(last_seen_map) - len(expired_ips)
+        if count:
+            pipeline.zadd(self.cache.make_key(self.COUNTS_KEY), {rpid: count})
+        else:
+            pipeline.zrem(self.cache.make_key(self.COUNTS_KEY), rpid)
+        pipeline.execute()
+        return count
+
+    def get_ips(self, rpid: str) -> typing.List[typing.Dict[str, typing.Any]]:
+        '''
+        Get IPs seen during last *WINDOW_SECONDS* as dicts with *ip_address*, *first_seen* and *last_seen* keys,
+        most recently seen first.
+        '''
+        min_timestamp = int(time.time()) - self.WINDOW_SECONDS
+        if self.redis is None:
+            ips = self.cache.get(self.FIRST_SEEN_KEY_TEMPLATE.format(rpid), {})
+            items = [(ip, first_seen, last_seen) for ip, (first_seen, last_seen) in ips.items()]
+        else:
+            pipeline = self.redis.pipeline(transaction=False)
+            pipeline.hgetall(self.get_first_seen_key(rpid))
+            pipeline.hgetall(self.get_last_seen_key(rpid))
+            first_seen_map, last_seen_map = pipeline.execute()
+            items = [
+                (self.decode(ip), int(first_seen_map.get(ip, last_seen)), int(last_seen))
+                for ip, last_seen in last_seen_map.items()
+            ]
+
+        result = []
+        for ip_address, first_seen, last_seen in sorted(items, key=lambda x: x[2], reverse=True):
+            if last_seen <= min_timestamp:
+                continue
+            result.append(dict(
+                ip_address=ip_address,
+                first_seen=datetime.datetime.fromtimestamp(first_seen, tz=timezone.utc),
+                last_seen=datetime.datetime.fromtimestamp(last_seen, tz=timezone.utc),
+            ))
+        return result
+
+    def get_top(self, limit: int = 50) -> typing.List[typing.Tuple[str, int]]:
+        '''
+        Get up to *limit* RPIDs with most distinct IPs as *(rpid, count)* pairs, highest count first.
+
+        Counters are updated only when device reports a new IP, so top entries are recalculated
+        before they are returned.
+        '''
+        if self.redis is None:
+            counts = self.cache.get(self.COUNTS_KEY, {})
+            return sorted(counts.items(), key=lambda x: x[1], reverse=True)[:limit]
+
+        rpids = [self.decode(rpid) for rpid in self.redis.zrevrange(self.cache.make_key(self.COUNTS_KEY), 0, limit - 1)]
+        result = [(rpid, self.refresh_count(rpid)) for rpid in rpids]
+        return sorted([i for i in result if i[1]], key=lambda x: x[1], reverse=True)
+
+
+class OnlineMinutesHelper():
+    '''
+    Counts minutes when RaspberryPi was online for every RPID and day.
+
+    Every ping sets a bit for current minute of the day in a 1440-bit redis bitmap,
+    so repeated pings in the same minute are counted once and *BITCOUNT* gives exact online minutes.
+    Bitmaps expire after *TTL_SECONDS*, persisted to :model:`adsrental.LeadHistory` by cron.
+    '''
+    KEY_TEMPLATE = 'online_minutes_{}_{}'
+    TTL_SECONDS = 3 * 24 * 60 * 60
+
+    def __init__(self) -> None:
+        self.cache = cache
+        self.redis = PingCacheHelper.get_redis_connection()
+
+    def get_key(self, rpid: str, date: datetime.date) -> str:
+        return self.KEY_TEMPLATE.format(rpid, date.strftime('%Y%m%d'))
+
+    def track(self, rpid: str, now: typing.Optional[datetime.datetime] = None) -> None:
+        '''
+        Mark *rpid* as online for current minute.
+
+        *now* - local naive datetime of ping, current time by default
+        '''
+        now = now or datetime.datetime.now()
+        key = self.get_key(rpid, now.date())
+        minute = now.hour * 60 + now.minute
+        if self.redis is None:
+            minutes = self.cache.get(key, set())
+            if minute not in minutes:
+                minutes.add(minute)
+                self.cache.set(key, minutes, self.TTL_SECONDS)
+            return
+
+        pipeline = self.redis.pipeline(transaction=False)
+        self.queue_track(pipeline, rpid, now)
+        pipeline.execute()
+
+    def queue_track(self, pipeline: typing.Any, rpid: str, now: typing.Optional[datetime.datetime] = None) -> None:
+        'Same as *track* for redis, but only queues commands to *pipeline*'
+        now = now or datetime.datetime.now()
+        key = self.cache.make_key(self.get_key(rpid, now.date()))
+        minute = now.hour * 60 + now.minute
+        pipeline.setbit(key, minute, 1)
+        pipeline.expire(key, self.TTL_SECONDS)
+
+    def get_many(self, rpids: typing.Iterable[str], date: datetime.date) -> typing.Dict[str, int]:
+        'Get online minutes for *date* for several RPIDs in one request, result is a map rpid -> minutes'
+        rpids = list(rpids)
+        if self.redis is None:
+            keys_map = {self.get_key(rpid, date): rpid for rpid in rpids}
+            return {keys_map[key]: len(minutes) for key, minutes in self.cache.get_many(list(keys_map.keys())).items()}
+
+        pipeline = self.redis.pipeline(transaction=False)
+        for rpid in rpids:
+            pipeline.bitcount(self.cache.make_key(self.get_key(rpid, date)))
+        return {rpid: minutes for rpid, minutes in zip(rpids, pipeline.execute()) if minutes}
+
+
 def generate_password(length: int = 12) -> str:
     result = []
     for _ in range(2):
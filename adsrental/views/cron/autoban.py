@@ -49,11 +49,11 @@ class AutoBanView(View):
                 'account': str(lead_account),
                 'wrong_password_date': lead_account.wrong_password_date.date()
             })
-            if execute:
-                lead_account.ban(autoban_user, reason=LeadAccount.BAN_REASON_AUTO_WRONG_PASSWORD)
-                lead_account.add_comment(f'Auto banned as account had wrong password issue for {days_wrong_password} days')
-                # lead_account.insert_note(f'Auto banned as account had wrong password issue for {days_wrong_password} days', event_datetime=now)
-                # lead_account.save()
+        if execute:
+            LeadAccount.objects.bulk_ban(
+                lead_accounts, reason=LeadAccount.BAN_REASON_AUTO_WRONG_PASSWORD, edited_by=autoban_user,
+                comment=f'Auto banned as account had wrong password issue for {days_wrong_password} days',
+            )
 
         lead_accounts = LeadAccount.objects.filter(
             lead__raspberry_pi__last_seen__lte=now - datetime.timedelta(days=days_offline),
@@ -63,20 +63,17 @@ class AutoBanView(View):
         )
         lead_accounts = lead_accounts.filter(Q(disable_auto_ban_until__isnull=True)
                                              | Q(disable_auto_ban_until__lte=now))
-        for lead_account in lead_accounts:
+        for lead_account in lead_accounts.select_related('lead', 'lead__raspberry_pi'):
             banned_offline.append({
                 'account': str(lead_account),
                 'last_seen': lead_account.lead.raspberry_pi.last_seen.date()
             })
-            if execute:
-                lead_account.ban(edited_by=autoban_user, reason=LeadAccount.BAN_REASON_AUTO_OFFLINE)
-                lead_account.add_comment(f'Auto banned as device was offline for {days_offline} days')
-                # lead_account.insert_note(f'Auto banned as device was offline for {days_offline} days', event_datetime=now)
-                # lead_account.save()
-                lead = lead_account.lead
-                lead.ban(edited_by=autoban_user)
-                lead.add_comment(f'Auto banned as device was offline for {days_offline} days')
-                # lead.insert_note(f'Auto banned as device was offline for {days_offline} days', event_datetime=now)
+        if execute:
+            LeadAccount.objects.bulk_ban(
+                lead_accounts, reason=LeadAccount.BAN_REASON_AUTO_OFFLINE, edited_by=autoban_user,
+                comment=f'Auto banned as device was offline for {days_offline} days',
+                ban_leads=True,
+            )
 
         lead_accounts = LeadAccount.objects.filter(
             security_checkpoint_date__lte=now - datetime.timedelta(days=days_checkpoint),
@@ -92,11 +89,11 @@ class AutoBanView(View):
                 'account': str(lead_account),
                 'security_checkpoint_date': lead_account.security_checkpoint_date.date()
             })
-            if execute:
-                lead_account.ban(autoban_user, reason=LeadAccount.BAN_REASON_AUTO_CHECKPOINT)
-                lead_account.add_comment(f'Auto banned as account had sec checkpoint issue for {days_checkpoint} days')
-                # lead_account.insert_note(f'Auto banned as account had sec checkpoint issue for {days_checkpoint} days', event_datetime=now)
-                # lead_account.save()
+        if execute:
+            LeadAccount.objects.bulk_ban(
+                lead_accounts, reason=LeadAccount.BAN_REASON_AUTO_CHECKPOINT, edited_by=autoban_user,
+                comment=f'Auto banned as account had sec checkpoint issue for {days_checkpoint} days',
+            )
 
         lead_accounts = LeadAccount.objects.filter(
             status=Lead.STATUS_QUALIFIED,
@@ -111,11 +108,11 @@ class AutoBanView(View):
                 'account': str(lead_account),
                 'delivery_date': lead_account.lead.delivery_date,
             })
-            if execute:
-                lead_account.ban(autoban_user, reason=LeadAccount.BAN_REASON_AUTO_NOT_USED)
-                lead_account.add_comment(f'Auto banned as device was not used for {days_delivered} days')
-                # lead_account.insert_note(f'Auto banned as device was not used for {days_delivered} days', event_datetime=now)
-                # lead_account.save()
+        if execute:
+            LeadAccount.objects.bulk_ban(
+                lead_accounts, reason=LeadAccount.BAN_REASON_AUTO_NOT_USED, edited_by=autoban_user,
+                comment=f'Auto banned as device was not used for {days_delivered} days',
+            )
 
         # for lead_account in LeadAccount.objects.filter(
         #         status=LeadAccount.STATUS_BANNED,
@@ -1,5 +1,5 @@
 import datetime
-from multiprocessing.pool import ThreadPool
+import typing
 
 from django.views import View
 from django.http import JsonResponse
@@ -7,6 +7,8 @@ from django.utils import timezone
 
 from adsrental.models.ec2_instance import EC2Instance
 from adsrental.utils import BotoResource
+from adsrental.fanout import fanout_executor
+from adsrental.ssh_pool import ssh_pool
 
 
 class CheckEC2View(View):
@@ -14,6 +16,18 @@ class CheckEC2View(View):
     Check :model:`adsrental.EC2Instance` if they have action RDP session, stops them otherwise.
     '''
     MAX_ESSENTIAL_RUNNING = 0
+    SSH_TIMEOUT = 20
+
+    def check_rdp_sessions(
+            self,
+            ec2_instances: typing.Iterable[EC2Instance],
+            metrics: typing.List[typing.Dict[str, typing.Any]],
+    ) -> typing.Iterator[typing.Tuple[EC2Instance, bool]]:
+        'Stream (ec2_instance, is_rdp_session_active) pairs, EC2 is considered active if check failed or timed out'
+        run = fanout_executor.run(EC2Instance.is_rdp_session_active, ec2_instances, timeout=self.SSH_TIMEOUT * 2)
+        for result in run:
+            yield result.item, result.result if result.ok else True
+        metrics.append(run.metrics.as_dict())
 
     def get(self, request):
         online_ec2s = []
@@ -24,14 +38,13 @@ class CheckEC2View(View):
         unassigned_essential_ec2s = []
         now = timezone.localtime(timezone.now())
         ec2_client = BotoResource().get_client('ec2')
-        pool = ThreadPool(processes=10)
+        metrics: typing.List[typing.Dict[str, typing.Any]] = []
         ec2_instances = EC2Instance.objects.filter(
             last_rdp_start__lt=now - datetime.timedelta(minutes=15),
             status=EC2Instance.STATUS_RUNNING,
             is_essential=False,
         )
-        results = pool.map(lambda x: [x, x.is_rdp_session_active()], ec2_instances)
-        for ec2_instance, is_rdp_session_active in results:
+        for ec2_instance, is_rdp_session_active in self.check_rdp_sessions(ec2_instances, metrics):
             if is_rdp_session_active:
                 ec2_instance.last_rdp_start = now
                 ec2_instance.save()
@@ -46,8 +59,7 @@ class CheckEC2View(View):
             is_essential=True,
         )
         essential_running_counter = 0
-        results = pool.map(lambda x: [x, x.is_rdp_session_active()], ec2_instances)
-        for ec2_instance, is_rdp_session_active in results:
+        for ec2_instance, is_rdp_session_active in self.check_rdp_sessions(ec2_instances, metrics):
             if is_rdp_session_active:
                 ec2_instance.last_rdp_start = now
                 ec2_instance.save()
@@ -73,4 +85,6 @@ class CheckEC2View(View):
             'stopping_essential_ec2s': stopping_essential_ec2s,
             'online_essential_ec2s': online_essential_ec2s,
             'unassigned_essential_ec2s': unassigned_essential_ec2s,
+            'metrics': metrics,
+            'ssh_pool': ssh_pool.get_stats(),
         })
@@ -0,0 +1,45 @@
+from django.views import View
+from django.http import JsonResponse, HttpRequest
+from django.utils import timezone
+
+from adsrental.models.raspberry_pi import RaspberryPi
+
+
+class CheckProxyTunnelsView(View):
+    '''
+    Check every online :model:`adsrental.RaspberryPi` proxy tunnel in one sweep and set *tunnel_last_tested* for working ones.
+
+    Runs every 10 minutes by scheduler.
+
+    Parameters:
+
+    * rpid - check only one RaspberryPi
+    '''
+    def get(self, request: HttpRequest) -> JsonResponse:
+        now = timezone.now()
+        raspberry_pis = RaspberryPi.get_objects_online().filter(is_proxy_tunnel=True, rtunnel_port__isnull=False)
+        if request.GET.get('rpid'):
+            raspberry_pis = raspberry_pis.filter(rpid=request.GET.get('rpid'))
+
+        stable = []
+        slow = []
+        unreachable = []
+        run = RaspberryPi.check_proxy_tunnels(raspberry_pis)
+        for result in run:
+            rpid = result.item.rpid
+            if not result.ok:
+                unreachable.append(rpid)
+            elif result.result.elapsed.total_seconds() < RaspberryPi.TUNNEL_CHECK_SLOW_SECONDS:
+                stable.append(rpid)
+            else:
+                slow.append(rpid)
+
+        RaspberryPi.objects.filter(rpid__in=stable + slow).update(tunnel_last_tested=now)
+
+        return JsonResponse({
+            'result': True,
+            'stable': stable,
+            'slow': slow,
+            'unreachable': unreachable,
+            'metrics': run.metrics.as_dict(),
+        })
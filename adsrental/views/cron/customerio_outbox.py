@@ -0,0 +1,22 @@
+from django.views import View
+from django.http import JsonResponse, HttpRequest
+
+from adsrental.utils import CustomerIOClient
+
+
+class CustomerIOOutboxView(View):
+    '''
+    Send pending :model:`adsrental.CustomerIOEvent` entries to customer.io.
+
+    Runs every minute by scheduler. Failed events are retried with exponential backoff.
+
+    Parameters:
+
+    * batch_size - max events to send in one run, 1000 by default
+    * threads - number of parallel connections to customer.io, 4 by default
+    '''
+    def get(self, request: HttpRequest) -> JsonResponse:
+        batch_size = int(request.GET.get('batch_size', 1000))
+        threads = int(request.GET.get('threads', 4))
+        result = CustomerIOClient.send_outbox(batch_size=batch_size, threads=threads)
+        return JsonResponse(dict(result=True, **result))
@@ -1,13 +1,11 @@
-import os
 import datetime
 from dateutil import parser
 
-from django.conf import settings
-
 from adsrental.models.lead import Lead
 from adsrental.models.lead_history import LeadHistory
 from adsrental.models.lead_history_month import LeadHistoryMonth
 from adsrental.views.cron.base import CronView
+from adsrental.raspberry_pi_log import get_log_stats
 
 
 class LeadHistoryView(CronView):
@@ -17,9 +15,10 @@ class LeadHistoryView(CronView):
     Parameters:
 
     * rpid - if provided, process only one lead, used for debug purposes
-    * now - if 'true' creates or updates :model:`adsrental.LeadHistory` objects with current lead stats. Runs on cron hourly.
+    * now - if 'true' creates or updates :model:`adsrental.LeadHistory` objects with current lead stats and exact online minutes counted on ping,
+      also saves online minutes for previous day. Runs on cron hourly.
     * force - forde replace :model:`adsrental.LeadHistory` on run even if they are calculated
-    * date - 'YYYY-MM-DD', if provided calculates :model:`adsrental.LeadHistory` from logs. Does not check worng password and potentially incaccurate.
+    * date - 'YYYY-MM-DD', if provided calculates :model:`adsrental.LeadHistory` from logs, compressed logs are streamed. Use *backfill_lead_history* command for date ranges. Does not check worng password and potentially incaccurate.
     * aggregate - if 'true' calculates :model:`adsrental.LeadHistoryMonth`. You can also provide *date*
     '''
 
@@ -32,30 +31,27 @@ class LeadHistoryView(CronView):
         results = []
 
         if now:
-            leads = Lead.objects.filter(status__in=Lead.STATUSES_ACTIVE, raspberry_pi__isnull=False).prefetch_related('raspberry_pi')
+            leads = Lead.objects.filter(status__in=Lead.STATUSES_ACTIVE, raspberry_pi__isnull=False)
             if rpid:
                 leads = leads.filter(raspberry_pi__rpid=rpid)
-            for lead in leads:
-                LeadHistory.upsert_for_lead(lead)
+            created_count, updated_count = LeadHistory.bulk_upsert_for_date(leads.only('leadid'), datetime.date.today())
+            flushed_count = LeadHistory.flush_online_minutes(datetime.date.today() - datetime.timedelta(days=1))
             return self.render({
                 'result': True,
+                'created_count': created_count,
+                'updated_count': updated_count,
+                'flushed_count': flushed_count,
             })
         if aggregate:
             start_date = parser.parse(date).date() if date else datetime.date.today()
             start_date = start_date.replace(day=1)
-            leads = Lead.objects.filter(raspberry_pi__last_seen__gte=start_date).prefetch_related('raspberry_pi')
+            leads = Lead.objects.filter(raspberry_pi__last_seen__gte=start_date)
             if rpid:
                 leads = leads.filter(raspberry_pi__rpid=rpid)
             else:
                 LeadHistoryMonth.objects.filter(date=date).delete()
 
-            counter = 0
-            for lead in leads:
-                item = LeadHistoryMonth.get_or_create(lead=lead, date=start_date)
-                item.aggregate()
-                if item.amount or item.id:
-                    item.save()
-                counter += 1
+            LeadHistoryMonth.bulk_aggregate(leads, start_date)
             return self.render({
                 'result': True,
                 'count': leads.count(),
@@ -65,34 +61,20 @@ class LeadHistoryView(CronView):
             if rpid:
                 leads = leads.filter(raspberry_pi__rpid=rpid)
             date = parser.parse(date).date()
+            existing_lead_ids = set()
             if force:
-                LeadHistory.objects.filter(date=date, lead__raspberry_pi__rpid=rpid).delete()
+                LeadHistory.objects.filter(date=date, lead__in=leads).delete()
+            else:
+                existing_lead_ids = set(LeadHistory.objects.filter(date=date, lead__in=leads).values_list('lead_id', flat=True))
+            lead_histories = []
             for lead in leads:
-                if not force:
-                    lead_history = LeadHistory.objects.filter(lead=lead, date=date).first()
-                    if lead_history:
-                        continue
+                if lead.leadid in existing_lead_ids:
+                    continue
 
-                log_filename = '{}.log'.format(date.strftime('%Y%m%d'))
-                log_path = os.path.join(settings.RASPBERRY_PI_LOG_PATH, lead.raspberry_pi.rpid, log_filename)
-                checks_online = 0
-                checks_offline = 24
-                checks_wrong_password = 0
-                if os.path.exists(log_path):
-                    file_data = open(log_path).read()
-                    pings_online = file_data.count('"result": true')
-                    checks_online = min(pings_online // 20, 24)
-                    checks_offline = 24 - checks_online
-                    if 'Wrong password' in file_data:
-                        checks_wrong_password = 1
-                LeadHistory(
-                    lead=lead,
-                    date=date,
-                    checks_online=checks_online,
-                    checks_offline=checks_offline,
-                    checks_wrong_password=checks_wrong_password,
-                ).save()
-                results.append([lead.email, checks_online])
+                lead_history = LeadHistory.from_log_stats(lead, date, get_log_stats(lead.raspberry_pi.rpid, date))
+                lead_histories.append(lead_history)
+                results.append([lead.email, lead_history.checks_online])
+            LeadHistory.objects.bulk_create(lead_histories, batch_size=1000)
 
             return self.render({
                 'results': results,
@@ -19,6 +19,7 @@ class SyncAdsDBView(CronView):
         else:
             lead_accounts.get_adsdb_data(filters=AdsdbClient.BANNED_FILTERS, archive=True)
 
+        ban_reason_ids = {}
         for lead_account in lead_accounts:
             if not lead_account.adsdb_account:
                 continue
@@ -35,8 +36,11 @@ class SyncAdsDBView(CronView):
 
             messages.append(f'{lead_account.account_type} account {lead_account.username} banned for {ban_reason}')
 
-            if self.is_execute():
-                lead_account.ban(edited_by=user, reason=ban_reason)
+            ban_reason_ids.setdefault(ban_reason, []).append(lead_account.id)
+
+        if self.is_execute():
+            for ban_reason, lead_account_ids in ban_reason_ids.items():
+                LeadAccount.objects.bulk_ban(LeadAccount.objects.filter(id__in=lead_account_ids), reason=ban_reason, edited_by=user)
 
         return self.render({
             'messages': messages,
@@ -1,6 +1,5 @@
 'Sync delivered status from ShippingAPI'
 import datetime
-from multiprocessing.pool import ThreadPool
 
 from django.views import View
 from django.http import JsonResponse
@@ -9,6 +8,7 @@ from django_bulk_update.helper import bulk_update
 
 from adsrental.models.lead import Lead
 from adsrental.utils import CustomerIOClient
+from adsrental.fanout import fanout_executor
 
 
 class SyncDeliveredView(View):
@@ -21,12 +21,9 @@ class SyncDeliveredView(View):
     * all - if 'true' runs through all leads including delivered. this can take a while.
     * test - if 'true' does not make any changes to DB or send customerIO events
     * days_ago - check only leads shipped N days ago. Default 31
-    * threads - amount of threads to send requests to remote server. Default 10.
+    * threads - max parallel requests to remote server. Default 10.
     '''
-    def get_tracking_info(self, lead):
-        'Miltithreding func to build array fo results'
-        tracking_info_xml = lead.get_shippingapis_tracking_info()
-        return [lead.email, tracking_info_xml]
+    TIMEOUT = 60
 
     def get(self, request):
         'Get endpoint'
@@ -52,9 +49,9 @@ class SyncDeliveredView(View):
                 pi_delivered=False,
                 ship_date__gte=timezone.now() - datetime.timedelta(days=days_ago),
             ).prefetch_related('raspberry_pi')
-        pool = ThreadPool(processes=threads)
-        results = pool.map(self.get_tracking_info, leads)
-        results_map = dict(results)
+        run = fanout_executor.run(Lead.get_shippingapis_tracking_info, leads, timeout=self.TIMEOUT, max_in_flight=threads)
+        results_map = {result.item.email: result.result for result in run if result.ok}
+        customerio_client = CustomerIOClient()
         for lead in leads:
             label = lead.raspberry_pi.rpid if lead.raspberry_pi else lead.email
             tracking_info_xml = results_map.get(lead.email)
@@ -66,7 +63,7 @@ class SyncDeliveredView(View):
             if pi_delivered is not None and pi_delivered != lead.pi_delivered:
                 changed.append(label)
                 if not test and pi_delivered:
-                    CustomerIOClient().send_lead_event(lead, CustomerIOClient.EVENT_DELIVERED, tracking_code=lead.usps_tracking_code)
+                    customerio_client.send_lead_event(lead, CustomerIOClient.EVENT_DELIVERED, tracking_code=lead.usps_tracking_code)
             lead.update_pi_delivered(pi_delivered, tracking_info_xml)
 
             if pi_delivered:
@@ -86,4 +83,5 @@ class SyncDeliveredView(View):
             'delivered': delivered,
             'not_delivered': not_delivered,
             'errors': errors,
+            'metrics': run.metrics.as_dict(),
         })
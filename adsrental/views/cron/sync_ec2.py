@@ -2,14 +2,16 @@ from django.views import View
 from django.http import JsonResponse
 
 from adsrental.models.ec2_instance import EC2Instance
-from adsrental.models.lead import Lead
-from adsrental.utils import BotoResource
+from adsrental.ec2_sync import EC2Reconciler
 
 
 class SyncEC2View(View):
     '''
     Sync EC2 instances states from AWS to local DB.
 
+    AWS state is loaded with paged *describe_instances* calls and compared with DB in memory,
+    only changed entries are saved, see *adsrental.ec2_sync.EC2Reconciler*.
+
     Parameters:
 
     * all - if 'true' syncs all EC2s
@@ -18,61 +20,32 @@ class SyncEC2View(View):
     * missing - if 'true' creates instances for active leads if they are missing
     * execute - if 'true' performs all actions in AWS, otherwise it is test run
     '''
-    ec2_max_results = 300
-
     def _handler_process_all(self, terminate_stopped, execute):
-        boto_resource = BotoResource().get_resource()
-        ec2_instances = EC2Instance.objects.all()
-        ec2_instances_map = {}
-        for ec2_instance in ec2_instances:
-            ec2_instances_map[ec2_instance.instance_id] = ec2_instance
-        boto_instances = boto_resource.instances.filter(
-            MaxResults=self.ec2_max_results,
-        )
-
-        counter = 0
+        result = EC2Reconciler().reconcile(create_missing=True, delete_missing=True)
+
         terminated_rpids = []
-        deleted_rpids = []
-        existing_instance_ids = []
-        for boto_instance in boto_instances:
-            status = boto_instance.state['Name']
-            if status == EC2Instance.STATUS_TERMINATED:
-                continue
-            counter += 1
-            existing_instance_ids.append(boto_instance.id)
-            instance = EC2Instance.upsert_from_boto(boto_instance, ec2_instances_map.get(boto_instance.id))
-            if terminate_stopped:
-                if instance and instance.status == EC2Instance.STATUS_STOPPED and not instance.lead:
-                    if execute:
-                        instance.terminate()
-                    terminated_rpids.append(instance.rpid)
-
-        for instance in ec2_instances:
-            if instance.instance_id not in existing_instance_ids:
-                deleted_rpids.append(instance.rpid)
-                instance.lead = None
-                instance.save()
-                instance.delete()
+        if terminate_stopped:
+            for instance in EC2Instance.objects.filter(status=EC2Instance.STATUS_STOPPED, lead__isnull=True):
+                if execute:
+                    instance.terminate()
+                terminated_rpids.append(instance.rpid)
 
         return JsonResponse({
-            'total': counter,
+            'total': result.total_count,
+            'pages_count': result.pages_count,
+            'created_rpids': result.created_rpids,
+            'updated_rpids': result.updated_rpids,
             'terminated_rpids': terminated_rpids,
-            'deleted_rpids': deleted_rpids,
+            'deleted_rpids': result.deleted_rpids,
             'result': True,
         })
 
     def _handler_pending(self, execute):
-        updated_rpids = []
-        boto_resource = BotoResource()
-        for ec2_boto in boto_resource.get_resource('ec2').instances.all():
-            ec2 = EC2Instance.objects.filter(instance_id=ec2_boto.id).first()
-            if ec2:
-                if execute:
-                    ec2.update_from_boto(ec2_boto)
-                updated_rpids.append(ec2.rpid or '<NORPID>')
+        result = EC2Reconciler().reconcile(execute=bool(execute))
 
         return JsonResponse({
-            'updated_rpids': sorted(updated_rpids),
+            'updated_rpids': result.updated_rpids,
+            'pages_count': result.pages_count,
             'result': True,
         })
 
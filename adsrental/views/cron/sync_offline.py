@@ -3,6 +3,7 @@ import datetime
 from django.views import View
 from django.http import JsonResponse
 from django.utils import timezone
+from django.db import models, transaction
 
 from adsrental.models.lead import Lead
 from adsrental.models.lead_account import LeadAccount
@@ -15,50 +16,64 @@ class SyncOfflineView(View):
     Check :model:`adsrental.RaspberryPi` state and close sessions if device is offline. Send *offline* Cutomer.io event.
     Run by cron every 10 minutes.
 
+    Leads with active accounts are found with one annotated query, devices, sessions,
+    security checkpoint report dates and events are saved with one query each.
+
     Parameters:
 
     * test - if 'true' does not close sessions and generate events, just provides output.
     '''
 
     def get(self, request):
-        reported_offline_leads = []
-        reported_checkpoint = []
         now = timezone.localtime(timezone.now())
         test = request.GET.get('test')
-        customerio_client = CustomerIOClient()
-        for lead in Lead.objects.filter(
-                raspberry_pi__last_seen__lt=now - datetime.timedelta(minutes=RaspberryPi.online_minutes_ttl + 60),
-                pi_delivered=True,
-                raspberry_pi__first_seen__isnull=False,
-                status__in=Lead.STATUSES_ACTIVE,
+        leads = Lead.objects.filter(
+            raspberry_pi__last_seen__lt=now - datetime.timedelta(minutes=RaspberryPi.online_minutes_ttl + 60),
+            pi_delivered=True,
+            raspberry_pi__first_seen__isnull=False,
+            status__in=Lead.STATUSES_ACTIVE,
         ).exclude(
             raspberry_pi__last_offline_reported__gte=now - datetime.timedelta(hours=RaspberryPi.last_offline_reported_hours_ttl),
-        ).select_related('raspberry_pi'):
-            active_accounts = LeadAccount.get_active_lead_accounts(lead)
-            if not active_accounts:
-                continue
+        ).annotate(
+            active_accounts_count=models.Count(
+                'lead_account',
+                filter=models.Q(lead_account__active=True, lead_account__status__in=LeadAccount.STATUSES_ACTIVE),
+            ),
+        ).filter(
+            active_accounts_count__gt=0,
+        ).select_related('raspberry_pi')
+
+        lead_accounts = LeadAccount.objects.filter(
+            security_checkpoint_date__isnull=False,
+            status__in=LeadAccount.STATUSES_ACTIVE,
+        ).exclude(
+            last_security_checkpoint_reported__gte=now - datetime.timedelta(hours=LeadAccount.LAST_SECURITY_CHECKPOINT_REPORTED_HOURS_TTL),
+        ).select_related('lead', 'lead__raspberry_pi')
+
+        leads_events = []
+        reported_offline_leads = []
+        offline_rpids = []
+        for lead in leads:
             offline_hours_ago = 1
             if lead.raspberry_pi.last_seen:
                 offline_hours_ago = int((now - lead.raspberry_pi.last_seen).total_seconds() / 60 / 60)
             reported_offline_leads.append(lead.email)
-            if test:
-                continue
-
-            customerio_client.send_lead_event(lead, CustomerIOClient.EVENT_OFFLINE, hours=offline_hours_ago)
-            lead.raspberry_pi.report_offline()
+            offline_rpids.append(lead.raspberry_pi.rpid)
+            leads_events.append((lead, CustomerIOClient.EVENT_OFFLINE, dict(hours=offline_hours_ago)))
 
-        for lead_account in LeadAccount.objects.filter(
-                security_checkpoint_date__isnull=False,
-                status__in=LeadAccount.STATUSES_ACTIVE,
-        ).exclude(
-            last_security_checkpoint_reported__gte=now - datetime.timedelta(hours=LeadAccount.LAST_SECURITY_CHECKPOINT_REPORTED_HOURS_TTL),
-        ).select_related('lead', 'lead__raspberry_pi'):
+        reported_checkpoint = []
+        reported_checkpoint_ids = []
+        for lead_account in lead_accounts:
             reported_checkpoint.append(str(lead_account))
-            if test:
-                continue
-            customerio_client.send_lead_event(lead_account.lead, CustomerIOClient.EVENT_SECURITY_CHECKPOINT, account_type=lead_account.account_type)
-            lead_account.last_security_checkpoint_reported = now
-            lead_account.save()
+            reported_checkpoint_ids.append(lead_account.id)
+            leads_events.append((lead_account.lead, CustomerIOClient.EVENT_SECURITY_CHECKPOINT, dict(account_type=lead_account.account_type)))
+
+        if not test:
+            with transaction.atomic():
+                RaspberryPi.report_offline_many(offline_rpids)
+                if reported_checkpoint_ids:
+                    LeadAccount.objects.filter(id__in=reported_checkpoint_ids).update(last_security_checkpoint_reported=now)
+                CustomerIOClient().send_leads_events(leads_events)
 
         return JsonResponse({
             'test': test,
@@ -1,4 +1,5 @@
-from django.core.cache import cache
+import time
+
 from django.views import View
 from django.http import JsonResponse
 from django_bulk_update.helper import bulk_update
@@ -12,32 +13,44 @@ class UpdatePingView(View):
     '''
     Update :model:`adsrental.RaspberryPi` and :model:`adsrental.EC2Instance` pings in databse from cache.
 
-    Runs every 2 minutes by cron.
+    Runs every 2 minutes by cron. Cache entries are kept consistent with DB by model signals,
+    so this view mostly flushes data reported by devices. Only devices that pinged since last run
+    are processed and only changed rows are saved. Ping can overwrite entry refreshed by signal
+    with data it read before, so DB-dependent values of processed entries are checked in one query and fixed.
+    Cache is warmed up by *warm_up_ping_cache* command on server start. If cache was flushed at runtime,
+    for example by redis restart, it is warmed up here first.
 
     Parameters:
 
     * rpid - if provided, process only one lead, used for debug purposes
+    * all - if 'true', process all cached devices, not only ones that pinged since last run
     '''
+    RASPBERRY_PI_FIELDS = ['ip_address', 'first_seen', 'first_tested', 'online_since_date', 'last_seen', 'version']
+    EC2_INSTANCE_FIELDS = ['last_troubleshoot', 'tunnel_up_date']
 
     def get(self, request):
+        start = time.time()
         ping_cache_helper = PingCacheHelper()
-        ping_keys = cache.get('ping_keys', [])
+        warmed_up_count = ping_cache_helper.warm_up_if_required()
         rpid = request.GET.get('rpid')
+        process_all = request.GET.get('all') == 'true'
         if rpid:
-            ping_keys = [ping_cache_helper.get_key(rpid)]
+            ping_rpids = {rpid}
+        elif process_all:
+            ping_rpids = set(ping_cache_helper.iter_rpids())
+        else:
+            ping_rpids = ping_cache_helper.pop_dirty_rpids()
 
-        rpids_ping_map = {}
-        for ping_key in ping_keys:
-            ping_data = cache.get(ping_key)
-            if not ping_data:
-                continue
-            rpid = ping_data['rpid']
-            rpids_ping_map[rpid] = ping_data
+        rpids_ping_map = ping_cache_helper.get_many(ping_rpids)
+        expired_rpids = ping_rpids - set(rpids_ping_map.keys())
+        ping_cache_helper.remove_rpids(expired_rpids)
 
         rpids = []
-        invalidated_rpids = []
+        changed_raspberry_pis = []
+        changed_ec2_instances = []
         raspberry_pis = RaspberryPi.objects.filter(rpid__in=rpids_ping_map.keys()).prefetch_related('lead')
-        ec2_instances = EC2Instance.objects.filter(rpid__in=rpids_ping_map.keys()).select_related('lead')
+        troubleshoot_rpids = [k for k, v in rpids_ping_map.items() if v.get('last_troubleshoot')]
+        ec2_instances = EC2Instance.objects.filter(rpid__in=troubleshoot_rpids) if troubleshoot_rpids else []
         ec2_instances_map = {}
         for ec2_instance in ec2_instances:
             ec2_instances_map[ec2_instance.rpid] = ec2_instance
@@ -46,24 +59,38 @@ class UpdatePingView(View):
             rpid = ping_data['rpid']
             rpids.append(rpid)
             ec2_instance = ec2_instances_map.get(rpid)
-            self.process_ping_data(ping_data, raspberry_pi, ec2_instance)
 
-            if not ping_cache_helper.is_data_consistent(
-                    ping_data,
-                    raspberry_pi=raspberry_pi,
-                    ec2_instance=ec2_instance,
-            ):
-                ping_cache_helper.delete(rpid)
-                invalidated_rpids.append(rpid)
+            raspberry_pi_values = self.get_values(raspberry_pi, self.RASPBERRY_PI_FIELDS)
+            ec2_instance_values = self.get_values(ec2_instance, self.EC2_INSTANCE_FIELDS)
+            self.process_ping_data(ping_data, raspberry_pi, ec2_instance)
+            if self.get_values(raspberry_pi, self.RASPBERRY_PI_FIELDS) != raspberry_pi_values:
+                changed_raspberry_pis.append(raspberry_pi)
+            if self.get_values(ec2_instance, self.EC2_INSTANCE_FIELDS) != ec2_instance_values:
+                changed_ec2_instances.append(ec2_instance)
 
-        bulk_update(raspberry_pis, update_fields=['ip_address', 'first_seen', 'first_tested', 'online_since_date', 'last_seen', 'version'])
-        bulk_update(ec2_instances, update_fields=['last_troubleshoot', 'tunnel_up_date'])
+        if changed_raspberry_pis:
+            bulk_update(changed_raspberry_pis, update_fields=self.RASPBERRY_PI_FIELDS)
+        if changed_ec2_instances:
+            bulk_update(changed_ec2_instances, update_fields=self.EC2_INSTANCE_FIELDS)
+        refreshed_count = ping_cache_helper.refresh_many(rpids_ping_map.keys(), cached_data=rpids_ping_map)
         return JsonResponse({
             'rpids': rpids,
-            'invalidated': invalidated_rpids,
+            'warmed_up_count': warmed_up_count,
+            'dirty_count': len(ping_rpids),
+            'expired_count': len(expired_rpids),
+            'raspberry_pis_updated': len(changed_raspberry_pis),
+            'ec2_instances_updated': len(changed_ec2_instances),
+            'refreshed_count': refreshed_count,
+            'seconds': round(time.time() - start, 3),
             'result': True,
         })
 
+    @staticmethod
+    def get_values(instance, fields):
+        if instance is None:
+            return None
+        return [getattr(instance, field) for field in fields]
+
     def process_ping_data(self, ping_data, raspberry_pi, ec2_instance):
         raspberry_pi.process_ping_data(ping_data)
 
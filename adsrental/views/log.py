@@ -1,7 +1,8 @@
 import os
 import json
 import typing
-from distutils.version import StrictVersion  # pylint: disable=no-name-in-module,import-error
+import datetime
+import collections
 
 from django.views import View
 from django.http import JsonResponse, HttpResponse, HttpRequest
@@ -11,10 +12,13 @@ from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
 from django.utils.decorators import method_decorator
 from django.shortcuts import Http404
+from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 
 from adsrental.models.lead import Lead
 from adsrental.models.raspberry_pi import RaspberryPi
-from adsrental.utils import PingCacheHelper
+from adsrental.utils import PingCacheHelper, UniqueIPHelper, OnlineMinutesHelper
+from adsrental.raspberry_pi_firmware import firmware_policy, FirmwareDecision
+from adsrental.raspberry_pi_log import raspberry_pi_log_writer, is_index_message, read_index, tail, resolve_log_path, COMPRESSED_SUFFIX
 
 
 class ShowLogDirView(View):
@@ -23,7 +27,8 @@ class ShowLogDirView(View):
         path = os.path.join(settings.RASPBERRY_PI_LOG_PATH, rpid)
         if not os.path.exists(path):
             raise Http404
-        filenames = os.listdir(path)
+        # compressed logs are shown under plain log name, ShowLogView reads them transparently
+        filenames = [i[:-len(COMPRESSED_SUFFIX)] if i.endswith(COMPRESSED_SUFFIX) else i for i in os.listdir(path)]
         filenames.sort(reverse=True)
         return render(request, 'log_dir.html', dict(
             user=request.user,
@@ -33,72 +38,117 @@ class ShowLogDirView(View):
 
 
 class ShowLogView(View):
+    '''
+    Show RaspberryPi log file, newest lines first.
+
+    Only *lines_per_page* lines are read from the end of file. Compressed logs are read transparently.
+
+    Parameters:
+
+    * page - page number, use to browse older lines
+    '''
+    lines_per_page = 1000
+
     @method_decorator(login_required)
     def get(self, request: HttpRequest, rpid: str, filename: str) -> HttpResponse:
-        log_path = os.path.join(settings.RASPBERRY_PI_LOG_PATH, rpid, filename)
-        if not os.path.exists(log_path):
+        log_path = resolve_log_path(os.path.join(settings.RASPBERRY_PI_LOG_PATH, rpid, filename))
+        if log_path is None:
             raise Http404
 
-        lines = open(log_path).readlines()
-        lines.reverse()
+        try:
+            page = max(int(request.GET.get('page', 1)), 1)
+        except ValueError:
+            page = 1
+
+        lines = tail(log_path, self.lines_per_page + 1, offset=(page - 1) * self.lines_per_page)
+        has_older = len(lines) > self.lines_per_page
         return render(request, 'log/file.html', dict(
-            lines=lines,
+            lines=lines[:self.lines_per_page],
+            page=page,
+            previous_page=page - 1,
+            next_page=page + 1 if has_older else None,
         ))
 
 
 class ShowAggLogView(View):
+    '''
+    Show restarts, client messages and config updates for all RaspberryPis for a given day.
+
+    Lines are read from daily index written by *LogView.add_log*, so RaspberryPi logs are not scanned.
+
+    Parameters:
+
+    * date - date in YYYYmmdd format, today by default
+    * rpid - if provided, show lines only for this RPID
+    * page - page number, *items_per_page* RPIDs per page
+    '''
+    items_per_page = 50
+
     @method_decorator(login_required)
     def get(self, request: HttpRequest) -> HttpResponse:
         now = timezone.localtime(timezone.now())
-        date = request.GET.get('date', now.strftime('%Y%m%d'))
-        filename = f"{date}.log"
-
-        rps = os.listdir(settings.RASPBERRY_PI_LOG_PATH)
-        rps_ = []
-        log_lines = {}
-
-        for rp in rps:
-            log_path = os.path.join(settings.RASPBERRY_PI_LOG_PATH, rp, filename)
+        date_str = request.GET.get('date', now.strftime('%Y%m%d'))
+        rpid = request.GET.get('rpid') or None
+        try:
+            date = datetime.datetime.strptime(date_str, '%Y%m%d').date()
+        except ValueError:
+            raise Http404
 
-            if not os.path.exists(log_path):
-                continue
+        log_lines: typing.Dict[str, typing.List[str]] = {}
+        for line_rpid, line in read_index(date, rpid=rpid):
+            log_lines.setdefault(line_rpid, []).append(line)
 
-            rps_.append(rp)
-            lines = open(log_path).readlines()
-            lines.reverse()
-            log_lines[rp] = []
+        rps = sorted(log_lines.keys())
+        page = request.GET.get('page', 1)
+        paginator = Paginator(rps, self.items_per_page)
+        try:
+            entries = paginator.page(page)
+        except PageNotAnInteger:
+            entries = paginator.page(1)
+        except EmptyPage:
+            entries = paginator.page(paginator.num_pages)
 
-            for line in lines:
-                if 'restarting' in line or 'Client >>>' in line:
-                    log_lines[rp].append(line)
+        page_log_lines = collections.OrderedDict()
+        for page_rpid in entries:
+            page_log_lines[page_rpid] = log_lines[page_rpid][::-1]
 
         return render(request, 'log/log_agg.html', dict(
-            log_lines=log_lines,
-            rps=rps_,
-            date=date,
-            filename=filename
+            log_lines=page_log_lines,
+            entries=entries,
+            rps=rps,
+            rpid=rpid,
+            date=date_str,
+            filename=f"{date_str}.log",
         ))
 
 
 class LogView(View):
+    '''
+    Log messages and pings from RaspberryPi devices.
+
+    Ping response keys:
+
+    * result - False if lead is banned or has wrong password
+    * restart - device should restart
+    * new_config - device should download new config, *new_config_reason* explains why
+    * update - device should run *update_pi.sh*
+    * update_version - firmware version device should have, sent with *update*.
+      *update_pi.sh* gets the same version from *ConnectionDataView*, so staged rollout applies to it
+    * unassign_hostname - lead is not active, device should drop EC2 tunnel
+    '''
     PING_DATA_TTL_SECONDS = 300
 
     def add_log(self, request: HttpRequest, rpid: str, message: str) -> None:
         ip_address = request.META.get('REMOTE_ADDR')
         now = timezone.localtime(timezone.now())
-        log_path = os.path.join(
-            settings.RASPBERRY_PI_LOG_PATH,
-            rpid,
-            '{}.log'.format(now.strftime('%Y%m%d')),
+        line = '{ts}: {ip}: {message}\n'.format(
+            ts=now.strftime(settings.SYSTEM_DATETIME_FORMAT),
+            ip=ip_address,
+            message=message,
         )
-        if not os.path.exists(os.path.dirname(log_path)):
-            os.makedirs(os.path.dirname(log_path))
-        with open(log_path, 'a') as log_file:
-            log_file.write('{ts}: {ip}: {message}\n'.format(
-                ts=now.strftime(settings.SYSTEM_DATETIME_FORMAT),
-                ip=ip_address,
-                message=message,
-            ))
+        raspberry_pi_log_writer.write(rpid, now, line)
+        if is_index_message(message):
+            raspberry_pi_log_writer.write_index(rpid, now, line)
 
     def get_old_client_log_handler(self, request: HttpRequest, rpid: str) -> JsonResponse:
         message = request.GET.get('m')
@@ -115,31 +165,13 @@ class LogView(View):
         ping_data = ping_cache_helper.get_data_for_request(request)
         return HttpResponse(ping_data.get('hostname') or '')
 
-    def _get_restart_required(self, ping_data: typing.Dict[str, typing.Any]) -> bool:
-        version = ping_data.get('raspberry_pi_version')
-        restart_required = ping_data.get('restart_required')
-        if version and StrictVersion(version) < StrictVersion('1.1.2'):
-            return True
-
-        if restart_required:
-            return True
-
-        return False
-
-    def _get_update_required(self, ping_data: typing.Dict[str, typing.Any]) -> bool:
-        version = ping_data.get('raspberry_pi_version')
-        if not version:
-            return False
-
-        is_beta = ping_data.get('is_beta')
-
-        if not is_beta and version != settings.RASPBERRY_PI_VERSION:
-            return True
-
-        if is_beta and StrictVersion(version) < StrictVersion(settings.BETA_RASPBERRY_PI_VERSION):
-            return True
-
-        return False
+    def _get_firmware_decision(self, ping_data: typing.Dict[str, typing.Any]) -> FirmwareDecision:
+        return firmware_policy.decide(
+            rpid=ping_data.get('rpid'),
+            version=ping_data.get('raspberry_pi_version'),
+            is_beta=ping_data.get('is_beta', False),
+            restart_required=ping_data.get('restart_required', False),
+        )
 
     def _get_new_config_required(self, ping_data: typing.Dict[str, typing.Any]) -> typing.Tuple[bool, str]:
         reported_hostname = ping_data.get('reported_hostname')
@@ -160,17 +192,55 @@ class LogView(View):
 
         return False, ''
 
+    def is_db_required(self, ping_data: typing.Dict[str, typing.Any]) -> bool:
+        'Check if ping response for this data resets RaspberryPi cache, so it needs DB access'
+        firmware_decision = self._get_firmware_decision(ping_data)
+        if firmware_decision.update:
+            return True
+
+        if not Lead.is_status_active(ping_data['lead_status']) or not ping_data.get('lead_active_accounts_count', 1):
+            return False
+
+        if firmware_decision.restart:
+            return True
+
+        new_config_required, _ = self._get_new_config_required(ping_data)
+        return new_config_required
+
     def get_ping_handler(self, request: HttpRequest, rpid: str) -> JsonResponse:
         ping_cache_helper = PingCacheHelper()
         ping_data = ping_cache_helper.get_data_for_request(request)
+        return self.get_ping_response(request, rpid, ping_data, ping_cache_helper)
+
+    def get_ping_response(self, request: HttpRequest, rpid: str, ping_data: typing.Dict[str, typing.Any], ping_cache_helper: PingCacheHelper) -> JsonResponse:
         ping_data['last_ping'] = timezone.now()
-        ping_cache_helper.set(rpid, ping_data)
+        self.track_ping(rpid, ping_data, ping_cache_helper)
 
         self.add_log(request, rpid, 'PING {}'.format(request.GET.urlencode()))
 
         response_data = self._get_ping_response_data(request, rpid, ping_data)
         return self.json_response(request, rpid, response_data)
 
+    @staticmethod
+    def track_ping(rpid: str, ping_data: typing.Dict[str, typing.Any], ping_cache_helper: PingCacheHelper) -> None:
+        'Save ping data, source IP and online minute. With redis all commands are sent in one pipeline round trip.'
+        unique_ip_helper = UniqueIPHelper()
+        online_minutes_helper = OnlineMinutesHelper()
+        if ping_cache_helper.redis is None:
+            ping_cache_helper.set(rpid, ping_data)
+            unique_ip_helper.track(rpid, ping_data.get('ip_address'), ping_data['last_ping'])
+            online_minutes_helper.track(rpid)
+            return
+
+        timestamp = int(ping_data['last_ping'].timestamp())
+        pipeline = ping_cache_helper.redis.pipeline(transaction=False)
+        ping_cache_helper.queue_set(pipeline, rpid, ping_data)
+        online_minutes_helper.queue_track(pipeline, rpid)
+        unique_ips_index = len(pipeline)
+        unique_ip_helper.queue_track(pipeline, rpid, ping_data.get('ip_address'), timestamp)
+        results = pipeline.execute()
+        unique_ip_helper.on_tracked(rpid, timestamp, results[unique_ips_index:])
+
     def _get_ping_response_data(self, request: HttpRequest, rpid: str, ping_data: typing.Dict[str, typing.Any]) -> typing.Dict[str, typing.Any]:
         lead_status = ping_data['lead_status']
         wrong_password = ping_data.get('wrong_password')
@@ -178,10 +248,11 @@ class LogView(View):
 
         reason = None
         result = True
+        firmware_decision = self._get_firmware_decision(ping_data)
 
         if not Lead.is_status_active(lead_status) or not lead_active_accounts_count:
             reason = 'Lead not found or banned'
-            update_required = self._get_update_required(ping_data)
+            update_required = firmware_decision.update
             if update_required:
                 self.add_log(request, rpid, 'RaspberryPi image updated, updating...')
                 raspberry_pi = RaspberryPi.objects.filter(rpid=rpid).first()
@@ -194,6 +265,8 @@ class LogView(View):
                 'unassign_hostname': True,
                 'update': update_required,
             }
+            if update_required:
+                response_data['update_version'] = firmware_decision.target_version
             return response_data
 
         if wrong_password:
@@ -205,9 +278,9 @@ class LogView(View):
             'result': result,
         }
 
-        restart_required = self._get_restart_required(ping_data)
+        restart_required = firmware_decision.restart
         new_config_required, new_config_required_reason = self._get_new_config_required(ping_data)
-        update_required = self._get_update_required(ping_data)
+        update_required = firmware_decision.update
 
         if new_config_required:
             self.add_log(request, rpid, f'Sending info about config update: {new_config_required_reason}')
@@ -227,6 +300,7 @@ class LogView(View):
         if update_required:
             self.add_log(request, rpid, 'RaspberryPi image updated, updating...')
             response_data['update'] = update_required
+            response_data['update_version'] = firmware_decision.target_version
             raspberry_pi = RaspberryPi.objects.filter(rpid=rpid).first()
             if raspberry_pi:
                 raspberry_pi.reset_cache()
@@ -2,11 +2,15 @@ from django.views import View
 from django.http import JsonResponse, HttpRequest
 
 from adsrental.models.raspberry_pi import RaspberryPi
+from adsrental.raspberry_pi_firmware import firmware_policy
 
 
 class ConnectionDataView(View):
     '''
     Get data about EC2 by RPID. Should have been used by new python RaspberryPi firmware, but was not.
+
+    Also used by *update_pi.sh*, it downloads firmware from *update_version* key.
+    Stable devices in staged rollout get *RASPBERRY_PI_ROLLOUT_VERSION* there.
     '''
 
     def get(self, request: HttpRequest, rpid: str) -> JsonResponse:
@@ -46,6 +50,7 @@ class ConnectionDataView(View):
                 'rtunnel_port': 3808,
                 'is_proxy_tunnel': False,
                 'is_beta': raspberry_pi.is_proxy_tunnel or raspberry_pi.is_beta,
+                'update_version': firmware_policy.get_target_version(raspberry_pi.rpid, raspberry_pi.is_beta),
                 'result': True,
             })
 
@@ -57,5 +62,6 @@ class ConnectionDataView(View):
             'rtunnel_port': raspberry_pi.rtunnel_port or '',
             'is_proxy_tunnel': True,
             'is_beta': raspberry_pi.is_proxy_tunnel or raspberry_pi.is_beta,
+            'update_version': firmware_policy.get_target_version(raspberry_pi.rpid, raspberry_pi.is_beta),
             'result': True,
         })
@@ -28,14 +28,14 @@ class ProxyTunnelInfoView(View):
         try:
             response = raspberry_pi.check_proxy_tunnel()
             response_seconds = response.elapsed.total_seconds()
-            if response_seconds < 3:
+            if response_seconds < RaspberryPi.TUNNEL_CHECK_SLOW_SECONDS:
                 messages.success(request, f'Proxy tunnel responded in {round(response_seconds, 2)} seconds, so it is stable.')
             else:
                 messages.error(request, f'Proxy tunnel responded in {round(response_seconds, 2)} seconds. MLA can reject this tunnel.')
         except requests.ConnectionError:
             messages.error(request, 'Proxy tunnel is not reachable.')
         except requests.exceptions.RequestException:
-            messages.error(request, 'Proxy tunnel did not respond in 5 seconds. User internet connection might be too slow.')
+            messages.error(request, f'Proxy tunnel did not respond in {RaspberryPi.TUNNEL_CHECK_TIMEOUT} seconds. User internet connection might be too slow.')
 
         return render(request, 'rpi/proxy_tunnel_info.html', dict(
             user=request.user,
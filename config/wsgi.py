@@ -8,4 +8,8 @@ from config.environment import SETTINGS_MODULE
 pymysql.install_as_MySQLdb()
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", SETTINGS_MODULE)
 application = get_wsgi_application()  # pylint: disable=C0103
+
+from adsrental.middlewares.ping_fast_path import PingFastPathMiddleware  # noqa: E402 pylint: disable=C0413
+
+application = PingFastPathMiddleware(application)  # pylint: disable=C0103
 app = application  # pylint: disable=C0103
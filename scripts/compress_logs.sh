@@ -0,0 +1,2 @@
+#!/usr/bin/env bash
+docker-compose -f /root/dashboard/docker-compose.dev.yml run web python manage.py compress_logs $@
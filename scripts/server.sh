@@ -15,5 +15,8 @@ python manage.py collectstatic --noinput > /dev/null
 # python manage.py migrate
 # python manage.py loaddata adsrental/fixtures/fixtures.json
 
+#fill ping cache before workers get pings, does nothing if cache version did not change
+python manage.py warm_up_ping_cache || echo "Ping cache warm up failed"
+
 sysctl -w net.core.somaxconn=65535
 /usr/bin/supervisord
@@ -0,0 +1,48 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from adsrental.models.ec2_instance import EC2Instance
+from adsrental.utils import BotoResource, boto_registry
+
+
+class TestBotoRegistryOverride(SimpleTestCase):
+    def test_create_r53_entry(self):
+        ec2_resource = mock.MagicMock()
+        ec2_resource.allocate_address.return_value = {'AllocationId': 'eipalloc-1', 'PublicIp': '10.0.0.1'}
+        route53_client = mock.MagicMock()
+        ec2_instance = EC2Instance(instance_id='i-1', rpid='RP1')
+
+        with boto_registry.override('ec2', resource=ec2_resource), boto_registry.override('route53', client=route53_client):
+            BotoResource().create_r53_entry(ec2_instance)
+
+        ec2_resource.associate_address.assert_called_once_with(InstanceId='i-1', AllocationId='eipalloc-1')
+        route53_client.change_resource_record_sets.assert_called_once()
+        change = route53_client.change_resource_record_sets.call_args[1]['ChangeBatch']['Changes'][0]
+        self.assertEqual(change['ResourceRecordSet']['Name'], ec2_instance.get_r53_hostname())
+        self.assertEqual(change['ResourceRecordSet']['ResourceRecords'], [{'Value': '10.0.0.1'}])
+
+        self.assertEqual(boto_registry.overrides, {})
+        self.assertIsNot(BotoResource().get_client('route53'), route53_client)
+        self.assertIsNot(BotoResource().get_resource('ec2'), ec2_resource)
+
+    def test_get_boto_instance(self):
+        boto_instance = mock.MagicMock()
+        ec2_resource = mock.MagicMock()
+        ec2_resource.instances.filter.return_value = [boto_instance]
+        ec2_instance = EC2Instance(instance_id='i-1', rpid='RP1')
+
+        with boto_registry.override('ec2', resource=ec2_resource):
+            self.assertIs(ec2_instance.get_boto_instance(), boto_instance)
+        ec2_resource.instances.filter.assert_called_once_with(Filters=[{'Name': 'instance-id', 'Values': ['i-1']}])
+
+        self.assertIsNot(BotoResource().get_resource('ec2'), ec2_resource)
+
+    def test_nested_override(self):
+        outer_client = mock.MagicMock()
+        inner_client = mock.MagicMock()
+        with boto_registry.override('ec2', client=outer_client):
+            with boto_registry.override('ec2', client=inner_client):
+                self.assertIs(BotoResource().get_client('ec2'), inner_client)
+            self.assertIs(BotoResource().get_client('ec2'), outer_client)
+        self.assertNotIn('ec2', boto_registry.overrides)
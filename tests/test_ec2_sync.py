@@ -0,0 +1,131 @@
+from django.test import TestCase
+
+from adsrental.ec2_sync import EC2Reconciler
+from adsrental.models.ec2_instance import EC2Instance
+from adsrental.models.lead import Lead
+from adsrental.models.raspberry_pi import RaspberryPi
+
+
+class StubPaginator():
+    def __init__(self, pages):
+        self.pages = pages
+
+    def paginate(self, **kwargs):  # pylint: disable=W0613
+        return iter(self.pages)
+
+
+class StubEC2Client():
+    'Returns instances from *pages* as describe_instances pages'
+    def __init__(self, pages):
+        self.pages = pages
+
+    def get_paginator(self, operation_name):
+        assert operation_name == 'describe_instances'
+        return StubPaginator(self.pages)
+
+
+def instance_data(instance_id, rpid, status=EC2Instance.STATUS_RUNNING, hostname=None, ip_address=None):
+    return {
+        'InstanceId': instance_id,
+        'State': {'Name': status},
+        'Tags': [{'Key': 'Name', 'Value': rpid}, {'Key': 'Email', 'Value': f'{rpid}@example.com'}],
+        'PublicDnsName': hostname or f'{instance_id}.example.com',
+        'PublicIpAddress': ip_address or '10.0.0.1',
+    }
+
+
+def page(*instances):
+    return {'Reservations': [{'Instances': list(instances)}]}
+
+
+class TestEC2Reconciler(TestCase):
+    def setUp(self):
+        self.leads = {}
+        for rpid in ('RP1', 'RP2', 'RP3'):
+            raspberry_pi = RaspberryPi.objects.create(rpid=rpid)
+            self.leads[rpid] = Lead.objects.create(leadid=f'lead_{rpid}', raspberry_pi=raspberry_pi, status=Lead.STATUS_QUALIFIED)
+
+    def reconcile(self, pages, **kwargs):
+        return EC2Reconciler(ec2_client=StubEC2Client(pages)).reconcile(**kwargs)
+
+    def test_create_new(self):
+        pages = [
+            page(instance_data('i-1', 'RP1')),
+            page(instance_data('i-2', 'RP2'), instance_data('i-3', 'RP3', status=EC2Instance.STATUS_TERMINATED)),
+        ]
+        result = self.reconcile(pages, create_missing=False)
+        self.assertEqual(result.created_rpids, [])
+        self.assertFalse(EC2Instance.objects.exists())
+
+        result = self.reconcile(pages, create_missing=True)
+        self.assertEqual(result.pages_count, 2)
+        self.assertEqual(result.total_count, 2)
+        self.assertEqual(sorted(result.created_rpids), ['RP1', 'RP2'])
+        ec2_instance = EC2Instance.objects.get(instance_id='i-1')
+        self.assertEqual(ec2_instance.rpid, 'RP1')
+        self.assertEqual(ec2_instance.lead, self.leads['RP1'])
+        self.assertEqual(ec2_instance.email, 'RP1@example.com')
+        self.assertEqual(ec2_instance.hostname, 'i-1.example.com')
+        self.assertFalse(EC2Instance.objects.filter(instance_id='i-3').exists())
+
+    def test_update_changed(self):
+        EC2Instance.objects.create(instance_id='i-1', rpid='RP1', lead=self.leads['RP1'], status=EC2Instance.STATUS_RUNNING, hostname='i-1.example.com', ip_address='10.0.0.1', email='RP1@example.com')
+        EC2Instance.objects.create(instance_id='i-2', rpid='RP2', lead=self.leads['RP2'], status=EC2Instance.STATUS_RUNNING, hostname='i-2.example.com', ip_address='10.0.0.1', email='RP2@example.com')
+
+        result = self.reconcile([page(
+            instance_data('i-1', 'RP1', hostname='new.example.com', ip_address='10.0.0.2'),
+            instance_data('i-2', 'RP2'),
+        )])
+        self.assertEqual(result.updated_rpids, ['RP1'])
+        ec2_instance = EC2Instance.objects.get(instance_id='i-1')
+        self.assertEqual(ec2_instance.hostname, 'new.example.com')
+        self.assertEqual(ec2_instance.ip_address, '10.0.0.2')
+
+        result = self.reconcile([page(
+            instance_data('i-1', 'RP1', status=EC2Instance.STATUS_SHUTTING_DOWN, hostname='new.example.com', ip_address='10.0.0.2'),
+            instance_data('i-2', 'RP2'),
+        )], execute=False)
+        self.assertEqual(result.updated_rpids, ['RP1'])
+        self.assertEqual(EC2Instance.objects.get(instance_id='i-1').status, EC2Instance.STATUS_RUNNING)
+
+        self.reconcile([page(
+            instance_data('i-1', 'RP1', status=EC2Instance.STATUS_SHUTTING_DOWN, hostname='new.example.com', ip_address='10.0.0.2'),
+            instance_data('i-2', 'RP2'),
+        )])
+        ec2_instance = EC2Instance.objects.get(instance_id='i-1')
+        self.assertEqual(ec2_instance.status, EC2Instance.STATUS_SHUTTING_DOWN)
+        self.assertIsNone(ec2_instance.lead)
+
+    def test_delete_missing(self):
+        EC2Instance.objects.create(instance_id='i-1', rpid='RP1', lead=self.leads['RP1'], status=EC2Instance.STATUS_RUNNING)
+        EC2Instance.objects.create(instance_id='i-2', rpid='RP2', lead=self.leads['RP2'], status=EC2Instance.STATUS_RUNNING)
+        EC2Instance.objects.create(instance_id='i-3', rpid='RP3', lead=self.leads['RP3'], status=EC2Instance.STATUS_RUNNING)
+        pages = [page(instance_data('i-1', 'RP1'), instance_data('i-3', 'RP3', status=EC2Instance.STATUS_TERMINATED))]
+
+        result = self.reconcile(pages)
+        self.assertEqual(result.deleted_rpids, [])
+        self.assertEqual(EC2Instance.objects.count(), 3)
+
+        result = self.reconcile(pages, delete_missing=True)
+        self.assertEqual(sorted(result.deleted_rpids), ['RP2', 'RP3'])
+        self.assertEqual(list(EC2Instance.objects.values_list('instance_id', flat=True)), ['i-1'])
+
+    def test_lead_reassigned(self):
+        EC2Instance.objects.create(instance_id='i-1', rpid='RP1', lead=self.leads['RP1'], status=EC2Instance.STATUS_RUNNING)
+        EC2Instance.objects.create(instance_id='i-2', rpid='RP2', lead=self.leads['RP2'], status=EC2Instance.STATUS_RUNNING)
+
+        # leads are swapped between instances, so each lead is released before it is assigned again
+        result = self.reconcile([page(instance_data('i-1', 'RP2'), instance_data('i-2', 'RP1'))])
+        self.assertEqual(result.updated_rpids, ['RP1', 'RP2'])
+        self.assertEqual(EC2Instance.objects.get(instance_id='i-1').lead, self.leads['RP2'])
+        self.assertEqual(EC2Instance.objects.get(instance_id='i-2').lead, self.leads['RP1'])
+
+        # lead moves from existing instance to a new one
+        self.reconcile([page(instance_data('i-1', 'RP3'), instance_data('i-2', 'RP1'), instance_data('i-4', 'RP2'))], create_missing=True)
+        self.assertEqual(EC2Instance.objects.get(instance_id='i-1').lead, self.leads['RP3'])
+        self.assertEqual(EC2Instance.objects.get(instance_id='i-4').lead, self.leads['RP2'])
+
+    def test_duplicate_rpid(self):
+        result = self.reconcile([page(instance_data('i-1', 'RP1'), instance_data('i-2', 'RP1'))], create_missing=True)
+        self.assertEqual(result.created_rpids, ['RP1', 'RP1'])
+        self.assertEqual(EC2Instance.objects.filter(lead=self.leads['RP1']).count(), 1)
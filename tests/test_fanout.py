@@ -0,0 +1,123 @@
+import time
+import threading
+import collections
+
+from django.test import SimpleTestCase
+
+from adsrental.fanout import FanoutExecutor
+
+
+class TestFanoutRun(SimpleTestCase):
+    def setUp(self):
+        self.executor = FanoutExecutor(max_workers=4)
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def test_results(self):
+        def func(item):
+            if item == 3:
+                raise ValueError('bad item')
+            return item * 2
+
+        run = self.executor.run(func, range(5))
+        results = run.results()
+        self.assertEqual(sorted(i.result for i in results if i.ok), [0, 2, 4, 8])
+        self.assertEqual([str(i.error) for i in results if not i.ok], ['bad item'])
+        metrics = run.metrics.as_dict()
+        self.assertEqual(metrics['submitted'], 5)
+        self.assertEqual(metrics['succeeded'], 4)
+        self.assertEqual(metrics['failed'], 1)
+        self.assertEqual(metrics['running'], 0)
+
+    def test_per_target_limit(self):
+        lock = threading.Lock()
+        running = collections.Counter()
+        max_running = collections.Counter()
+
+        def func(item):
+            with lock:
+                running[item[0]] += 1
+                max_running[item[0]] = max(max_running[item[0]], running[item[0]])
+            time.sleep(0.05)
+            with lock:
+                running[item[0]] -= 1
+
+        items = [('a', i) for i in range(6)] + [('b', i) for i in range(2)]
+        run = self.executor.run(func, items, target=lambda i: i[0], per_target_limit=2)
+        results = run.results()
+        self.assertEqual(len(results), 8)
+        self.assertTrue(all(i.ok for i in results))
+        self.assertEqual(max_running, {'a': 2, 'b': 2})
+        self.assertLessEqual(run.metrics.as_dict()['max_running'], 4)
+
+    def test_timeout_from_start(self):
+        executor = FanoutExecutor(max_workers=1)
+        self.addCleanup(executor.shutdown)
+
+        # tasks wait in pool queue longer than timeout, but every task is fast
+        run = executor.run(lambda i: time.sleep(0.2), range(4), timeout=0.5)
+        results = run.results()
+        self.assertTrue(all(i.ok for i in results))
+        self.assertEqual(run.metrics.as_dict()['timed_out'], 0)
+
+        event = threading.Event()
+        run = executor.run(lambda i: event.wait(5), [1], timeout=0.2)
+        results = run.results()
+        event.set()
+        self.assertEqual(len(results), 1)
+        self.assertTrue(results[0].timed_out)
+        self.assertFalse(results[0].ok)
+        self.assertEqual(run.metrics.as_dict()['timed_out'], 1)
+
+    def test_abandoned_target(self):
+        event = threading.Event()
+        self.addCleanup(event.set)
+
+        def func(item):
+            if item == 0:
+                event.wait(5)
+            return item
+
+        start = time.monotonic()
+        run = self.executor.run(func, [0, 1, 2], target=lambda i: 'host', timeout=0.2, per_target_limit=1)
+        results = run.results()
+        self.assertLess(time.monotonic() - start, 2)
+        self.assertEqual([i.item for i in results], [0, 1, 2])
+        self.assertTrue(results[0].timed_out)
+        self.assertTrue(all(not i.ok and not i.timed_out for i in results[1:]))
+        metrics = run.metrics.as_dict()
+        self.assertEqual(metrics['timed_out'], 1)
+        self.assertEqual(metrics['failed'], 2)
+        self.assertEqual(metrics['abandoned'], 1)
+
+        event.set()
+        for _ in range(50):
+            if not run.metrics.as_dict()['abandoned']:
+                break
+            time.sleep(0.01)
+        self.assertEqual(run.metrics.as_dict()['abandoned'], 0)
+        self.assertEqual(self.executor.metrics.as_dict()['abandoned'], 0)
+
+    def test_cancel(self):
+        executor = FanoutExecutor(max_workers=1)
+        self.addCleanup(executor.shutdown)
+
+        run = executor.run(lambda i: i, range(5), max_in_flight=1)
+        results = []
+        for result in run:
+            results.append(result)
+            run.cancel()
+        self.assertEqual(len(results), 1)
+        metrics = run.metrics.as_dict()
+        self.assertEqual(metrics['submitted'], 1)
+        self.assertEqual(metrics['cancelled'], 4)
+
+    def test_stop_iteration_cancels_queued(self):
+        executor = FanoutExecutor(max_workers=1)
+        self.addCleanup(executor.shutdown)
+
+        run = executor.run(lambda i: i, range(5), max_in_flight=1)
+        for _ in run:
+            break
+        self.assertEqual(run.metrics.as_dict()['cancelled'], 4)
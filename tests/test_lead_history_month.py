@@ -0,0 +1,83 @@
+import datetime
+import decimal
+
+from django.test import TestCase
+from django.utils import timezone
+
+from adsrental.models.lead import Lead
+from adsrental.models.lead_account import LeadAccount
+from adsrental.models.lead_history import LeadHistory
+from adsrental.models.lead_history_month import LeadHistoryMonth
+from adsrental.models.raspberry_pi import RaspberryPi
+
+
+class TestLeadHistoryMonthBulkAggregate(TestCase):
+    DATE = datetime.date(2019, 3, 1)
+
+    def setUp(self):
+        def make_datetime(day):
+            return datetime.datetime(2019, 3, day, 12, 0, tzinfo=timezone.utc)
+
+        leads = []
+        for index in range(3):
+            raspberry_pi = RaspberryPi.objects.create(rpid=f'RPTEST{index}') if index < 2 else None
+            leads.append(Lead.objects.create(leadid=f'test{index}', raspberry_pi=raspberry_pi, status=Lead.STATUS_QUALIFIED))
+
+        LeadAccount.objects.create(lead=leads[0], username='fb0', password='pw', account_type=LeadAccount.ACCOUNT_TYPE_FACEBOOK, in_progress_date=make_datetime(1))
+        LeadAccount.objects.create(lead=leads[0], username='g0', password='pw', account_type=LeadAccount.ACCOUNT_TYPE_GOOGLE, in_progress_date=make_datetime(10))
+        LeadAccount.objects.create(lead=leads[0], username='a0', password='pw', account_type=LeadAccount.ACCOUNT_TYPE_AMAZON, in_progress_date=make_datetime(1), active=False)
+        LeadAccount.objects.create(
+            lead=leads[1], username='fb1', password='pw', account_type=LeadAccount.ACCOUNT_TYPE_FACEBOOK, in_progress_date=make_datetime(1),
+            status=LeadAccount.STATUS_BANNED, ban_reason=LeadAccount.BAN_REASON_FACEBOOK_POLICY, banned_date=make_datetime(15),
+        )
+        LeadAccount.objects.create(lead=leads[1], username='a1', password='pw', account_type=LeadAccount.ACCOUNT_TYPE_AMAZON)
+        LeadAccount.objects.create(lead=leads[2], username='g2', password='pw', account_type=LeadAccount.ACCOUNT_TYPE_GOOGLE, in_progress_date=make_datetime(1))
+
+        for lead in leads:
+            for day in range(1, 32):
+                LeadHistory.objects.create(
+                    lead=lead,
+                    date=self.DATE.replace(day=day),
+                    checks_online=24 if day % 5 else 0,
+                    checks_offline=0 if day % 5 else 24,
+                    checks_wrong_password_facebook=24 if day in (3, 4) else 0,
+                    checks_sec_checkpoint_google=24 if day == 21 else 0,
+                )
+
+        LeadHistoryMonth.objects.create(lead=leads[0], date=datetime.date(2019, 1, 1), amount=decimal.Decimal('9.00'), move_to_next_month=False)
+        LeadHistoryMonth.objects.create(lead=leads[0], date=datetime.date(2019, 2, 1), amount=decimal.Decimal('3.00'), move_to_next_month=True)
+        LeadHistoryMonth.objects.create(lead=leads[2], date=self.DATE, amount=decimal.Decimal('1.00'))
+
+    def get_state(self):
+        lead_histories = {
+            (i.lead_id, i.date): (i.amount, i.note)
+            for i in LeadHistory.objects.all()
+        }
+        items = {
+            i.lead_id: (i.days_online, i.days_offline, i.days_wrong_password, i.days_sec_checkpoint, i.amount, i.amount_moved, i.move_to_next_month)
+            for i in LeadHistoryMonth.objects.filter(date=self.DATE)
+        }
+        return lead_histories, items
+
+    def test_same_as_aggregate(self):
+        for lead in Lead.objects.all():
+            item = LeadHistoryMonth.get_or_create(lead, self.DATE)
+            item.aggregate()
+            if item.id or item.amount:
+                item.save()
+        expected = self.get_state()
+
+        LeadHistory.objects.update(amount=decimal.Decimal('0.00'), note=None)
+        LeadHistoryMonth.objects.filter(date=self.DATE).exclude(lead_id='test2').delete()
+        LeadHistoryMonth.objects.filter(date=self.DATE).update(amount=decimal.Decimal('1.00'), days_online=0)
+
+        items = LeadHistoryMonth.bulk_aggregate(Lead.objects.all(), self.DATE)
+        self.assertEqual(sorted(i.lead_id for i in items), ['test0', 'test1', 'test2'])
+        self.assertEqual(self.get_state(), expected)
+
+        lead_histories, items = expected
+        self.assertEqual(items['test0'][5], decimal.Decimal('3.00'))
+        self.assertEqual(items['test2'][4], decimal.Decimal('0.00'))
+        notes = '\n'.join(note for amount, note in lead_histories.values())
+        for text in ('is offline', 'became in progress only', 'was banned', 'wrong PW', 'security checkpoint', 'not in-progress yet', 'RaspberryPi does not exist'):
+            self.assertIn(text, notes)
@@ -0,0 +1,92 @@
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from adsrental.models.lead import Lead
+from adsrental.models.raspberry_pi import RaspberryPi
+from adsrental.utils import PingCacheHelper
+
+
+class TestPingCacheHelper(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.helper = PingCacheHelper()
+        self.leads = []
+        for index in range(3):
+            raspberry_pi = RaspberryPi.objects.create(rpid=f'RPTEST{index}')
+            self.leads.append(Lead.objects.create(leadid=f'test{index}', raspberry_pi=raspberry_pi, status=Lead.STATUS_QUALIFIED))
+        self.rpids = [lead.raspberry_pi_id for lead in self.leads]
+        for lead in self.leads:
+            data = self.helper.build_data(lead.raspberry_pi_id, self.helper.get_lead(lead.raspberry_pi_id))
+            data['last_ping'] = 'device value'
+            self.helper.set(lead.raspberry_pi_id, data)
+
+    def test_index(self):
+        self.assertEqual(set(self.helper.iter_rpids()), set(self.rpids))
+        self.assertEqual(self.helper.pop_dirty_rpids(), set(self.rpids))
+        self.assertEqual(self.helper.pop_dirty_rpids(), set())
+        self.helper.remove_rpids(self.rpids[:1])
+        self.assertEqual(set(self.helper.iter_rpids()), set(self.rpids[1:]))
+        self.helper.add_indexed_rpids(self.rpids[:1])
+        self.assertEqual(set(self.helper.iter_rpids()), set(self.rpids))
+        self.assertEqual(self.helper.pop_dirty_rpids(), set())
+
+    def test_refresh_many(self):
+        Lead.objects.filter(pk=self.leads[0].pk).update(status=Lead.STATUS_BANNED)
+        RaspberryPi.objects.filter(rpid=self.rpids[1]).update(restart_required=True)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.helper.refresh_many(self.rpids), 1)
+
+        data = self.helper.get(self.rpids[0])
+        self.assertEqual(data['lead_status'], Lead.STATUS_BANNED)
+        self.assertEqual(data['last_ping'], 'device value')
+        self.assertIsNone(self.helper.get(self.rpids[1]))
+        self.assertNotIn(self.rpids[1], set(self.helper.iter_rpids()))
+        self.assertEqual(self.helper.get(self.rpids[2])['lead_status'], Lead.STATUS_QUALIFIED)
+
+    def test_refresh_missing(self):
+        self.helper.delete(self.rpids[0])
+        with self.assertNumQueries(0):
+            self.assertFalse(self.helper.refresh(self.rpids[0]))
+        self.assertIsNone(self.helper.get(self.rpids[0]))
+
+    def test_warm_up_if_required(self):
+        cache.clear()
+        with mock.patch.object(PingCacheHelper, 'warm_up', side_effect=ValueError('DB is down')):
+            with self.assertRaises(ValueError):
+                self.helper.warm_up_if_required()
+        self.assertIsNone(cache.get(PingCacheHelper.VERSION_KEY))
+        self.assertIsNone(cache.get(PingCacheHelper.WARM_UP_LOCK_KEY))
+
+        RaspberryPi.objects.all().update(last_seen=timezone.now())
+        self.assertEqual(self.helper.warm_up_if_required(), 3)
+        self.assertEqual(cache.get(PingCacheHelper.VERSION_KEY), settings.CACHE_VERSION)
+        self.assertEqual(set(self.helper.iter_rpids()), set(self.rpids))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.helper.warm_up_if_required(), 0)
+
+
+class TestPingCacheSignals(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.helper = PingCacheHelper()
+
+    def test_lead_raspberry_pi_reassigned(self):
+        old_raspberry_pi = RaspberryPi.objects.create(rpid='RPOLD')
+        new_raspberry_pi = RaspberryPi.objects.create(rpid='RPNEW')
+        lead = Lead.objects.create(leadid='test', raspberry_pi=old_raspberry_pi, status=Lead.STATUS_QUALIFIED)
+        for rpid in ('RPOLD', 'RPNEW'):
+            self.helper.set(rpid, self.helper.build_data(rpid, self.helper.get_lead(rpid)))
+
+        lead.status = Lead.STATUS_IN_PROGRESS
+        lead.save()
+        self.assertEqual(self.helper.get('RPOLD')['lead_status'], Lead.STATUS_IN_PROGRESS)
+
+        lead.raspberry_pi = new_raspberry_pi
+        lead.save()
+        self.assertIsNone(self.helper.get('RPOLD'))
+        self.assertEqual(self.helper.get('RPNEW')['lead_status'], Lead.STATUS_IN_PROGRESS)
@@ -0,0 +1,65 @@
+import zlib
+
+from django.test import SimpleTestCase
+
+from adsrental.raspberry_pi_firmware import FirmwarePolicy, parse_version
+
+
+class TestParseVersion(SimpleTestCase):
+    def test_parse_version(self):
+        self.assertEqual(parse_version('1.2'), (1, 2, 0))
+        self.assertEqual(parse_version('1.2.3'), (1, 2, 3))
+        self.assertEqual(parse_version(' 2.0.10 '), (2, 0, 10))
+        self.assertLess(parse_version('2.0.9'), parse_version('2.0.10'))
+        self.assertIsNone(parse_version('2.0.x'))
+        self.assertIsNone(parse_version(''))
+
+
+class TestFirmwarePolicy(SimpleTestCase):
+    def get_policy(self, **kwargs):
+        params = dict(version='2.0.8', beta_version='2.1.0', min_version='1.1.2', rollout_version=None, rollout_percent=0, rollout_rpids=[])
+        params.update(kwargs)
+        return FirmwarePolicy(**params)
+
+    def test_restart(self):
+        policy = self.get_policy()
+        self.assertTrue(policy.is_restart_required('1.1.1'))
+        self.assertFalse(policy.is_restart_required('1.1.2'))
+        self.assertFalse(policy.is_restart_required('bad'))
+        self.assertFalse(policy.is_restart_required(None))
+        self.assertTrue(policy.decide('RP1', '2.0.8', restart_required=True).restart)
+
+    def test_update(self):
+        policy = self.get_policy()
+        self.assertFalse(policy.is_update_required('RP1', '2.0.8', False))
+        self.assertTrue(policy.is_update_required('RP1', '2.0.9', False))
+        self.assertTrue(policy.is_update_required('RP1', '2.0.7', False))
+        self.assertFalse(policy.is_update_required('RP1', None, False))
+        # beta devices are updated only if older
+        self.assertTrue(policy.is_update_required('RP1', '2.0.8', True))
+        self.assertFalse(policy.is_update_required('RP1', '2.1.1', True))
+        self.assertTrue(policy.is_update_required('RP1', 'bad', True))
+
+    def test_rollout(self):
+        rpids = [f'RP{i:06}' for i in range(1000)]
+        policy = self.get_policy(rollout_version='2.0.9', rollout_percent=10, rollout_rpids=['RPPINNED'])
+        in_rollout = [rpid for rpid in rpids if policy.is_in_rollout(rpid)]
+        self.assertEqual(in_rollout, [rpid for rpid in rpids if zlib.crc32(rpid.encode()) % 100 < 10])
+        self.assertTrue(50 < len(in_rollout) < 150)
+        self.assertTrue(policy.is_in_rollout('RPPINNED'))
+        self.assertFalse(policy.is_in_rollout(None))
+
+        rpid = in_rollout[0]
+        self.assertEqual(policy.get_target_version(rpid, False), '2.0.9')
+        self.assertEqual(policy.get_target_version(rpid, True), '2.1.0')
+        self.assertEqual(policy.decide(rpid, '2.0.8'), (False, True, '2.0.9'))
+        self.assertEqual(policy.decide(rpid, '2.0.9'), (False, False, '2.0.9'))
+
+        # devices stay in rollout group when percent grows
+        wider_policy = self.get_policy(rollout_version='2.0.9', rollout_percent=50)
+        self.assertTrue(all(wider_policy.is_in_rollout(rpid) for rpid in in_rollout))
+
+    def test_no_rollout_version(self):
+        policy = self.get_policy(rollout_percent=100, rollout_rpids=['RP1'])
+        self.assertFalse(policy.is_in_rollout('RP1'))
+        self.assertEqual(policy.get_target_version('RP1', False), '2.0.8')
@@ -0,0 +1,85 @@
+import os
+import shutil
+import datetime
+import tempfile
+
+from django.test import SimpleTestCase, override_settings
+
+from adsrental.raspberry_pi_log import RaspberryPiLogWriter, compress_log, get_log_path, iter_lines_reversed, tail
+
+
+class TestTail(SimpleTestCase):
+    def setUp(self):
+        self.log_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.log_dir)
+        self.lines = ['line {} {}'.format(i, 'x' * (i % 13)) for i in range(100)]
+        self.log_path = os.path.join(self.log_dir, '20190301.log')
+        with open(self.log_path, 'w') as log_file:
+            log_file.write('\n'.join(self.lines[:50]) + '\n\n' + '\n'.join(self.lines[50:]) + '\n')
+
+    def test_iter_lines_reversed(self):
+        for block_size in (1, 7, 64, 64 * 1024):
+            with self.subTest(block_size=block_size):
+                self.assertEqual(list(iter_lines_reversed(self.log_path, block_size=block_size)), self.lines[::-1])
+
+    def test_no_trailing_newline(self):
+        with open(self.log_path, 'w') as log_file:
+            log_file.write('first\nsecond\nthird')
+        self.assertEqual(list(iter_lines_reversed(self.log_path, block_size=4)), ['third', 'second', 'first'])
+
+    def test_unicode(self):
+        with open(self.log_path, 'w', encoding='utf-8') as log_file:
+            log_file.write('привет\nмир\n')
+        self.assertEqual(list(iter_lines_reversed(self.log_path, block_size=3)), ['мир', 'привет'])
+
+    def test_tail(self):
+        self.assertEqual(tail(self.log_path, 10), self.lines[::-1][:10])
+        self.assertEqual(tail(self.log_path, 10, offset=95), self.lines[::-1][95:])
+        self.assertEqual(tail(self.log_path, 10, offset=200), [])
+        self.assertEqual(tail(os.path.join(self.log_dir, 'missing.log'), 10), [])
+
+    def test_tail_compressed(self):
+        expected = [tail(self.log_path, 10), tail(self.log_path, 10, offset=95)]
+        compress_log(self.log_path)
+        self.assertFalse(os.path.exists(self.log_path))
+        self.assertEqual([tail(self.log_path, 10), tail(self.log_path, 10, offset=95)], expected)
+
+
+class TestRaspberryPiLogWriter(SimpleTestCase):
+    def setUp(self):
+        self.log_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.log_dir)
+
+    def test_unbuffered_order(self):
+        now = datetime.datetime(2019, 3, 1, 12, 0)
+        with override_settings(RASPBERRY_PI_LOG_PATH=self.log_dir):
+            # two writers act like two worker processes with their own open files
+            writers = [RaspberryPiLogWriter(buffered=False, max_open_files=1), RaspberryPiLogWriter(buffered=False, max_open_files=1)]
+            lines = []
+            for index in range(10):
+                line = 'line {}\n'.format(index)
+                lines.append(line)
+                writers[index % 2].write('RP1', now, line)
+                writers[index % 2].write('RP2', now, line)
+            for writer in writers:
+                writer.close()
+
+            for rpid in ('RP1', 'RP2'):
+                with open(get_log_path(rpid, now)) as log_file:
+                    self.assertEqual(log_file.readlines(), lines)
+
+    def test_buffered_flush(self):
+        now = datetime.datetime(2019, 3, 1, 12, 0)
+        with override_settings(RASPBERRY_PI_LOG_PATH=self.log_dir):
+            writer = RaspberryPiLogWriter(buffered=True, max_buffer_lines=3)
+            log_path = get_log_path('RP1', now)
+            writer.write('RP1', now, 'line 1\n')
+            writer.write('RP1', now, 'line 2\n')
+            self.assertFalse(os.path.exists(log_path))
+            writer.write('RP1', now, 'line 3\n')
+            writer.write('RP1', now, 'line 4\n')
+            with open(log_path) as log_file:
+                self.assertEqual(log_file.read(), 'line 1\nline 2\nline 3\n')
+            writer.close()
+            with open(log_path) as log_file:
+                self.assertEqual(log_file.read(), 'line 1\nline 2\nline 3\nline 4\n')
@@ -0,0 +1,106 @@
+import datetime
+
+from django.test import SimpleTestCase
+
+from adsrental.scheduler import JOBS, JOBS_MAP, get_rows_count, is_due, match_cron_field
+
+
+def dt(value: str) -> datetime.datetime:
+    return datetime.datetime.strptime(value, '%Y-%m-%d %H:%M')
+
+
+class TestMatchCronField(SimpleTestCase):
+    def test_fields(self):
+        cases = [
+            # field, value, field_min, expected
+            ('*', 17, 0, True),
+            ('*/10', 0, 0, True),
+            ('*/10', 30, 0, True),
+            ('*/10', 35, 0, False),
+            ('0,30', 30, 0, True),
+            ('0,30', 15, 0, False),
+            ('1-5', 5, 0, True),
+            ('1-5', 6, 0, False),
+            ('1-9/2', 7, 0, True),
+            ('1-9/2', 8, 0, False),
+            # day of month and month start from 1, so */2 means odd values
+            ('*/2', 1, 1, True),
+            ('*/2', 3, 1, True),
+            ('*/2', 2, 1, False),
+            ('*/3', 10, 1, True),
+            ('*/3', 12, 1, False),
+        ]
+        for field, value, field_min, expected in cases:
+            with self.subTest(field=field, value=value, field_min=field_min):
+                self.assertEqual(match_cron_field(field, value, field_min=field_min), expected)
+
+    def test_names(self):
+        self.assertTrue(match_cron_field('MON', 1, names=['SUN', 'MON']))
+        self.assertFalse(match_cron_field('MON', 0, names=['SUN', 'MON']))
+
+
+class TestIsDue(SimpleTestCase):
+    def test_day_of_month_step(self):
+        self.assertTrue(is_due('0 0 */2 * *', dt('2019-03-01 00:00')))
+        self.assertFalse(is_due('0 0 */2 * *', dt('2019-03-02 00:00')))
+        self.assertTrue(is_due('0 0 1 */3 *', dt('2019-04-01 00:00')))
+        self.assertFalse(is_due('0 0 1 */3 *', dt('2019-03-01 00:00')))
+
+    def test_day_of_month_or_day_of_week(self):
+        # 2019-03-04 is Monday, 2019-03-15 is Friday, 2019-03-05 is Tuesday
+        self.assertTrue(is_due('0 0 15 * MON', dt('2019-03-04 00:00')))
+        self.assertTrue(is_due('0 0 15 * MON', dt('2019-03-15 00:00')))
+        self.assertFalse(is_due('0 0 15 * MON', dt('2019-03-05 00:00')))
+        # only one of them restricted, so it has to match
+        self.assertTrue(is_due('0 0 * * MON', dt('2019-03-04 00:00')))
+        self.assertFalse(is_due('0 0 * * MON', dt('2019-03-05 00:00')))
+        self.assertFalse(is_due('0 0 15 * *', dt('2019-03-04 00:00')))
+
+    def test_jobs(self):
+        cases = [
+            # job name, due at, not due at
+            ('sync_ec2', ['2019-03-04 00:00', '2019-03-04 13:00'], ['2019-03-04 13:01', '2019-03-04 13:30']),
+            ('auto_ban', ['2019-03-04 00:00', '2019-03-31 00:00'], ['2019-03-04 00:01', '2019-03-04 01:00']),
+            ('sync_from_shipstation', ['2019-03-04 00:00', '2019-03-04 23:00'], ['2019-03-04 23:59']),
+            ('sync_delivered', ['2019-03-04 05:00'], ['2019-03-04 05:10']),
+            ('lead_history', ['2019-03-04 05:00'], ['2019-03-04 05:10']),
+            ('fix_primary', ['2019-03-04 05:00'], ['2019-03-04 05:10']),
+            ('sync_offline', ['2019-03-04 05:00', '2019-03-04 05:50'], ['2019-03-04 05:05', '2019-03-04 05:59']),
+            ('check_ec2', ['2019-03-04 05:00', '2019-03-04 05:10'], ['2019-03-04 05:01']),
+            ('check_proxy_tunnels', ['2019-03-04 05:00', '2019-03-04 05:40'], ['2019-03-04 05:41']),
+            ('update_ping', ['2019-03-04 05:00', '2019-03-04 05:58'], ['2019-03-04 05:01', '2019-03-04 05:59']),
+            ('bundler_lead_stat', ['2019-03-04 05:00'], ['2019-03-04 05:30']),
+            ('sync_adsdb', ['2019-03-04 05:00'], ['2019-03-04 05:30']),
+            ('event_not_qualified', ['2019-03-04 05:00', '2019-03-04 05:56'], ['2019-03-04 05:02', '2019-03-04 05:58']),
+            ('generate_bundler_bonuses', ['2019-03-04 05:00'], ['2019-03-04 06:00', '2019-03-04 05:01']),
+            ('customerio_outbox', ['2019-03-04 05:00', '2019-03-04 05:59'], []),
+            ('lead_history_aggregate', ['2019-03-01 05:00', '2019-04-01 05:00'], ['2019-03-02 05:00', '2019-03-01 06:00']),
+            ('lead_history_aggregate_current', ['2019-03-01 06:00', '2019-03-17 06:00'], ['2019-03-17 05:00', '2019-03-17 06:01']),
+        ]
+        self.assertEqual(sorted(name for name, _, _ in cases), sorted(job.name for job in JOBS))
+        for name, due, not_due in cases:
+            job = JOBS_MAP[name]
+            for value in due:
+                with self.subTest(job=name, now=value):
+                    self.assertTrue(is_due(job.schedule, dt(value)))
+            for value in not_due:
+                with self.subTest(job=name, now=value):
+                    self.assertFalse(is_due(job.schedule, dt(value)))
+
+
+class TestGetRowsCount(SimpleTestCase):
+    def test_rows_count(self):
+        cases = [
+            ('not json', None),
+            ('[1, 2]', None),
+            ('{"result": true}', 0),
+            ('{"count": 3, "result": true}', 3),
+            ('{"banned_count": 2, "leads_updated": 5, "count": 1}', 8),
+            ('{"result": true, "stable": ["RP1", "RP2"], "slow": ["RP3"], "unreachable": []}', 3),
+            ('{"stable": ["RP1"], "metrics": {"submitted": 10, "succeeded": 10}}', 1),
+            ('{"stable": ["RP1"], "ssh_pool": {"size": 4}, "metrics": {"failed": 1}}', 1),
+            ('{"is_updated": true, "count": 2}', 2),
+        ]
+        for content, expected in cases:
+            with self.subTest(content=content):
+                self.assertEqual(get_rows_count(content), expected)